@@ -0,0 +1,93 @@
+# alteracoes.py
+"""
+O que um flush alterou, para os dados derivados dos prestadores.
+
+Índice da busca, pontuação, cobertura geográfica, sugestões e caches partilham
+as mesmas duas peças:
+
+  - prestadores_alterados: os prestadores afetados pelos objetos novos,
+    apagados ou com um dos campos vigiados alterados (com o prestador de antes
+    quando a referência muda);
+  - depois_do_commit: alterações juntadas a cada flush em session.info e
+    aplicadas só depois do commit (descartadas no rollback), para o que vive
+    na memória do processo.
+"""
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import Agendamento, PrestadorServico, Servico, Usuario
+
+
+@event.listens_for(Servico.prestador_id, 'set', active_history=True)
+@event.listens_for(Agendamento.prestador_id, 'set', active_history=True)
+def _guardar_prestador_anterior(target, value, oldvalue, initiator):
+    """Carrega o prestador de antes da alteração (mesmo com o objeto expirado): ele também é afetado"""
+
+
+def prestadores_alterados(session, campos, campos_usuario=()):
+    """
+    Ids dos prestadores afetados pelo flush.
+
+    campos: {modelo: campos vigiados}; PrestadorServico conta pelo id, os
+    outros modelos pela coluna prestador_id.
+    campos_usuario: campos do Usuario que entram nos prestadores dele.
+    """
+    prestadores, usuarios = set(), set()
+
+    def adicionar(obj, gravado=False):
+        atributo = 'id' if isinstance(obj, PrestadorServico) else 'prestador_id'
+        historico = inspect(obj).attrs[atributo].history
+        valores = [getattr(obj, atributo)] + (list(historico.deleted) if gravado else [])
+        prestadores.update(valor for valor in valores if valor)
+
+    for obj in session.new:
+        if type(obj) in campos:
+            adicionar(obj)
+
+    for obj in session.deleted:
+        if type(obj) in campos:
+            adicionar(obj, gravado=True)
+
+    for obj in session.dirty:
+        estado = inspect(obj).attrs
+        if type(obj) in campos:
+            if any(estado[campo].history.has_changes() for campo in campos[type(obj)]):
+                adicionar(obj, gravado=True)
+        elif campos_usuario and isinstance(obj, Usuario) and \
+                any(estado[campo].history.has_changes() for campo in campos_usuario):
+            usuarios.add(obj.id)
+
+    if usuarios:
+        tabela = PrestadorServico.__table__
+        prestadores.update(session.connection().execute(
+            select(tabela.c.id).where(tabela.c.usuario_id.in_(usuarios))).scalars())
+    return prestadores
+
+
+def depois_do_commit(chave, recolher, aplicar, novo=set):
+    """
+    Liga aos eventos da Session as alterações aplicadas depois do commit:
+
+      - after_flush: recolher(session, pendentes) junta o que o flush mudou em
+        session.info[chave] (criado com novo() no primeiro flush);
+      - after_commit: aplicar(pendentes), se não estiverem vazias; os erros
+        ficam com `aplicar` (o commit já foi feito);
+      - after_rollback: as pendentes são descartadas.
+    """
+
+    @event.listens_for(Session, 'after_flush')
+    def _recolher(session, flush_context):
+        pendentes = session.info.get(chave)
+        if pendentes is None:
+            pendentes = session.info[chave] = novo()
+        recolher(session, pendentes)
+
+    @event.listens_for(Session, 'after_commit')
+    def _aplicar(session):
+        pendentes = session.info.pop(chave, None)
+        if pendentes:
+            aplicar(pendentes)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar(session):
+        session.info.pop(chave, None)
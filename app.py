@@ -1,30 +1,45 @@
 # app.py
-from flask import Flask
+import importlib
+import time
+
+_inicio_imports = time.perf_counter()
+
+from flask import Flask, request
 from flask_login import LoginManager
 import logging
 
 # Configurações
 from config import config
-from models import Base, Usuario
+from models import Usuario
 
 # Import da sessão do banco DA RAIZ
-from database import db_session, engine
-
-# Blueprints
-from blueprints.auth import auth_bp
-from blueprints.main import main_bp
-from blueprints.servicos import servicos_bp
-from blueprints.api import api_bp
-from blueprints.chat import chat_bp
-from blueprints.pagamentos import pagamentos_bp
-from blueprints.agendamentos import agendamentos_bp
-from blueprints.avaliacoes import avaliacoes_bp
-from blueprints.notificacoes import notificacoes_bp  # ✅ NOVO - Import do blueprint de notificações
-
-from blueprints.admin import admin_bp
-from blueprints.admin_tickets import admin_tickets_bp
-from blueprints.user_tickets import tickets_bp
-
+from database import db_session
+import monitor_sql
+import metricas_pool
+import migracoes
+import sugestoes
+import cache_busca
+
+# Tempo de importação de Flask, modelos e banco (medido uma vez por processo)
+_TEMPO_IMPORTS_MS = (time.perf_counter() - _inicio_imports) * 1000
+
+# Blueprints (módulo, atributo), importados só dentro de create_app()
+BLUEPRINTS = [
+    ('blueprints.auth', 'auth_bp'),
+    ('blueprints.main', 'main_bp'),
+    ('blueprints.servicos', 'servicos_bp'),
+    ('blueprints.api', 'api_bp'),
+    ('blueprints.chat', 'chat_bp'),
+    ('blueprints.pagamentos', 'pagamentos_bp'),
+    ('blueprints.agendamentos', 'agendamentos_bp'),
+    ('blueprints.avaliacoes', 'avaliacoes_bp'),
+    ('blueprints.notificacoes', 'notificacoes_bp'),
+    ('blueprints.admin_tickets', 'admin_tickets_bp'),
+    ('blueprints.user_tickets', 'tickets_bp'),
+    ('blueprints.admin', 'admin_bp'),
+]
+
+logger = logging.getLogger('servicos.arranque')
 
 
 # Configuração de Logging
@@ -32,11 +47,16 @@ logging.basicConfig(level=logging.INFO)
 
 def create_app():
     """Factory function para criar a aplicação"""
+    inicio = time.perf_counter()
+    tempos = {'imports': _TEMPO_IMPORTS_MS}
+
     app = Flask(__name__)
     app.config['SECRET_KEY'] = config.SECRET_KEY
 
-    # ✅ CORRIGIDO: Criar tabelas apenas se não existirem
-    Base.metadata.create_all(bind=engine, checkfirst=True)
+    # Uma consulta à versão do schema; criar/alterar tabelas é com `python migracoes.py`
+    etapa = time.perf_counter()
+    migracoes.verificar_schema()
+    tempos['schema'] = (time.perf_counter() - etapa) * 1000
 
     # Login Manager
     login_manager = LoginManager()
@@ -52,19 +72,11 @@ def create_app():
             print(f"Erro ao carregar usuário {user_id}: {str(e)}")
             return None
 
-    # Registrar Blueprints
-    app.register_blueprint(auth_bp)
-    app.register_blueprint(main_bp)
-    app.register_blueprint(servicos_bp)
-    app.register_blueprint(api_bp)
-    app.register_blueprint(chat_bp)
-    app.register_blueprint(pagamentos_bp)
-    app.register_blueprint(agendamentos_bp)
-    app.register_blueprint(avaliacoes_bp)
-    app.register_blueprint(notificacoes_bp)
-    app.register_blueprint(admin_tickets_bp)
-    app.register_blueprint(tickets_bp)
-    app.register_blueprint(admin_bp)
+    # Registrar Blueprints (importação medida por módulo)
+    for modulo, atributo in BLUEPRINTS:
+        etapa = time.perf_counter()
+        app.register_blueprint(getattr(importlib.import_module(modulo), atributo))
+        tempos[modulo] = (time.perf_counter() - etapa) * 1000
 
     # ✅ ADD THIS: Context processor para disponibilizar 'now' em todos os templates
     from datetime import datetime
@@ -82,6 +94,34 @@ def create_app():
                 routes.append(f"{rule.endpoint}: {rule.rule} {list(rule.methods)}")
         return '<br>'.join(sorted(routes))
 
+    # Instrumentação SQL: cabeçalhos X-SQL-* em debug, log de lentas e /debug-sql
+    monitor_sql.init_app(app)
+
+    # Uma sessão do banco por pedido: no fim é fechada e a conexão volta ao pool.
+    # Sem isto cada thread guardava a sessão, o identity map e a conexão entre pedidos
+    @app.teardown_request
+    def medir_sessao(excecao=None):
+        if db_session.registry.has():
+            sessao = db_session()
+            pendentes = len(sessao.new) + len(sessao.dirty) + len(sessao.deleted)
+            metricas_pool.registrar_sessao(request.endpoint or request.path,
+                                           len(sessao.identity_map), pendentes)
+
+    @app.teardown_appcontext
+    def fechar_sessao(excecao=None):
+        if excecao is not None and db_session.registry.has():
+            db_session.rollback()
+        db_session.remove()
+
+    # Métricas do pool: X-DB-Espera-ms em debug e /debug-pool
+    metricas_pool.init_app(app)
+
+    # Sugestões da caixa de busca: índice em memória construído numa thread
+    sugestoes.init_app(app)
+
+    # Cache das listas de ids da busca: X-Busca-Cache em debug e /debug-busca-cache
+    cache_busca.init_app(app)
+
     # Error handlers para mostrar erros reais
     @app.errorhandler(500)
     def internal_error(error):
@@ -98,8 +138,22 @@ def create_app():
         <p>{error}</p>
         """, 404
 
+    tempos['total'] = (time.perf_counter() - inicio) * 1000 + _TEMPO_IMPORTS_MS
+    app.config['TEMPOS_ARRANQUE'] = tempos
+    logger.info('Arranque em %.0f ms (imports %.0f ms, schema %.0f ms)',
+                tempos['total'], tempos['imports'], tempos['schema'])
+
     return app
 
+
+def relatorio_arranque(app):
+    """Tempo de cada etapa do create_app(), da mais lenta para a mais rápida"""
+    tempos = dict(app.config['TEMPOS_ARRANQUE'])
+    total = tempos.pop('total')
+    print(f"⏱️  Arranque em {total:.0f} ms")
+    for etapa, ms in sorted(tempos.items(), key=lambda item: item[1], reverse=True):
+        print(f"   {etapa:<28} {ms:>8.1f} ms")
+
 if __name__ == '__main__':
     app = create_app()
     print("🚀 ServiçosPro - SISTEMA COMPLETO!")
@@ -108,5 +162,6 @@ if __name__ == '__main__':
     print("📅 Agendamentos Inteligentes ✅")
     print("👥 Dashboard Prestador ✅")
     print("🔍 Debug rotas: http://localhost:5000/debug-routes")
+    relatorio_arranque(app)
     print("=" * 50)
     app.run(debug=config.DEBUG, host='0.0.0.0', port=5000)
\ No newline at end of file
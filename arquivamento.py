@@ -0,0 +1,170 @@
+# arquivamento.py
+"""
+Arquivo das mensagens e notificações antigas e retenção por tipo.
+
+`mensagens` e `notificacoes` só crescem, mas quase todas as leituras são das
+linhas recentes. Este job move as linhas mais antigas que
+config.ARQUIVO_MENSAGENS_DIAS / ARQUIVO_NOTIFICACOES_DIAS para as tabelas
+mensagens_arquivo / notificacoes_arquivo (com o mesmo id), em lotes de
+config.ARQUIVO_LOTE: cada lote copia e apaga numa única transação curta, então
+uma linha nunca fica nas duas tabelas nem se perde se o job for interrompido.
+
+As listagens continuam no arquivo quando passam da janela quente
+(paginacao.paginar_com_arquivo). Os contadores de não lidas só olham para a
+tabela quente.
+
+Depois, config.RETENCAO_NOTIFICACOES apaga (das duas tabelas) as notificações
+de cada tipo mais antigas que o prazo do tipo.
+
+Uso:
+    python arquivamento.py                 # arquiva e aplica a retenção uma vez
+    python arquivamento.py --verificar     # só conta o que seria movido/apagado
+    python arquivamento.py --continuo 3600 # repete a cada hora
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from config import config
+from database import engine
+from models import Mensagem, MensagemArquivada, Notificacao, NotificacaoArquivada
+
+# tabela quente -> (modelo do arquivo, coluna da data, config com a idade em dias)
+ARQUIVAVEIS = [
+    (Mensagem, MensagemArquivada, 'data_envio', 'ARQUIVO_MENSAGENS_DIAS'),
+    (Notificacao, NotificacaoArquivada, 'data_criacao', 'ARQUIVO_NOTIFICACOES_DIAS'),
+]
+
+
+def _ids_do_lote(conn, tabela, condicao, lote):
+    # Pela chave primária: as linhas antigas estão no início, a leitura para cedo
+    return conn.execute(select(tabela.c.id).where(condicao).order_by(tabela.c.id).limit(lote)).scalars().all()
+
+
+def mover_em_lotes(modelo, modelo_arquivo, coluna_data, corte, lote=None, pausa=None):
+    """Move para o arquivo as linhas com `coluna_data` < `corte`; devolve quantas"""
+    lote = lote or config.ARQUIVO_LOTE
+    pausa = config.ARQUIVO_PAUSA if pausa is None else pausa
+    origem, destino = modelo.__table__, modelo_arquivo.__table__
+    colunas = [coluna.name for coluna in origem.columns]
+    movidas = conflitos = 0
+
+    while True:
+        try:
+            with engine.begin() as conn:
+                ids = _ids_do_lote(conn, origem, origem.c[coluna_data] < corte, lote)
+                if not ids:
+                    break
+                conn.execute(destino.insert().from_select(
+                    colunas + ['arquivada_em'],
+                    select(*[origem.c[nome] for nome in colunas], literal(datetime.utcnow()))
+                    .where(origem.c.id.in_(ids))))
+                conn.execute(delete(origem).where(origem.c.id.in_(ids)))
+        except IntegrityError:
+            # Outro processo arquivou o mesmo lote primeiro; o próximo lote já não o inclui.
+            # Se repetir, há ids nas duas tabelas (ex.: backup restaurado) e é preciso ver à mão
+            conflitos += 1
+            if conflitos > 3:
+                raise
+            continue
+        movidas += len(ids)
+        time.sleep(pausa)
+    return movidas
+
+
+def apagar_em_lotes(tabela, condicao, lote=None, pausa=None):
+    """DELETE em lotes pela chave primária; devolve quantas linhas"""
+    lote = lote or config.ARQUIVO_LOTE
+    pausa = config.ARQUIVO_PAUSA if pausa is None else pausa
+    apagadas = 0
+    while True:
+        with engine.begin() as conn:
+            ids = _ids_do_lote(conn, tabela, condicao, lote)
+            if not ids:
+                break
+            conn.execute(delete(tabela).where(tabela.c.id.in_(ids)))
+        apagadas += len(ids)
+        time.sleep(pausa)
+    return apagadas
+
+
+def _condicoes_retencao(agora):
+    """[(tabela, tipo, condição)] das notificações fora do prazo do tipo"""
+    condicoes = []
+    for tipo, dias in config.RETENCAO_NOTIFICACOES.items():
+        if dias is None:
+            continue
+        corte = agora - timedelta(days=dias)
+        for modelo in (Notificacao, NotificacaoArquivada):
+            tabela = modelo.__table__
+            condicoes.append((tabela, tipo, (tabela.c.tipo == tipo) & (tabela.c.data_criacao < corte)))
+    return condicoes
+
+
+def verificar(agora=None):
+    """Quantas linhas seriam movidas/apagadas, sem alterar nada"""
+    agora = agora or datetime.utcnow()
+    with engine.connect() as conn:
+        for modelo, _, coluna_data, idade in ARQUIVAVEIS:
+            tabela = modelo.__table__
+            corte = agora - timedelta(days=getattr(config, idade))
+            total = conn.execute(select(func.count()).select_from(tabela)
+                                 .where(tabela.c[coluna_data] < corte)).scalar()
+            print(f"📦 {tabela.name}: {total:,} linha(s) anteriores a {corte:%Y-%m-%d} para arquivar")
+        for tabela, tipo, condicao in _condicoes_retencao(agora):
+            total = conn.execute(select(func.count()).select_from(tabela).where(condicao)).scalar()
+            if total:
+                print(f"🗑️  {tabela.name}: {total:,} notificação(ões) '{tipo}' fora do prazo")
+
+
+def arquivar(agora=None, lote=None, pausa=None):
+    """Arquiva as linhas antigas e aplica a retenção; devolve {tabela: linhas}"""
+    agora = agora or datetime.utcnow()
+    resultado = {}
+
+    for modelo, modelo_arquivo, coluna_data, idade in ARQUIVAVEIS:
+        corte = agora - timedelta(days=getattr(config, idade))
+        inicio = time.perf_counter()
+        movidas = mover_em_lotes(modelo, modelo_arquivo, coluna_data, corte, lote, pausa)
+        resultado[modelo.__tablename__] = movidas
+        print(f"📦 {modelo.__tablename__}: {movidas:,} linha(s) arquivada(s) em {time.perf_counter() - inicio:.1f}s")
+
+    for tabela, tipo, condicao in _condicoes_retencao(agora):
+        apagadas = apagar_em_lotes(tabela, condicao, lote, pausa)
+        if apagadas:
+            chave = f'{tabela.name} ({tipo})'
+            resultado[chave] = apagadas
+            print(f"🗑️  {chave}: {apagadas:,} apagada(s) pela retenção")
+
+    return resultado
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Arquiva mensagens/notificações antigas e aplica a retenção')
+    parser.add_argument('--verificar', action='store_true', help='só mostra o que seria feito')
+    parser.add_argument('--lote', type=int, default=config.ARQUIVO_LOTE)
+    parser.add_argument('--pausa', type=float, default=config.ARQUIVO_PAUSA)
+    parser.add_argument('--continuo', type=float, metavar='SEGUNDOS', help='repete a cada N segundos')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        argumentos = ler_argumentos()
+        if argumentos.verificar:
+            verificar()
+            sys.exit(0)
+        while True:
+            arquivar(lote=argumentos.lote, pausa=argumentos.pausa)
+            if not argumentos.continuo:
+                break
+            time.sleep(argumentos.continuo)
+    except KeyboardInterrupt:
+        print("🛑 Arquivamento interrompido (os lotes concluídos ficam gravados)")
+    except Exception as e:
+        print(f"❌ Erro no arquivamento: {e}")
+        sys.exit(1)
@@ -0,0 +1,404 @@
+# arquivo_wal.py
+"""
+Arquivo contínuo do WAL do SQLite e restauração para um instante (PITR).
+
+O arquivador fica a correr ao lado da aplicação:
+
+  1. ao arrancar faz um backup base (fazer_dump.py) a partir de um snapshot
+     cuja posição exata no WAL é conhecida;
+  2. a cada --intervalo segundos copia os frames novos do WAL, até ao último
+     commit, para um segmento comprimido (arquivo/wal/<seq>-<ms>.wal.gz);
+  3. mantém uma transação de leitura aberta, o que impede o SQLite de
+     reiniciar o WAL (e apagar frames) antes de eles serem copiados;
+  4. periodicamente "roda": com um lock de escrita curto copia o resto do WAL,
+     solta a leitura e faz o checkpoint, para o WAL não crescer sem fim.
+
+Cada frame é validado pelo checksum cumulativo do WAL, então frames a meio de
+ser escritos nunca entram num segmento.
+
+A restauração pega no último backup base anterior ao instante pedido e aplica
+por ordem as páginas dos segmentos arquivados até esse instante (a precisão é
+a do --intervalo). O banco resultante passa pelo integrity_check e só depois
+substitui o atual (restaurar_backup.py).
+
+Uso:
+    python arquivo_wal.py arquivar servicos_app.db --pasta arquivo_wal
+    python arquivo_wal.py listar --pasta arquivo_wal
+    python arquivo_wal.py restaurar "2025-11-05 14:30" --pasta arquivo_wal --banco servicos_app.db
+"""
+import argparse
+import gzip
+import os
+import re
+import signal
+import sqlite3
+import struct
+import sys
+import time
+from datetime import datetime
+
+from fazer_dump import NIVEL_COMPRESSAO, _abrir_origem, fazer_dump
+from restaurar_backup import (RestauracaoInvalida, caminho_temporario, extrair_backup,
+                              limpar_temporario, trocar_banco, verificar_banco)
+
+PASTA_ARQUIVO = 'arquivo_wal'
+INTERVALO = 1.0             # segundos entre cópias do WAL (= precisão da restauração)
+RODAR_A_CADA_FRAMES = 2000  # ~8 MB de WAL com páginas de 4 KB
+RODAR_A_CADA_S = 300
+MANTER_BASES = 3
+
+TAMANHO_CABECALHO = 32
+TAMANHO_CABECALHO_FRAME = 24
+MAGICOS_WAL = {0x377f0682: '<', 0x377f0683: '>'}  # ordem dos bytes do checksum
+
+_RE_BASE = re.compile(r'^base-(\d{10})-(\d+)\.db\.gz$')
+_RE_SEGMENTO = re.compile(r'^(\d{10})-(\d+)\.wal\.gz$')
+
+
+def _checksum(dados, s1, s2, ordem):
+    """Checksum cumulativo do WAL (o mesmo algoritmo do SQLite)"""
+    valores = struct.unpack(f'{ordem}{len(dados) // 4}I', dados)
+    for i in range(0, len(valores), 2):
+        s1 = (s1 + valores[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + valores[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
+
+
+def _tamanho_pagina(cabecalho):
+    tamanho = struct.unpack('>I', cabecalho[8:12])[0]
+    return 65536 if tamanho == 1 else tamanho
+
+
+class LeitorWal:
+    """Lê incrementalmente os frames confirmados do arquivo -wal"""
+
+    def __init__(self, caminho_wal):
+        self.caminho = caminho_wal
+        self.cabecalho = None
+        self.posicao = 0
+        self.soma = None
+
+    def _nova_geracao(self, cabecalho):
+        magico, _, _, _, _, _, c1, c2 = struct.unpack('>8I', cabecalho)
+        ordem = MAGICOS_WAL.get(magico)
+        if ordem is None or _checksum(cabecalho[:24], 0, 0, ordem) != (c1, c2):
+            return False
+        self.cabecalho = cabecalho
+        self.ordem = ordem
+        self.salts = cabecalho[16:24]
+        self.tamanho_pagina = _tamanho_pagina(cabecalho)
+        self.posicao = TAMANHO_CABECALHO
+        self.soma = (c1, c2)
+        return True
+
+    def novos_frames(self):
+        """Cabeçalho + frames até ao último commit desde a leitura anterior (ou b'')"""
+        if not os.path.exists(self.caminho):
+            return b''
+        with open(self.caminho, 'rb') as wal:
+            cabecalho = wal.read(TAMANHO_CABECALHO)
+            if len(cabecalho) < TAMANHO_CABECALHO:
+                return b''
+            # Cabeçalho diferente = o WAL foi reiniciado (salts novos)
+            if cabecalho != self.cabecalho and not self._nova_geracao(cabecalho):
+                return b''
+
+            wal.seek(self.posicao)
+            frames, confirmados = [], 0
+            soma, posicao = self.soma, self.posicao
+            tamanho_frame = TAMANHO_CABECALHO_FRAME + self.tamanho_pagina
+            while True:
+                frame = wal.read(tamanho_frame)
+                if len(frame) < tamanho_frame or frame[8:16] != self.salts:
+                    break
+                soma = _checksum(frame[:8] + frame[TAMANHO_CABECALHO_FRAME:], *soma, self.ordem)
+                if soma != struct.unpack('>2I', frame[16:24]):
+                    break  # frame a meio de ser escrito (ou restos de outra geração)
+                frames.append(frame)
+                if struct.unpack('>I', frame[4:8])[0]:  # frame de commit
+                    confirmados = len(frames)
+                    self.soma, self.posicao = soma, posicao + confirmados * tamanho_frame
+
+        if not confirmados:
+            return b''
+        return self.cabecalho + b''.join(frames[:confirmados])
+
+
+def _gravar(caminho, dados):
+    """Grava comprimido, com fsync, e só então torna o arquivo visível"""
+    parcial = caminho + '.parcial'
+    with open(parcial, 'wb') as arquivo:
+        arquivo.write(gzip.compress(dados, compresslevel=NIVEL_COMPRESSAO, mtime=0))
+        arquivo.flush()
+        os.fsync(arquivo.fileno())
+    os.replace(parcial, caminho)
+
+
+def _agora_ms():
+    return int(time.time() * 1000)
+
+
+def listar_bases(pasta):
+    """[(seq, ms, caminho)] dos backups base, do mais antigo ao mais recente"""
+    if not os.path.isdir(pasta):
+        return []
+    bases = [(int(m.group(1)), int(m.group(2)), os.path.join(pasta, nome))
+             for nome in os.listdir(pasta) if (m := _RE_BASE.match(nome))]
+    return sorted(bases)
+
+
+def listar_segmentos(pasta):
+    """[(seq, ms, caminho)] dos segmentos do WAL, por ordem"""
+    pasta_wal = os.path.join(pasta, 'wal')
+    if not os.path.isdir(pasta_wal):
+        return []
+    segmentos = [(int(m.group(1)), int(m.group(2)), os.path.join(pasta_wal, nome))
+                 for nome in os.listdir(pasta_wal) if (m := _RE_SEGMENTO.match(nome))]
+    return sorted(segmentos)
+
+
+def podar(pasta, manter=MANTER_BASES):
+    """Apaga as bases mais antigas que as `manter` mais recentes e os segmentos delas"""
+    bases = listar_bases(pasta)
+    if manter <= 0 or len(bases) <= manter:
+        return
+    primeira = bases[-manter][0]
+    for _, _, caminho in bases[:-manter]:
+        for arquivo in (caminho, caminho + '.manifest.json'):
+            if os.path.exists(arquivo):
+                os.remove(arquivo)
+    for seq, _, caminho in listar_segmentos(pasta):
+        if seq < primeira:
+            os.remove(caminho)
+
+
+class ArquivadorWal:
+    """Envia continuamente os frames do WAL de `banco` para `pasta`"""
+
+    def __init__(self, banco, pasta=PASTA_ARQUIVO, intervalo=INTERVALO,
+                 rodar_frames=RODAR_A_CADA_FRAMES, rodar_s=RODAR_A_CADA_S, manter=MANTER_BASES):
+        self.banco = banco
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.rodar_frames = rodar_frames
+        self.rodar_s = rodar_s
+        self.manter = manter
+        self.leitor = LeitorWal(banco + '-wal')
+        self.leitura = None
+        self.parar = False
+        self.frames_desde_rotacao = 0
+        self.ultima_rotacao = time.monotonic()
+
+    def _conectar(self):
+        return sqlite3.connect(self.banco, isolation_level=None, timeout=30)
+
+    def _garantir_wal(self):
+        conn = self._conectar()
+        try:
+            if conn.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+                print(f"⚙️  Ativando o modo WAL em {self.banco}")
+                if conn.execute('PRAGMA journal_mode = WAL').fetchone()[0] != 'wal':
+                    raise RuntimeError('Não foi possível ativar o modo WAL (banco em uso?)')
+        finally:
+            conn.close()
+
+    def _abrir_leitura(self):
+        self.leitura = _abrir_origem(self.banco)
+
+    def _proximo_seq(self):
+        todos = listar_bases(self.pasta) + listar_segmentos(self.pasta)
+        return max((seq for seq, _, _ in todos), default=0) + 1
+
+    def iniciar(self):
+        """Backup base alinhado com a posição atual do WAL"""
+        os.makedirs(os.path.join(self.pasta, 'wal'), exist_ok=True)
+        self._garantir_wal()
+        self.seq = self._proximo_seq()
+
+        # Com os escritores parados, o snapshot da leitura = tudo o que está no WAL
+        escritor = self._conectar()
+        escritor.execute('BEGIN IMMEDIATE')
+        try:
+            self.leitor.novos_frames()
+            self._abrir_leitura()
+        finally:
+            escritor.execute('COMMIT')
+            escritor.close()
+
+        base = os.path.join(self.pasta, f'base-{self.seq:010d}-{_agora_ms()}.db.gz')
+        fazer_dump(self.banco, base, origem=self.leitura)
+        podar(self.pasta, self.manter)
+        print(f"✅ Backup base {os.path.basename(base)}; arquivando o WAL a cada {self.intervalo}s")
+
+    def copiar(self):
+        """Grava um segmento com os frames novos; devolve quantos frames"""
+        dados = self.leitor.novos_frames()
+        if not dados:
+            return 0
+        frames = (len(dados) - TAMANHO_CABECALHO) // (TAMANHO_CABECALHO_FRAME + self.leitor.tamanho_pagina)
+        _gravar(os.path.join(self.pasta, 'wal', f'{self.seq:010d}-{_agora_ms()}.wal.gz'), dados)
+        self.seq += 1
+        self.frames_desde_rotacao += frames
+        return frames
+
+    def rodar(self):
+        """Copia o resto do WAL e deixa o SQLite fazer o checkpoint e reiniciá-lo"""
+        escritor = self._conectar()
+        try:
+            # Checkpoint fora do lock do que a leitura já permite, para o lock ser curto
+            escritor.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            escritor.execute('BEGIN IMMEDIATE')
+            try:
+                self.copiar()
+                self.leitura.execute('COMMIT')
+                self.leitura.execute('PRAGMA wal_checkpoint(PASSIVE)')
+                self.leitura.execute('BEGIN')
+                self.leitura.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            finally:
+                escritor.execute('COMMIT')
+        finally:
+            escritor.close()
+        self.frames_desde_rotacao = 0
+        self.ultima_rotacao = time.monotonic()
+
+    def executar(self):
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'parar', True))
+        self.iniciar()
+        try:
+            while not self.parar:
+                proximo = time.monotonic() + self.intervalo
+                frames = self.copiar()
+                if frames:
+                    print(f"   📦 segmento {self.seq - 1}: {frames} frame(s)")
+                if (self.frames_desde_rotacao >= self.rodar_frames
+                        or time.monotonic() - self.ultima_rotacao >= self.rodar_s):
+                    self.rodar()
+                while not self.parar and time.monotonic() < proximo:
+                    time.sleep(min(0.1, self.intervalo))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.copiar()
+            self.leitura.close()
+            print(f"🛑 Arquivador parado; último segmento {self.seq - 1}")
+
+
+def aplicar_segmento(caminho_segmento, banco):
+    """Escreve no arquivo do banco as páginas de cada transação do segmento"""
+    try:
+        with gzip.open(caminho_segmento, 'rb') as arquivo:
+            dados = arquivo.read()
+    except (gzip.BadGzipFile, EOFError, OSError) as e:
+        raise RestauracaoInvalida(f'Segmento corrompido {caminho_segmento}: {e}')
+
+    tamanho_pagina = _tamanho_pagina(dados[:TAMANHO_CABECALHO])
+    tamanho_frame = TAMANHO_CABECALHO_FRAME + tamanho_pagina
+    pendentes = []
+    with open(banco, 'r+b') as destino:
+        for inicio in range(TAMANHO_CABECALHO, len(dados), tamanho_frame):
+            pagina, commit = struct.unpack('>2I', dados[inicio:inicio + 8])
+            pendentes.append((pagina, inicio + TAMANHO_CABECALHO_FRAME))
+            if commit:
+                for pagina, posicao in pendentes:
+                    destino.seek((pagina - 1) * tamanho_pagina)
+                    destino.write(dados[posicao:posicao + tamanho_pagina])
+                destino.truncate(commit * tamanho_pagina)
+                pendentes = []
+    if pendentes:
+        raise RestauracaoInvalida(f'Segmento {caminho_segmento} termina a meio de uma transação')
+
+
+def restaurar_ate(pasta=PASTA_ARQUIVO, ate=None, banco_saida='servicos_app.db', rapido=False):
+    """Restaura o estado do banco em `ate` (datetime; None = o mais recente arquivado)"""
+    limite = int(ate.timestamp() * 1000) if ate else float('inf')
+    bases = [base for base in listar_bases(pasta) if base[1] <= limite]
+    if not bases:
+        raise RestauracaoInvalida(f'Nenhum backup base em {pasta} anterior a {ate}')
+    seq_base, _, arquivo_base = bases[-1]
+
+    temporario = caminho_temporario(banco_saida)
+    inicio = time.perf_counter()
+    limpar_temporario(temporario)
+    try:
+        extrair_backup(arquivo_base, temporario)
+
+        esperado, aplicados, instante = seq_base, 0, None
+        for seq, ms, caminho in listar_segmentos(pasta):
+            if seq < seq_base:
+                continue
+            if ms > limite:
+                break
+            if seq != esperado:
+                print(f"⚠️  Falta o segmento {esperado}; a restauração para antes dele")
+                break
+            aplicar_segmento(caminho, temporario)
+            esperado, aplicados, instante = seq + 1, aplicados + 1, ms
+
+        conn = sqlite3.connect(temporario)
+        try:
+            # As páginas vindas do WAL marcam o arquivo como WAL; fica um arquivo único
+            conn.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            conn.close()
+        tabelas = verificar_banco(temporario, rapido)
+        trocar_banco(temporario, banco_saida)
+
+    except BaseException:
+        limpar_temporario(temporario)
+        raise
+
+    estado = datetime.fromtimestamp((instante or bases[-1][1]) / 1000)
+    print(f"✅ {banco_saida} restaurado para {estado:%Y-%m-%d %H:%M:%S} "
+          f"({aplicados} segmento(s) sobre {os.path.basename(arquivo_base)}, {tabelas} tabelas) "
+          f"em {time.perf_counter() - inicio:.1f}s")
+
+
+def listar(pasta=PASTA_ARQUIVO):
+    bases, segmentos = listar_bases(pasta), listar_segmentos(pasta)
+    if not bases:
+        print(f"📭 Nenhum backup base em {pasta}")
+        return
+    for seq, ms, caminho in bases:
+        print(f"💾 {datetime.fromtimestamp(ms / 1000):%Y-%m-%d %H:%M:%S}  {os.path.basename(caminho)}")
+    if segmentos:
+        print(f"📦 {len(segmentos)} segmento(s) do WAL, de "
+              f"{datetime.fromtimestamp(segmentos[0][1] / 1000):%Y-%m-%d %H:%M:%S} a "
+              f"{datetime.fromtimestamp(segmentos[-1][1] / 1000):%Y-%m-%d %H:%M:%S}")
+    print(f"🕒 Restaurável a partir de {datetime.fromtimestamp(bases[0][1] / 1000):%Y-%m-%d %H:%M:%S}")
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Arquivo contínuo do WAL e restauração para um instante')
+    parser.add_argument('--pasta', default=PASTA_ARQUIVO)
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    arquivar = comandos.add_parser('arquivar', help='arquiva o WAL continuamente')
+    arquivar.add_argument('banco', nargs='?', default='servicos_app.db')
+    arquivar.add_argument('--intervalo', type=float, default=INTERVALO)
+    arquivar.add_argument('--rodar-frames', type=int, default=RODAR_A_CADA_FRAMES)
+    arquivar.add_argument('--rodar-s', type=float, default=RODAR_A_CADA_S)
+    arquivar.add_argument('--manter-bases', type=int, default=MANTER_BASES)
+
+    comandos.add_parser('listar', help='mostra as bases e a janela restaurável')
+
+    restaurar = comandos.add_parser('restaurar', help='restaura o banco para um instante')
+    restaurar.add_argument('ate', nargs='?', type=datetime.fromisoformat,
+                           help="'AAAA-MM-DD HH:MM[:SS]' (hora local); padrão: o mais recente")
+    restaurar.add_argument('--banco', default='servicos_app.db')
+    restaurar.add_argument('--rapido', action='store_true', help='quick_check em vez de integrity_check')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        argumentos = ler_argumentos()
+        if argumentos.comando == 'arquivar':
+            ArquivadorWal(argumentos.banco, argumentos.pasta, argumentos.intervalo,
+                          argumentos.rodar_frames, argumentos.rodar_s, argumentos.manter_bases).executar()
+        elif argumentos.comando == 'listar':
+            listar(argumentos.pasta)
+        else:
+            restaurar_ate(argumentos.pasta, argumentos.ate, argumentos.banco, argumentos.rapido)
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        sys.exit(1)
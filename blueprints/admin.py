@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, jsonify, redirect, url_for, flash, request  # ✅
 from flask_login import login_required, current_user
-from database import db_session
+from database import db_session, ler_da_replica
 from models import Usuario, PrestadorServico, Servico, Agendamento, TicketSuporte, Pagamento
 from datetime import datetime, timedelta
 from sqlalchemy import func
@@ -18,6 +18,7 @@ def check_admin():
 
 
 @admin_bp.route('/')
+@ler_da_replica
 def dashboard():
     """Dashboard principal do administrador"""
     # Estatísticas básicas
@@ -97,6 +98,7 @@ def meu_perfil():
 
 
 @admin_bp.route('/api/estatisticas')
+@ler_da_replica
 def estatisticas_api():
     """API para estatísticas em tempo real"""
     try:
@@ -120,6 +122,7 @@ def estatisticas_api():
 
 
 @admin_bp.route('/api/agendamentos-semana')
+@ler_da_replica
 def agendamentos_semana_api():
     """API para dados de agendamentos da semana"""
     try:
@@ -4,6 +4,8 @@ from flask_login import current_user, login_required
 from datetime import datetime, timedelta
 from database import db_session
 from models import Agendamento, Servico, PrestadorServico, Notificacao, Conversa
+from paginacao import paginar
+from sqlalchemy import func
 
 agendamentos_bp = Blueprint('agendamentos', __name__, url_prefix='/agendamentos')
 
@@ -130,10 +132,11 @@ def agendar(servico_id):
         )
 
         db_session.add(agendamento)
-        db_session.commit()
+        db_session.flush()
 
-        # Criar notificação para o prestador usando a nova função
+        # Criar notificação para o prestador usando a nova função (na mesma transação)
         notificar_novo_agendamento(agendamento)
+        db_session.commit()
 
         flash('Agendamento realizado com sucesso! Aguarde a confirmação do prestador.', 'success')
         return redirect(url_for('main.dashboard'))
@@ -289,7 +292,7 @@ def disponibilidade(prestador_id):
     # Buscar agendamentos do prestador para a data
     agendamentos = db_session.query(Agendamento).filter(
         Agendamento.prestador_id == prestador_id,
-        db_session.func.date(Agendamento.data_agendamento) == data,
+        func.date(Agendamento.data_agendamento) == data,
         Agendamento.status.in_(['pendente', 'confirmado', 'em_andamento'])
     ).all()
 
@@ -320,9 +323,6 @@ def agendamentos_prestador():
     # Filtros
     status = request.args.get('status', 'todos')
     busca = request.args.get('busca', '')
-    pagina = request.args.get('pagina', 1, type=int)
-    por_pagina = 10
-
     # Query base
     agendamentos_query = db_session.query(Agendamento).filter_by(
         prestador_id=current_user.prestador.id
@@ -340,16 +340,14 @@ def agendamentos_prestador():
             )
         )
 
-    # Paginação manual - CORRIGIDA
-    total_agendamentos = agendamentos_query.count()
-    total_paginas = (total_agendamentos + por_pagina - 1) // por_pagina if total_agendamentos > 0 else 1
-
-    offset = (pagina - 1) * por_pagina
-
-    # Aplicar paginação
-    agendamentos = agendamentos_query.order_by(
-        Agendamento.data_agendamento.desc()
-    ).offset(offset).limit(por_pagina).all()
+    # Paginação por cursor
+    paginacao = paginar(agendamentos_query,
+                        [Agendamento.data_agendamento.desc(), Agendamento.id.desc()],
+                        cursor=request.args.get('cursor'),
+                        por_pagina=10,
+                        total='aproximado',
+                        estrito=False)
+    agendamentos = paginacao.itens
 
     # Estatísticas
     stats = {
@@ -364,19 +362,6 @@ def agendamentos_prestador():
                                                               status='cancelado').count(),
     }
 
-    # Objeto de paginação simulado
-    paginacao = type('Pagina', (), {
-        'page': pagina,
-        'per_page': por_pagina,
-        'total': total_agendamentos,
-        'pages': total_paginas,
-        'has_prev': pagina > 1,
-        'has_next': pagina < total_paginas,
-        'prev_num': pagina - 1,
-        'next_num': pagina + 1,
-        'iter_pages': lambda: range(1, total_paginas + 1) if total_paginas > 0 else [1]
-    })()
-
     return render_template(
         'agendamentos/prestador.html',
         agendamentos=agendamentos,
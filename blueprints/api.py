@@ -1,23 +1,47 @@
 # blueprints/api.py
-from flask import Blueprint, jsonify, request
+import json
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context, url_for
 from flask_login import current_user, login_required
-from database import db_session
-from models import PrestadorServico, Servico, Usuario, Agendamento
+from database import db_session, ler_da_replica
+from models import PrestadorServico, Servico, Agendamento
 from config import config
+from sqlalchemy.orm import joinedload
+from paginacao import paginar, paginar_lista, CursorInvalido
+import busca
+import cache_busca
+import facetas
+import geo
+import ranking
+import sugestoes
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# ?total= das listagens paginadas
+MODOS_TOTAL = {'aproximado': 'aproximado', 'exato': 'exato', '0': None, 'nenhum': None}
+
+
+def modo_total():
+    """Total pedido pelo cliente: aproximado (padrão), exato ou nenhum"""
+    return MODOS_TOTAL.get(request.args.get('total', 'aproximado'), 'aproximado')
+
+
+@api_bp.errorhandler(CursorInvalido)
+def cursor_invalido(e):
+    """Cursor de paginação adulterado ou de outra listagem"""
+    return jsonify({'success': False, 'error': str(e)}), 400
+
 
 # ==================== API PRESTADORES ====================
 
 @api_bp.route('/prestadores', methods=['GET'])
+@ler_da_replica
 def listar_prestadores():
     """API: Lista todos os prestadores"""
     try:
         # Parâmetros da query
         categoria = request.args.get('categoria', '')
         especialidade = request.args.get('especialidade', '')
-        page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 12)), 50)  # Max 50 por página
 
         # Query base
@@ -29,13 +53,20 @@ def listar_prestadores():
         if especialidade:
             query = query.filter(PrestadorServico.especialidade.ilike(f'%{especialidade}%'))
 
-        # Paginação
-        total = query.count()
-        prestadores = query.offset((page - 1) * per_page).limit(per_page).all()
+        query = query.options(
+            joinedload(PrestadorServico.usuario),
+            joinedload(PrestadorServico.resumo_avaliacoes)
+        )
+
+        # Paginação por cursor
+        pagina = paginar(query, [PrestadorServico.id.asc()],
+                         cursor=request.args.get('cursor'),
+                         por_pagina=per_page,
+                         total=modo_total())
 
         # Serializar dados
         dados = []
-        for prestador in prestadores:
+        for prestador in pagina:
             dados.append({
                 'id': prestador.id,
                 'nome': prestador.usuario.nome,
@@ -48,25 +79,22 @@ def listar_prestadores():
                 'valor_hora': float(prestador.valor_hora) if prestador.valor_hora else None,
                 'disponivel': prestador.disponivel == 'sim',
                 'avatar_url': f"/static/avatars/{prestador.categoria}.jpg",
-                'avaliacao_media': 4.8,  # Placeholder
-                'total_avaliacoes': 124  # Placeholder
+                'avaliacao_media': prestador.avaliacao_media,
+                'total_avaliacoes': prestador.total_avaliacoes
             })
 
         return jsonify({
             'success': True,
             'data': dados,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            },
+            'pagination': pagina.como_dict(),
             'filters': {
                 'categoria': categoria,
                 'especialidade': especialidade
             }
         })
 
+    except CursorInvalido:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -75,6 +103,7 @@ def listar_prestadores():
 
 
 @api_bp.route('/prestadores/<int:prestador_id>', methods=['GET'])
+@ler_da_replica
 def obter_prestador(prestador_id):
     """API: Obter detalhes de um prestador específico"""
     try:
@@ -114,8 +143,8 @@ def obter_prestador(prestador_id):
             'servicos': dados_servicos,
             'estatisticas': {
                 'total_servicos': len(servicos),
-                'avaliacao_media': 4.8,
-                'total_avaliacoes': 124,
+                'avaliacao_media': prestador.avaliacao_media,
+                'total_avaliacoes': prestador.total_avaliacoes,
                 'clientes_atendidos': 89
             }
         }
@@ -135,23 +164,27 @@ def obter_prestador(prestador_id):
 # ==================== API SERVIÇOS ====================
 
 @api_bp.route('/servicos', methods=['GET'])
+@ler_da_replica
 def listar_servicos():
     """API: Lista todos os serviços"""
     try:
         categoria = request.args.get('categoria', '')
-        page = int(request.args.get('page', 1))
         per_page = min(int(request.args.get('per_page', 12)), 50)
 
-        query = db_session.query(Servico).join(PrestadorServico)
+        query = db_session.query(Servico).join(PrestadorServico).options(
+            joinedload(Servico.prestador).joinedload(PrestadorServico.usuario)
+        )
 
         if categoria:
             query = query.filter(PrestadorServico.categoria == categoria)
 
-        total = query.count()
-        servicos = query.offset((page - 1) * per_page).limit(per_page).all()
+        pagina = paginar(query, [Servico.id.asc()],
+                         cursor=request.args.get('cursor'),
+                         por_pagina=per_page,
+                         total=modo_total())
 
         dados = []
-        for servico in servicos:
+        for servico in pagina:
             dados.append({
                 'id': servico.id,
                 'titulo': servico.titulo,
@@ -170,14 +203,11 @@ def listar_servicos():
         return jsonify({
             'success': True,
             'data': dados,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagina.como_dict()
         })
 
+    except CursorInvalido:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -281,21 +311,18 @@ def criar_agendamento():
 # ==================== API ESTATÍSTICAS ====================
 
 @api_bp.route('/estatisticas', methods=['GET'])
+@ler_da_replica
 def estatisticas_gerais():
     """API: Estatísticas gerais da plataforma"""
     try:
-        total_prestadores = db_session.query(PrestadorServico).filter_by(disponivel='sim').count()
+        # Prestadores por categoria numa consulta agrupada
+        por_categoria = facetas.contar(db_session.query(PrestadorServico).filter_by(disponivel='sim'),
+                                       ['categoria'])['categoria']
+        total_prestadores = sum(por_categoria.values())
         total_servicos = db_session.query(Servico).count()
         total_agendamentos = db_session.query(Agendamento).count()
 
-        # Contar por categoria
-        categorias_count = {}
-        for cat in config.CATEGORIAS:
-            count = db_session.query(PrestadorServico).filter_by(
-                categoria=cat,
-                disponivel='sim'
-            ).count()
-            categorias_count[cat] = count
+        categorias_count = {cat: por_categoria.get(cat, 0) for cat in config.CATEGORIAS}
 
         return jsonify({
             'success': True,
@@ -319,20 +346,18 @@ def estatisticas_gerais():
 # ==================== API CATEGORIAS ====================
 
 @api_bp.route('/categorias', methods=['GET'])
+@ler_da_replica
 def listar_categorias():
     """API: Lista todas as categorias disponíveis"""
     try:
+        por_categoria = facetas.contar(db_session.query(PrestadorServico).filter_by(disponivel='sim'),
+                                       ['categoria'])['categoria']
         categorias = []
         for cat in config.CATEGORIAS:
-            count = db_session.query(PrestadorServico).filter_by(
-                categoria=cat,
-                disponivel='sim'
-            ).count()
-
             categorias.append({
                 'id': cat,
                 'nome': cat.replace('_', ' ').title(),
-                'total_prestadores': count,
+                'total_prestadores': por_categoria.get(cat, 0),
                 'icone': f'bi-{cat}'  # Placeholder para ícones
             })
 
@@ -351,37 +376,75 @@ def listar_categorias():
 
 
 
+# ==================== API SUGESTÕES ====================
+
+def _destino_sugestao(sugestao):
+    """Para onde a sugestão leva: perfil do prestador, categoria ou busca pelo texto"""
+    if sugestao['tipo'] == 'prestador' and not sugestao['homonimos']:
+        return url_for('servicos.perfil_prestador', prestador_id=sugestao['valor'])
+    if sugestao['tipo'] == 'categoria':
+        return url_for('servicos.buscar', categoria=sugestao['valor'])
+    return url_for('servicos.buscar', q=sugestao['texto'])
+
+
+@api_bp.route('/sugestoes', methods=['GET'])
+def sugestoes_busca():
+    """API: Sugestões da caixa de busca (índice em memória, mais populares primeiro)"""
+    indice = sugestoes.indice()
+    if indice is None:
+        # Índice ainda a ser construído depois do arranque
+        return jsonify({'success': True, 'pronto': False, 'sugestoes': []})
+
+    try:
+        limite = max(1, min(int(request.args.get('limite', config.SUGESTOES_LIMITE)), 20))
+    except ValueError:
+        limite = config.SUGESTOES_LIMITE
+
+    encontradas = indice.sugerir(request.args.get('q', ''), limite)
+    return jsonify({
+        'success': True,
+        'pronto': True,
+        'sugestoes': [dict(sugestao, url=_destino_sugestao(sugestao)) for sugestao in encontradas],
+    })
+
+
 # ==================== API BUSCA AVANÇADA ====================
 
 @api_bp.route('/busca', methods=['GET'])
+@ler_da_replica
 def busca_avancada():
-    """API: Busca avançada por prestadores e serviços"""
+    """
+    API: Busca avançada por prestadores e serviços, paginada por cursor
+    (?per_page= até BUSCA_API_POR_PAGINA_MAX). ?formato=ndjson exporta até
+    BUSCA_EXPORTACAO_MAX resultados, um JSON por linha.
+
+    Por termo ou distância só os BUSCA_LIMITE primeiros resultados são
+    paginados; se a lista chegar ao limite, `total` vem das facetas e
+    `total_is_estimate` é true.
+    """
     try:
         termo = request.args.get('q', '')
         categoria = request.args.get('categoria', '')
         preco_min = request.args.get('preco_min')
         preco_max = request.args.get('preco_max')
         experiencia_min = request.args.get('experiencia_min')
+        ordem = request.args.get('ordem', '')
 
-        if not termo and not categoria:
+        # "Perto de mim": ?lat=&lng= ou ?perto=1 com as coordenadas do perfil
+        try:
+            ponto = geo.ponto_da_busca(request.args, current_user if current_user.is_authenticated else None)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+
+        if not termo and not categoria and not ponto:
             return jsonify({
                 'success': False,
-                'error': 'Termo de busca ou categoria é necessário'
+                'error': 'Termo de busca, categoria ou localização é necessário'
             }), 400
 
         # Buscar prestadores
         query_prestadores = db_session.query(PrestadorServico).filter_by(disponivel='sim')
 
-        if termo:
-            query_prestadores = query_prestadores.filter(
-                (PrestadorServico.especialidade.ilike(f'%{termo}%')) |
-                (PrestadorServico.descricao.ilike(f'%{termo}%')) |
-                (PrestadorServico.usuario.has(Usuario.nome.ilike(f'%{termo}%')))
-            )
-
-        if categoria:
-            query_prestadores = query_prestadores.filter_by(categoria=categoria)
-
         if preco_min:
             query_prestadores = query_prestadores.filter(PrestadorServico.valor_hora >= float(preco_min))
 
@@ -391,12 +454,48 @@ def busca_avancada():
         if experiencia_min:
             query_prestadores = query_prestadores.filter(PrestadorServico.experiencia >= int(experiencia_min))
 
-        prestadores = query_prestadores.all()
+        distancia2 = None
+        if ponto:
+            # Depois dos outros filtros: um filter_by() depois do join usaria a tabela juntada
+            query_prestadores, distancia2 = geo.filtrar_por_cobertura(query_prestadores, *ponto)
+        por_distancia = ponto is not None and (not termo or ordem == 'distancia')
 
-        # Serializar resultados
-        resultados = []
-        for prestador in prestadores:
-            resultados.append({
+        # Contagens por faceta dos resultados; a categoria escolhida não filtra a própria faceta
+        contagens = facetas.contar(busca.filtrar_por_termo(query_prestadores, termo)[0] if termo
+                                   else query_prestadores, categoria=categoria or None)
+        if categoria:
+            query_prestadores = query_prestadores.filter(PrestadorServico.categoria == categoria)
+
+        # Lista de ids em cache (por filtros), a mesma da página de busca para os mesmos filtros
+        filtros = cache_busca.filtros_busca(termo, categoria, ponto, por_distancia,
+                                            preco_min, preco_max, experiencia_min)
+
+        def calcular():
+            if termo:
+                # Por relevância no índice de texto completo (ou distância, se pedido)
+                return busca.ids_por_relevancia(query_prestadores, termo,
+                                                ordem=distancia2 if por_distancia else None)
+            if ponto:
+                return geo.ids_por_distancia(query_prestadores, distancia2, *ponto)
+            return cache_busca.ids_da_listagem(query_prestadores)
+
+        ids = cache_busca.ids(filtros, calcular)
+        # Lista cortada em BUSCA_LIMITE: o total vem das facetas, aproximado
+        cortada = ids is not None and (termo or ponto) and len(ids) >= config.BUSCA_LIMITE
+        # Usuário carregado na mesma consulta (nome e posição de cada resultado)
+        query_pagina = query_prestadores.options(joinedload(PrestadorServico.usuario))
+
+        def pagina(cursor, por_pagina, total=None):
+            """Página a partir de `cursor`: posição na lista em cache ou keyset pela pontuação"""
+            if ids is not None:
+                return paginar_lista(ids, lambda parte: busca.carregar_em_ordem(query_pagina, parte),
+                                     cursor=cursor, por_pagina=por_pagina, assinatura='busca-api',
+                                     total=max(len(ids), facetas.total(contagens, categoria)) if cortada else None,
+                                     total_aproximado=bool(cortada))
+            return paginar(query_pagina, list(ranking.ORDEM), cursor=cursor, por_pagina=por_pagina, total=total)
+
+        def serializar(prestador):
+            return {
                 'tipo': 'prestador',
                 'id': prestador.id,
                 'nome': prestador.usuario.nome,
@@ -404,24 +503,56 @@ def busca_avancada():
                 'especialidade': prestador.especialidade,
                 'experiencia': prestador.experiencia,
                 'valor_hora': float(prestador.valor_hora) if prestador.valor_hora else None,
-                'descricao': prestador.descricao
-            })
+                'descricao': prestador.descricao,
+                'distancia_km': round(geo.distancia_km(*ponto, prestador.usuario.latitude,
+                                                       prestador.usuario.longitude), 1) if ponto else None
+            }
+
+        if request.args.get('formato') == 'ndjson':
+            # Exportação: um resultado por linha, lido e enviado em lotes (memória limitada ao lote)
+            limite = config.BUSCA_EXPORTACAO_MAX
+            primeiro = pagina(request.args.get('cursor'), min(config.BUSCA_EXPORTACAO_LOTE, limite))
+
+            def gerar(lote):
+                enviados = 0
+                while True:
+                    for prestador in lote:
+                        yield json.dumps(serializar(prestador), ensure_ascii=False) + '\n'
+                    enviados += len(lote.itens)
+                    if lote.proximo_cursor is None:
+                        return
+                    if enviados >= limite:
+                        # Para continuar: ?cursor=<next_cursor>
+                        yield json.dumps({'next_cursor': lote.proximo_cursor}) + '\n'
+                        return
+                    lote = pagina(lote.proximo_cursor, min(config.BUSCA_EXPORTACAO_LOTE, limite - enviados))
+
+            return Response(stream_with_context(gerar(primeiro)), mimetype='application/x-ndjson')
+
+        per_page = max(1, min(int(request.args.get('per_page', 20)), config.BUSCA_API_POR_PAGINA_MAX))
+        resultados_pagina = pagina(request.args.get('cursor'), per_page, total=modo_total())
 
         return jsonify({
             'success': True,
             'data': {
-                'resultados': resultados,
-                'total': len(resultados),
+                'resultados': [serializar(prestador) for prestador in resultados_pagina],
+                'total': resultados_pagina.total,
                 'termo_busca': termo,
                 'filtros_aplicados': {
                     'categoria': categoria,
                     'preco_min': preco_min,
                     'preco_max': preco_max,
-                    'experiencia_min': experiencia_min
-                }
-            }
+                    'experiencia_min': experiencia_min,
+                    'perto_de': list(ponto) if ponto else None,
+                    'ordem': 'distancia' if por_distancia else ('relevancia' if termo else None)
+                },
+                'facetas': facetas.listar(contagens)
+            },
+            'pagination': resultados_pagina.como_dict()
         })
 
+    except CursorInvalido:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
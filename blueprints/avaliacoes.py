@@ -1,8 +1,8 @@
 # blueprints/avaliacoes.py
 from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from database import db_session
-from models import Avaliacao, Agendamento, Notificacao, PrestadorServico
+from database import db_session, ler_da_replica
+from models import Avaliacao, Agendamento, Notificacao, PrestadorServico, ResumoAvaliacoes
 from datetime import datetime
 
 avaliacoes_bp = Blueprint('avaliacoes', __name__, url_prefix='/avaliacoes')
@@ -43,7 +43,7 @@ def criar_avaliacao(agendamento_id):
             comentario = request.form.get('comentario', '').strip()
             anonima = request.form.get('anonima') == 'on'
 
-            if not rating:
+            if rating not in ('1', '2', '3', '4', '5'):
                 flash('Por favor, selecione uma avaliação de 1 a 5 estrelas.', 'warning')
                 return render_template('avaliacoes/avaliar.html', agendamento=agendamento)
 
@@ -101,21 +101,12 @@ def minhas_avaliacoes():
             ).order_by(Avaliacao.data_avaliacao.desc()).all()
             tipo = 'recebidas'
 
-        # Calcular estatísticas para prestadores
+        # Estatísticas do prestador vêm do agregado, sem percorrer as avaliações
         estatisticas = None
         if current_user.tipo == 'prestador' and avaliacoes:
-            total_avaliacoes = len(avaliacoes)
-            media_rating = sum(av.rating for av in avaliacoes) / total_avaliacoes
-            distribuicao = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-            for av in avaliacoes:
-                distribuicao[av.rating] += 1
-
-            estatisticas = {
-                'total_avaliacoes': total_avaliacoes,
-                'media_rating': round(media_rating, 1),
-                'distribuicao': distribuicao
-            }
+            resumo = current_user.prestador.resumo_avaliacoes
+            if resumo is not None and resumo.total:
+                estatisticas = resumo.como_dict()
 
         return render_template('avaliacoes/minhas.html',
                                avaliacoes=avaliacoes,
@@ -169,14 +160,13 @@ def responder_avaliacao(avaliacao_id):
 
 
 @avaliacoes_bp.route('/api/estatisticas/<int:prestador_id>')
+@ler_da_replica
 def estatisticas_prestador(prestador_id):
     """API: Estatísticas de avaliações de um prestador"""
     try:
-        avaliacoes = db_session.query(Avaliacao).filter_by(
-            prestador_id=prestador_id
-        ).all()
+        resumo = db_session.get(ResumoAvaliacoes, prestador_id)
 
-        if not avaliacoes:
+        if not resumo or not resumo.total:
             return jsonify({
                 'success': True,
                 'estatisticas': {
@@ -186,27 +176,17 @@ def estatisticas_prestador(prestador_id):
                 }
             })
 
-        total_avaliacoes = len(avaliacoes)
-        media_rating = sum(av.rating for av in avaliacoes) / total_avaliacoes
-        distribuicao = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-        for av in avaliacoes:
-            distribuicao[av.rating] += 1
+        estatisticas = resumo.como_dict()
 
         # Calcular percentuais
-        distribuicao_percent = {
-            stars: (count / total_avaliacoes) * 100
-            for stars, count in distribuicao.items()
+        estatisticas['distribuicao_percent'] = {
+            stars: (count / resumo.total) * 100
+            for stars, count in resumo.distribuicao.items()
         }
 
         return jsonify({
             'success': True,
-            'estatisticas': {
-                'total_avaliacoes': total_avaliacoes,
-                'media_rating': round(media_rating, 1),
-                'distribuicao': distribuicao,
-                'distribuicao_percent': distribuicao_percent
-            }
+            'estatisticas': estatisticas
         })
 
     except Exception as e:
@@ -214,6 +194,7 @@ def estatisticas_prestador(prestador_id):
 
 
 @avaliacoes_bp.route('/api/ultimas/<int:prestador_id>')
+@ler_da_replica
 def ultimas_avaliacoes(prestador_id):
     """API: Últimas avaliações de um prestador"""
     try:
@@ -289,7 +270,7 @@ def avaliar(agendamento_id):
 
             print(f"📨 DEBUG: Dados do form - Rating: '{rating}', Comentário: '{comentario}', Anônima: {anonima}")
 
-            if not rating:
+            if rating not in ('1', '2', '3', '4', '5'):
                 print("❌ RATING VAZIO")
                 flash('Por favor, selecione uma avaliação de 1 a 5 estrelas.', 'warning')
                 return render_template('avaliacoes/avaliar.html', agendamento=agendamento)
@@ -1,12 +1,29 @@
 # blueprints/chat.py
 from flask import Blueprint, render_template, jsonify, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from database import db_session
-from models import Conversa, Mensagem, Agendamento, Usuario, PrestadorServico, Notificacao, Servico
+from database import db_session, ler_da_replica
+from models import Conversa, Mensagem, MensagemArquivada, Agendamento, Usuario, PrestadorServico, Notificacao
+from paginacao import PREFIXO_ARQUIVO, cursor_depois, paginar_com_arquivo
 from datetime import datetime
+import caixa_entrada
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/chat')
 
+# Histórico do chat do mais recente para o mais antigo (paginação por cursor)
+ORDEM_MENSAGENS = [Mensagem.data_envio.desc(), Mensagem.id.desc()]
+
+
+def _mensagem_json(msg):
+    """Mensagem (quente ou arquivada) no formato das APIs do chat"""
+    return {
+        'id': msg.id,
+        'remetente_id': msg.remetente_id,
+        'conteudo': msg.conteudo,
+        'tipo': msg.tipo,
+        'data_envio': msg.data_envio.isoformat(),
+        'lida': msg.lida
+    }
+
 
 @chat_bp.route('/')
 @login_required
@@ -15,71 +32,8 @@ def index():
     try:
         print(f"🔍 CARREGANDO CONVERSAS - Usuário: {current_user.id}, Tipo: {current_user.tipo}")
 
-        # Buscar conversas do usuário
-        if current_user.tipo == 'cliente':
-            conversas = db_session.query(Conversa).filter_by(cliente_id=current_user.id).all()
-            print(f"✅ Cliente: {len(conversas)} conversas encontradas")
-        else:
-            conversas = db_session.query(Conversa).filter_by(prestador_id=current_user.id).all()
-            print(f"✅ Prestador: {len(conversas)} conversas encontradas")
-
-        # Buscar informações completas para cada conversa
-        conversas_completas = []
-        for conversa in conversas:
-            try:
-                # Buscar agendamento
-                agendamento = db_session.query(Agendamento).get(conversa.agendamento_id)
-                if not agendamento:
-                    continue
-
-                # Buscar serviço
-                servico = db_session.query(Servico).get(agendamento.servico_id)
-                if not servico:
-                    continue
-
-                # Buscar informações do outro usuário
-                if current_user.tipo == 'cliente':
-                    # Para cliente, buscar prestador
-                    prestador = db_session.query(PrestadorServico).get(agendamento.prestador_id)
-                    if prestador:
-                        outro_usuario = db_session.query(Usuario).get(prestador.usuario_id)
-                        outro_nome = outro_usuario.nome if outro_usuario else "Prestador"
-                        especialidade = prestador.especialidade
-                    else:
-                        outro_nome = "Prestador"
-                        especialidade = ""
-                else:
-                    # Para prestador, buscar cliente
-                    cliente = db_session.query(Usuario).get(agendamento.cliente_id)
-                    outro_nome = cliente.nome if cliente else "Cliente"
-                    especialidade = "Cliente"
-
-                # Buscar última mensagem
-                ultima_mensagem = db_session.query(Mensagem).filter_by(
-                    conversa_id=conversa.id
-                ).order_by(Mensagem.data_envio.desc()).first()
-
-                # Contar mensagens não lidas
-                mensagens_nao_lidas = db_session.query(Mensagem).filter_by(
-                    conversa_id=conversa.id,
-                    lida=False
-                ).filter(Mensagem.remetente_id != current_user.id).count()
-
-                conversas_completas.append({
-                    'conversa': conversa,
-                    'agendamento': agendamento,
-                    'servico': servico,
-                    'outro_nome': outro_nome,
-                    'especialidade': especialidade,
-                    'ultima_mensagem': ultima_mensagem,
-                    'mensagens_nao_lidas': mensagens_nao_lidas
-                })
-
-                print(f"📋 Conversa {conversa.id}: {outro_nome} - {mensagens_nao_lidas} não lidas")
-
-            except Exception as e:
-                print(f"⚠️  Erro ao processar conversa {conversa.id}: {e}")
-                continue
+        # Conversas com agendamento, serviço, outro participante, última mensagem e não lidas (uma consulta)
+        conversas_completas = caixa_entrada.conversas(db_session, current_user)
 
         print(f"🎯 Total de conversas processadas: {len(conversas_completas)}")
         return render_template('chat/index.html', conversas=conversas_completas)
@@ -538,9 +492,10 @@ def iniciar_conversa(agendamento_id):
 
 
 @chat_bp.route('/api/mensagens/<int:conversa_id>', methods=['GET'])
+@ler_da_replica
 @login_required
 def obter_mensagens(conversa_id):
-    """API: Obter mensagens de uma conversa"""
+    """API: Obter mensagens de uma conversa (só as recentes; as antigas em /anteriores)"""
     try:
         # Verificar permissão
         conversa = db_session.query(Conversa).get(conversa_id)
@@ -549,73 +504,71 @@ def obter_mensagens(conversa_id):
 
         mensagens = db_session.query(Mensagem).filter_by(conversa_id=conversa_id).order_by(Mensagem.data_envio).all()
 
-        dados_mensagens = []
-        for msg in mensagens:
-            dados_mensagens.append({
-                'id': msg.id,
-                'remetente_id': msg.remetente_id,
-                'conteudo': msg.conteudo,
-                'tipo': msg.tipo,
-                'data_envio': msg.data_envio.isoformat(),
-                'lida': msg.lida
-            })
-
-        return jsonify({
+        resposta = {
             'success': True,
-            'mensagens': dados_mensagens,
+            'mensagens': [_mensagem_json(msg) for msg in mensagens],
             'conversa_id': conversa_id
-        })
+        }
+
+        # Só no primeiro carregamento (não no polling): há histórico arquivado?
+        if request.args.get('inicial'):
+            tem_arquivo = db_session.query(MensagemArquivada.id).filter_by(conversa_id=conversa_id).first()
+            resposta['cursor_anteriores'] = (
+                (cursor_depois(ORDEM_MENSAGENS, mensagens[0]) if mensagens else PREFIXO_ARQUIVO)
+                if tem_arquivo else None
+            )
+
+        return jsonify(resposta)
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@chat_bp.route('/api/mensagens/<int:conversa_id>/anteriores', methods=['GET'])
+@ler_da_replica
+@login_required
+def mensagens_anteriores(conversa_id):
+    """API: Mensagens mais antigas, da mais recente para trás; continua no arquivo"""
+    conversa = db_session.query(Conversa).get(conversa_id)
+    if not conversa or (current_user.id not in [conversa.cliente_id, conversa.prestador_id]):
+        return jsonify({'error': 'Acesso não autorizado'}), 403
+
+    pagina = paginar_com_arquivo(
+        db_session.query(Mensagem).filter_by(conversa_id=conversa_id),
+        db_session.query(MensagemArquivada).filter_by(conversa_id=conversa_id),
+        ORDEM_MENSAGENS,
+        [MensagemArquivada.data_envio.desc(), MensagemArquivada.id.desc()],
+        cursor=request.args.get('cursor') or None,
+        por_pagina=min(request.args.get('limite', 50, type=int), 200),
+        estrito=False)
+
+    return jsonify({
+        'success': True,
+        # Em ordem cronológica, para juntar no início da conversa
+        'mensagens': [_mensagem_json(msg) for msg in reversed(pagina.itens)],
+        'cursor_anteriores': pagina.proximo_cursor
+    })
 
 
 @chat_bp.route('/api/conversas', methods=['GET'])
+@ler_da_replica
 @login_required
 def listar_conversas():
     """API: Listar conversas do usuário"""
     try:
-        if current_user.tipo == 'cliente':
-            conversas = db_session.query(Conversa).filter_by(cliente_id=current_user.id).all()
-        else:
-            conversas = db_session.query(Conversa).filter_by(prestador_id=current_user.id).all()
-
         dados_conversas = []
-        for conv in conversas:
-            # Obter última mensagem
-            ultima_msg = db_session.query(Mensagem).filter_by(conversa_id=conv.id).order_by(
-                Mensagem.data_envio.desc()).first()
-
-            # Contar mensagens não lidas
-            mensagens_nao_lidas = db_session.query(Mensagem).filter_by(
-                conversa_id=conv.id,
-                lida=False
-            ).filter(Mensagem.remetente_id != current_user.id).count()
-
-            # Determinar o outro usuário
-            if current_user.tipo == 'cliente':
-                outro_usuario = conv.prestador.usuario
-                categoria = conv.prestador.categoria
-            else:
-                outro_usuario = conv.cliente
-                categoria = 'Cliente'
-
+        for conv in caixa_entrada.conversas(db_session, current_user):
+            ultima_msg = conv['ultima_mensagem']
             dados_conversas.append({
-                'id': conv.id,
-                'agendamento_id': conv.agendamento_id,
-                'outro_usuario': {
-                    'id': outro_usuario.id,
-                    'nome': outro_usuario.nome,
-                    'categoria': categoria
-                },
+                'id': conv['id'],
+                'agendamento_id': conv['agendamento']['id'],
+                'outro_usuario': conv['outro_usuario'],
                 'ultima_mensagem': {
-                    'conteudo': ultima_msg.conteudo if ultima_msg else 'Nenhuma mensagem',
-                    'data': ultima_msg.data_envio.isoformat() if ultima_msg else conv.data_criacao.isoformat()
+                    'conteudo': ultima_msg['conteudo'],
+                    'data': ultima_msg['data_envio'].isoformat()
                 } if ultima_msg else None,
-                'mensagens_nao_lidas': mensagens_nao_lidas,
-                'servico_titulo': conv.agendamento.servico.titulo
+                'mensagens_nao_lidas': conv['mensagens_nao_lidas'],
+                'servico_titulo': conv['servico']['titulo']
             })
 
         return jsonify({
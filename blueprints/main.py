@@ -129,7 +129,8 @@ def dashboard():
                 'agendamentos_pendentes': len([a for a in agendamentos if a.status == 'pendente']),
                 'agendamentos_confirmados': len([a for a in agendamentos if a.status == 'confirmado']),
                 'agendamentos_concluidos': len([a for a in agendamentos if a.status == 'concluido']),
-                'avaliacao_media': 4.8,  # Placeholder - implementar cálculo real
+                'avaliacao_media': prestador.avaliacao_media,
+                'total_avaliacoes': prestador.total_avaliacoes,
                 'faturamento_mes': calcular_faturamento_prestador(prestador.id),
             }
 
@@ -451,9 +452,9 @@ def perfil_alternativo(prestador_id):
 def atualizar_banco():
     """Rota para atualizar o banco"""
     try:
-        # Criar tabelas que não existem
-        from models import Base
-        Base.metadata.create_all(bind=db_session.bind)
+        # Aplicar as migrações pendentes (mesmo que `python migracoes.py`)
+        import migracoes
+        migracoes.migrar()
 
         return '''
         <div style="padding: 20px; text-align: center;">
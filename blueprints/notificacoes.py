@@ -1,28 +1,37 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
 from flask_login import current_user, login_required
 from datetime import datetime
-from database import db_session
-from models import Notificacao
+from database import db_session, ler_da_replica
+from models import Notificacao, NotificacaoArquivada
+from paginacao import paginar_com_arquivo
 
 notificacoes_bp = Blueprint('notificacoes', __name__, url_prefix='/notificacoes')
 
+def _buscar_notificacao(notificacao_id):
+    """Notificação pelo id, na tabela quente ou no arquivo (o id é mantido ao arquivar)"""
+    return (db_session.get(Notificacao, notificacao_id)
+            or db_session.get(NotificacaoArquivada, notificacao_id))
+
 @notificacoes_bp.route('/')
 @login_required
 def listar():
     """Listar notificações do usuário"""
-    pagina = request.args.get('pagina', 1, type=int)
-    por_pagina = 20
-
     notificacoes_query = db_session.query(Notificacao).filter_by(
         usuario_id=current_user.id
-    ).order_by(Notificacao.data_criacao.desc())
-
-    # Paginação manual
-    total = notificacoes_query.count()
-    total_paginas = (total + por_pagina - 1) // por_pagina if total > 0 else 1
-    offset = (pagina - 1) * por_pagina
-
-    notificacoes = notificacoes_query.offset(offset).limit(por_pagina).all()
+    )
+    arquivo_query = db_session.query(NotificacaoArquivada).filter_by(
+        usuario_id=current_user.id
+    )
+
+    # Paginação por cursor; depois das recentes continua no arquivo
+    paginacao = paginar_com_arquivo(notificacoes_query, arquivo_query,
+                                    [Notificacao.data_criacao.desc(), Notificacao.id.desc()],
+                                    [NotificacaoArquivada.data_criacao.desc(), NotificacaoArquivada.id.desc()],
+                                    cursor=request.args.get('cursor'),
+                                    por_pagina=20,
+                                    total='aproximado',
+                                    estrito=False)
+    notificacoes = paginacao.itens
 
     # Marcar como lidas
     for notificacao in notificacoes:
@@ -38,15 +47,14 @@ def listar():
 
     return render_template('notificacoes/listar.html',
                          notificacoes=notificacoes,
-                         pagina=pagina,
-                         total_paginas=total_paginas,
-                         total=total)
+                         paginacao=paginacao,
+                         total=paginacao.total)
 
 @notificacoes_bp.route('/<int:notificacao_id>/ler')
 @login_required
 def ler(notificacao_id):
     """Marcar notificação como lida e redirecionar"""
-    notificacao = db_session.query(Notificacao).get(notificacao_id)
+    notificacao = _buscar_notificacao(notificacao_id)
 
     if not notificacao or notificacao.usuario_id != current_user.id:
         flash('Notificação não encontrada.', 'warning')
@@ -77,6 +85,7 @@ def marcar_todas_lidas():
     return redirect(url_for('notificacoes.listar'))
 
 @notificacoes_bp.route('/api/nao-lidas')
+@ler_da_replica
 @login_required
 def api_nao_lidas():
     """API: Contar notificações não lidas"""
@@ -91,7 +100,7 @@ def api_nao_lidas():
 @login_required
 def excluir(notificacao_id):
     """Excluir notificação"""
-    notificacao = db_session.query(Notificacao).get(notificacao_id)
+    notificacao = _buscar_notificacao(notificacao_id)
 
     if not notificacao or notificacao.usuario_id != current_user.id:
         flash('Notificação não encontrada.', 'warning')
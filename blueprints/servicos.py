@@ -1,21 +1,34 @@
 # blueprints/servicos.py
 from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
-from database import db_session
+from config import config
+from database import db_session, ler_da_replica
 from models import PrestadorServico, Servico, CategoriaServico
-from sqlalchemy import or_
+from paginacao import paginar, paginar_lista
+import busca
+import cache_busca
+import facetas
+import geo
+import ranking
 
 servicos_bp = Blueprint('servicos', __name__, url_prefix='/servicos')
 
 
 @servicos_bp.route('/buscar')
+@ler_da_replica
 def buscar():
     """Busca de serviços com categorias dinâmicas"""
     try:
         categoria = request.args.get('categoria', '')
         q = request.args.get('q', '')
-        page = int(request.args.get('page', 1))
-        per_page = 12
+
+        # "Perto de mim": ?lat=&lng= ou ?perto=1 com as coordenadas do perfil
+        try:
+            ponto = geo.ponto_da_busca(request.args, current_user if current_user.is_authenticated else None)
+        except ValueError:
+            flash('Localização inválida', 'warning')
+            ponto = None
+        por_distancia = ponto is not None and (not q or request.args.get('ordem') == 'distancia')
 
         # Buscar categorias do banco
         categorias = db_session.query(CategoriaServico).filter_by(ativa=True).order_by(CategoriaServico.ordem).all()
@@ -23,28 +36,66 @@ def buscar():
         # Consulta base
         query = db_session.query(PrestadorServico).filter_by(disponivel='sim')
 
+        distancia2 = None
+        if ponto:
+            # Só quem tem o cliente dentro do raio de atuação
+            query, distancia2 = geo.filtrar_por_cobertura(query, *ponto)
+
+        # Prestadores por categoria para os mesmos termo/localização, numa consulta agrupada
+        contagens = facetas.contar(busca.filtrar_por_termo(query, q)[0] if q else query, ['categoria'])
+
         # Aplicar filtros
         if categoria:
             query = query.filter(PrestadorServico.categoria == categoria)
 
-        if q:
-            query = query.filter(
-                or_(
-                    PrestadorServico.especialidade.ilike(f'%{q}%'),
-                    PrestadorServico.descricao.ilike(f'%{q}%'),
-                    PrestadorServico.categoria.ilike(f'%{q}%')
-                )
-            )
-
-        total = query.count()
-        prestadores = query.offset((page - 1) * per_page).limit(per_page).all()
+        # Lista de ids em cache (por filtros); só a página é carregada do banco
+        filtros = cache_busca.filtros_busca(q, categoria, ponto, por_distancia)
+        if q or ponto:
+            # Por relevância (índice de texto completo) ou distância
+            def calcular():
+                if q:
+                    return busca.ids_por_relevancia(query, q, ordem=distancia2 if por_distancia else None)
+                return geo.ids_por_distancia(query, distancia2, *ponto)
+            ids = cache_busca.ids(filtros, calcular)
+            assinatura = 'distancia' if por_distancia else 'busca'
+        else:
+            ids = cache_busca.ids(filtros, lambda: cache_busca.ids_da_listagem(query))
+            assinatura = 'listagem'
+
+        if ids is not None:
+            # Por termo ou distância a lista para em BUSCA_LIMITE: aí o total vem das contagens
+            cortada = (q or ponto) and len(ids) >= config.BUSCA_LIMITE
+            paginacao = paginar_lista(ids, lambda parte: busca.carregar_em_ordem(query, parte),
+                                      cursor=request.args.get('cursor'),
+                                      por_pagina=12,
+                                      estrito=False,
+                                      assinatura=assinatura,
+                                      total=max(len(ids), facetas.total(contagens, categoria)) if cortada else None,
+                                      total_aproximado=bool(cortada))
+        else:
+            # Listagem grande demais para o cache: keyset no banco
+            paginacao = paginar(query, list(ranking.ORDEM),
+                                cursor=request.args.get('cursor'),
+                                por_pagina=12,
+                                total='aproximado',
+                                estrito=False)
+        prestadores = paginacao.itens
+
+        distancias = {}
+        if ponto:
+            distancias = {prestador.id: geo.distancia_km(*ponto, prestador.usuario.latitude, prestador.usuario.longitude)
+                          for prestador in prestadores}
 
         search_stats = {
-            'total': total,
-            'pagina_atual': page,
-            'total_paginas': (total + per_page - 1) // per_page,
+            'total': paginacao.total,
+            'paginacao': paginacao,
             'categoria_selecionada': categoria,
-            'categorias': categorias
+            'categorias': categorias,
+            'contagens_categorias': contagens['categoria'],
+            'distancias': distancias,
+            # Parâmetros repetidos nos links de paginação
+            'filtros': {nome: request.args[nome] for nome in ('q', 'categoria', 'perto', 'lat', 'lng', 'ordem')
+                        if request.args.get(nome)},
         }
 
         return render_template('servicos/buscar.html',
@@ -58,6 +109,7 @@ def buscar():
 
 
 @servicos_bp.route('/prestador/<int:prestador_id>')
+@ler_da_replica
 def perfil_prestador(prestador_id):
     """Perfil do prestador - COM TEU LAYOUT PROFISSIONAL"""
     try:
@@ -0,0 +1,316 @@
+# busca.py
+"""
+Índice de texto completo dos prestadores (busca por termo).
+
+Um documento por prestador com o nome do usuário, a especialidade, a
+categoria, a descrição e o texto dos serviços ativos (título, descrição, tags):
+
+  - SQLite: tabela virtual FTS5 `busca_prestadores` (rowid = id do prestador),
+    tokenizador unicode61 sem acentos, ordenada por bm25 com BUSCA_PESOS;
+  - MySQL: tabela `busca_prestadores` com índice FULLTEXT, MATCH ... AGAINST
+    em modo booleano, ordenada pela pontuação do MATCH.
+
+O texto dos documentos e os termos da busca passam pela mesma normalização
+(normalizacao.py: minúsculas, sem acentos, radical leve), então "medicos"
+encontra "Médica" e "cozinheira" encontra "cozinheiro". Cada termo é um
+prefixo ("eletri" encontra "eletricista") e todos têm de aparecer.
+
+O índice é atualizado na mesma transação das escritas (evento after_flush):
+alterações em PrestadorServico, Servico ou no nome do Usuario regravam os
+documentos dos prestadores afetados. A migração 5 cria e preenche o índice;
+depois de alterações fora do ORM (SQL manual, carga de dados):
+
+    python busca.py --reindexar
+    python busca.py eletricista maputo   # testa uma busca
+
+Noutros bancos, ou se o índice não existir, a busca volta ao ILIKE.
+"""
+import sys
+import time
+from collections import defaultdict
+
+from sqlalchemy import column, delete, event, false, func, inspect, literal_column, or_, select, table, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from alteracoes import prestadores_alterados
+from config import config
+from database import engine
+from models import CategoriaServico, PrestadorServico, Servico, Usuario
+from normalizacao import normalizar, palavras
+
+TABELA = 'busca_prestadores'
+COLUNAS = ['nome', 'especialidade', 'categoria', 'descricao', 'servicos']
+# Coluna com o id do prestador em cada dialeto
+CHAVE = {'sqlite': 'rowid', 'mysql': 'prestador_id'}
+
+DDL = {
+    'sqlite': f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA} USING fts5(
+            {', '.join(COLUNAS)},
+            tokenize = 'unicode61 remove_diacritics 2'
+        )""",
+    'mysql': f"""
+        CREATE TABLE IF NOT EXISTS {TABELA} (
+            prestador_id INT NOT NULL PRIMARY KEY,
+            nome VARCHAR(100),
+            especialidade VARCHAR(100),
+            categoria VARCHAR(150),
+            descricao TEXT,
+            servicos MEDIUMTEXT,
+            FULLTEXT KEY ft_{TABELA} ({', '.join(COLUNAS)})
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+}
+
+# Campos que entram no documento: alterar um deles regrava o prestador
+CAMPOS_INDEXADOS = {
+    PrestadorServico: ('especialidade', 'descricao', 'categoria', 'categoria_id', 'usuario_id'),
+    Servico: ('titulo', 'descricao', 'tags', 'ativo', 'prestador_id'),
+}
+
+_disponivel = set()  # URLs dos engines em que o índice já foi encontrado
+
+
+def _indice(dialeto):
+    return table(TABELA, column(CHAVE[dialeto]), *[column(nome) for nome in COLUNAS])
+
+
+def indice_disponivel(bind):
+    """O banco (engine ou conexão) tem o índice de texto completo?"""
+    if bind.dialect.name not in CHAVE:
+        return False
+    url = str(bind.engine.url)
+    if url in _disponivel:
+        return True
+    # Só o resultado positivo fica em cache: a migração pode criá-lo depois
+    if inspect(bind).has_table(TABELA):
+        _disponivel.add(url)
+        return True
+    return False
+
+
+def criar_indice(bind):
+    """Cria a tabela do índice se faltar; False se o banco não tiver FTS5/FULLTEXT"""
+    dialeto = bind.dialect.name
+    if dialeto not in DDL:
+        return False
+    try:
+        with bind.begin() as conn:
+            conn.execute(text(DDL[dialeto]))
+    except DBAPIError as e:
+        print(f"⚠️  Índice de busca não criado ({e.orig}); a busca usa ILIKE")
+        return False
+    return True
+
+
+# ==================== DOCUMENTOS ====================
+
+def _texto_tags(tags):
+    if isinstance(tags, (list, tuple)):
+        return ' '.join(str(tag) for tag in tags)
+    return str(tags or '')
+
+
+def documentos(conn, ids):
+    """Documento de cada prestador em `ids`, numa consulta para os prestadores e outra para os serviços"""
+    prestadores, usuarios = PrestadorServico.__table__, Usuario.__table__
+    categorias, servicos = CategoriaServico.__table__, Servico.__table__
+
+    textos = defaultdict(list)
+    for linha in conn.execute(select(servicos.c.prestador_id, servicos.c.titulo, servicos.c.descricao, servicos.c.tags)
+                              .where(servicos.c.prestador_id.in_(ids), servicos.c.ativo.isnot(False))
+                              .order_by(servicos.c.id)):
+        textos[linha.prestador_id].append(' '.join(filter(None, [linha.titulo, linha.descricao, _texto_tags(linha.tags)])))
+
+    consulta = (select(prestadores.c.id, usuarios.c.nome, prestadores.c.especialidade, prestadores.c.categoria,
+                       categorias.c.nome.label('nome_categoria'), prestadores.c.descricao)
+                .select_from(prestadores
+                             .outerjoin(usuarios, usuarios.c.id == prestadores.c.usuario_id)
+                             .outerjoin(categorias, categorias.c.id == prestadores.c.categoria_id))
+                .where(prestadores.c.id.in_(ids)))
+    # Gravado já normalizado: a consulta compara radicais, sem funções sobre as linhas
+    return [{
+        'id': linha.id,
+        'nome': normalizar(linha.nome),
+        'especialidade': normalizar(linha.especialidade),
+        # O slug (personal_trainer) e o nome da categoria (Personal Trainer)
+        'categoria': normalizar(f'{linha.categoria or ""} {linha.nome_categoria or ""}'),
+        'descricao': normalizar(linha.descricao),
+        'servicos': normalizar(' '.join(textos.get(linha.id, []))),
+    } for linha in conn.execute(consulta)]
+
+
+def _inserir(conn, documentos):
+    if not documentos:
+        return
+    dialeto = conn.dialect.name
+    chave = CHAVE[dialeto]
+    conn.execute(_indice(dialeto).insert(),
+                 [{chave: documento['id'], **{nome: documento[nome] for nome in COLUNAS}} for documento in documentos])
+
+
+def gravar_documentos(conn, ids):
+    """Regrava (ou remove, se o prestador já não existe) os documentos de `ids`"""
+    ids = sorted(set(ids))
+    dialeto = conn.dialect.name
+    indice = _indice(dialeto)
+    chave = indice.c[CHAVE[dialeto]]
+    for inicio in range(0, len(ids), config.BUSCA_LOTE):
+        parte = ids[inicio:inicio + config.BUSCA_LOTE]
+        conn.execute(delete(indice).where(chave.in_(parte)))
+        _inserir(conn, documentos(conn, parte))
+    return len(ids)
+
+
+def reindexar(bind=engine, lote=None, ao_avancar=None):
+    """Reconstrói o índice inteiro, uma transação curta por faixa de ids"""
+    if not indice_disponivel(bind):
+        raise RuntimeError(f'{TABELA} não existe; rode "python migracoes.py"')
+
+    lote = lote or config.BUSCA_LOTE
+    dialeto = bind.dialect.name
+    indice = _indice(dialeto)
+    chave = indice.c[CHAVE[dialeto]]
+    prestadores = PrestadorServico.__table__
+
+    with bind.connect() as conn:
+        maximo = max(conn.execute(select(func.max(prestadores.c.id))).scalar() or 0,
+                     conn.execute(select(func.max(chave))).scalar() or 0)
+
+    atual = gravados = 0
+    while atual < maximo:
+        fim = min(atual + lote, maximo)
+        with bind.begin() as conn:
+            # A faixa inteira: também remove documentos de prestadores apagados fora do ORM
+            conn.execute(delete(indice).where(chave > atual, chave <= fim))
+            ids = conn.execute(select(prestadores.c.id)
+                               .where(prestadores.c.id > atual, prestadores.c.id <= fim)).scalars().all()
+            if ids:
+                novos = documentos(conn, ids)
+                _inserir(conn, novos)
+                gravados += len(novos)
+        atual = fim
+        if ao_avancar:
+            ao_avancar()
+
+    if dialeto == 'sqlite':
+        with bind.begin() as conn:
+            conn.execute(text(f"INSERT INTO {TABELA}({TABELA}) VALUES ('optimize')"))
+    return gravados
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_indice(session, flush_context):
+    """Mantém busca_prestadores na mesma transação das alterações"""
+    prestadores = prestadores_alterados(session, CAMPOS_INDEXADOS, ('nome',))
+    if not prestadores:
+        return
+
+    conn = session.connection()
+    if indice_disponivel(conn):
+        gravar_documentos(conn, prestadores)
+
+
+# ==================== BUSCA ====================
+
+def termos(texto):
+    """Termos da busca normalizados como os documentos (no máximo BUSCA_MAX_TERMOS)"""
+    return list(dict.fromkeys(palavras(texto)))[:config.BUSCA_MAX_TERMOS]
+
+
+def _filtro_ilike(texto):
+    """Sem índice: o ILIKE de antes sobre as mesmas colunas"""
+    padrao = f'%{texto}%'
+    return or_(
+        PrestadorServico.especialidade.ilike(padrao),
+        PrestadorServico.descricao.ilike(padrao),
+        PrestadorServico.categoria.ilike(padrao),
+        PrestadorServico.usuario.has(Usuario.nome.ilike(padrao)),
+        PrestadorServico.servicos.any(or_(Servico.titulo.ilike(padrao), Servico.descricao.ilike(padrao))),
+    )
+
+
+def filtrar_por_termo(query, texto):
+    """
+    Restringe uma consulta de PrestadorServico aos prestadores que casam com
+    `texto`. Devolve (consulta, expressão para ordenar do mais para o menos
+    relevante).
+
+    A relevância do texto é multiplicada por 1 + RANKING_PESO_BUSCA × pontuação:
+    entre resultados parecidos, os prestadores mais bem pontuados vêm antes.
+    """
+    palavras = termos(texto)
+    bind = query.session.get_bind()
+    dialeto = bind.dialect.name
+    qualidade = 1 + config.RANKING_PESO_BUSCA * PrestadorServico.pontuacao
+
+    if not palavras:
+        return query.filter(false()), PrestadorServico.pontuacao.desc()
+    if not indice_disponivel(bind):
+        return query.filter(_filtro_ilike(texto.strip())), PrestadorServico.pontuacao.desc()
+    if dialeto == 'sqlite':
+        indice = _indice(dialeto)
+        expressao = ' '.join(f'"{palavra}"*' for palavra in palavras)
+        # bm25: quanto mais negativo, mais relevante
+        relevancia = func.bm25(literal_column(TABELA), *[config.BUSCA_PESOS[nome] for nome in COLUNAS])
+        return (query.join(indice, indice.c.rowid == PrestadorServico.id)
+                .filter(literal_column(TABELA).op('MATCH')(expressao))), relevancia * qualidade
+
+    from sqlalchemy.dialects.mysql import match
+    indice = _indice(dialeto)
+    expressao = ' '.join(f'+{palavra}*' for palavra in palavras)
+    relevancia = match(*[indice.c[nome] for nome in COLUNAS], against=expressao).in_boolean_mode()
+    return (query.join(indice, indice.c.prestador_id == PrestadorServico.id)
+            .filter(relevancia > 0)), (relevancia * qualidade).desc()
+
+
+def ids_por_relevancia(query, texto, limite=None, ordem=None):
+    """
+    Ids dos prestadores de `query` (consulta de PrestadorServico com os filtros
+    da rota) que casam com `texto`, do mais para o menos relevante.
+
+    ordem: expressão que vem antes da relevância (ex.: a distância do geo.py)
+    """
+    if not termos(texto):
+        return []
+
+    consulta = query.with_entities(PrestadorServico.id).order_by(None)
+    if ordem is not None:
+        consulta = consulta.order_by(ordem)
+    consulta, relevancia = filtrar_por_termo(consulta, texto)
+    consulta = consulta.order_by(relevancia, PrestadorServico.id)
+    return [linha[0] for linha in consulta.limit(limite or config.BUSCA_LIMITE).all()]
+
+
+def carregar_em_ordem(query, ids):
+    """Prestadores de `ids` numa consulta, na ordem da lista"""
+    if not ids:
+        return []
+    por_id = {prestador.id: prestador for prestador in query.filter(PrestadorServico.id.in_(ids))}
+    return [por_id[id_] for id_ in ids if id_ in por_id]
+
+
+if __name__ == "__main__":
+    try:
+        if '--reindexar' in sys.argv:
+            inicio = time.perf_counter()
+            total = reindexar()
+            print(f"✅ {total} prestador(es) indexado(s) em {time.perf_counter() - inicio:.1f}s")
+            sys.exit(0)
+
+        from database import db_session
+        texto = ' '.join(sys.argv[1:])
+        if not texto:
+            print('Uso: python busca.py --reindexar | python busca.py <termos>')
+            sys.exit(1)
+
+        print(f"🔍 Índice de texto completo: {'sim' if indice_disponivel(engine) else 'não (ILIKE)'}")
+        inicio = time.perf_counter()
+        ids = ids_por_relevancia(db_session.query(PrestadorServico), texto)
+        print(f"📊 {len(ids)} resultado(s) em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+        for prestador in carregar_em_ordem(db_session.query(PrestadorServico), ids[:10]):
+            print(f"   {prestador.id:>6}  {prestador.especialidade} ({prestador.categoria})")
+
+    except Exception as e:
+        print(f"❌ Erro na busca: {e}")
+        sys.exit(1)
@@ -0,0 +1,267 @@
+# cache_busca.py
+"""
+Cache dos resultados da busca: a lista ordenada de ids de cada combinação de filtros.
+
+As mesmas buscas repetem-se (servicos.buscar?categoria=medico,
+/api/busca?q=personal). A lista de ids fica em memória e cada página carrega
+só os seus prestadores (paginar_lista / carregar_em_ordem), então uma busca
+repetida não consulta o banco para achar os resultados.
+
+- chave: os filtros normalizados (termos como no índice e sem ordem,
+  categoria, preços, experiência, ponto e ordenação): "Médicos" e "medico"
+  partilham a entrada;
+- LRU limitado pelo total de ids guardados (BUSCA_CACHE_IDS) e TTL de
+  BUSCA_CACHE_TTL segundos, que também é o atraso máximo para escritas feitas
+  noutros processos;
+- depois de cada commit que altera prestadores (PrestadorServico, Servico, o
+  nome, a cidade ou as coordenadas do Usuario) saem as entradas que tinham um
+  desses prestadores e as que ele passou a satisfazer: disponível, mesma
+  categoria, dentro dos preços/experiência e com todos os termos no documento
+  da busca. O mesmo commit muda geracao(), que descarta as contagens do
+  facetas.py.
+
+Em debug, X-Busca-Cache diz se o pedido usou o cache (hit/miss); /debug-busca-cache
+mostra os contadores.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import abort, g, has_request_context, jsonify
+from flask_login import current_user
+from sqlalchemy import select
+
+import busca
+import ranking
+from alteracoes import depois_do_commit, prestadores_alterados
+from config import config
+from database import engine
+from models import PrestadorServico, Servico
+
+# Campos que mudam o resultado de alguma busca ou as suas facetas (disponivel_online, cidade)
+CAMPOS = {
+    PrestadorServico: ('usuario_id', 'categoria', 'categoria_id', 'especialidade', 'descricao', 'disponivel',
+                       'valor_hora', 'experiencia', 'raio_atuacao', 'disponivel_online'),
+    Servico: ('prestador_id', 'titulo', 'descricao', 'tags', 'ativo'),
+}
+CAMPOS_USUARIO = ('nome', 'cidade', 'coordenadas', 'latitude', 'longitude')
+
+_lock = threading.Lock()
+_entradas = OrderedDict()   # chave -> Entrada, da usada há mais tempo para a mais recente
+_total_ids = 0
+_geracao = 0                # muda a cada invalidação: listas calculadas antes não são guardadas
+_contadores = {'acertos': 0, 'falhas': 0, 'invalidadas': 0, 'expiradas': 0, 'despejadas': 0}
+
+
+class Entrada:
+    __slots__ = ('filtros', 'ids', 'conjunto', 'expira_em')
+
+    def __init__(self, filtros, ids, expira_em):
+        self.filtros = filtros
+        self.ids = ids            # None: lista grande demais, a rota pagina no banco
+        self.conjunto = frozenset(ids or ())
+        self.expira_em = expira_em
+
+    @property
+    def tamanho(self):
+        return len(self.ids or ()) + 1
+
+
+def filtros_busca(termo='', categoria='', ponto=None, por_distancia=False,
+                  preco_min=None, preco_max=None, experiencia_min=None):
+    """Filtros de uma busca normalizados: o que decide a lista de ids (e a chave do cache)"""
+    def numero(valor, tipo):
+        return tipo(valor) if valor not in (None, '') else None
+
+    return {
+        'termos': tuple(sorted(busca.termos(termo))) if termo else None,
+        'categoria': categoria or None,
+        'ponto': tuple(ponto) if ponto else None,
+        'por_distancia': bool(por_distancia),
+        'preco_min': numero(preco_min, float),
+        'preco_max': numero(preco_max, float),
+        'experiencia_min': numero(experiencia_min, int),
+    }
+
+
+def ids_da_listagem(query):
+    """Ids de `query` da melhor para a pior pontuação (a listagem sem termo nem localização), um além do que se guarda"""
+    consulta = query.with_entities(PrestadorServico.id).order_by(*ranking.ORDEM)
+    return [linha.id for linha in consulta.limit(config.BUSCA_CACHE_IDS_ENTRADA + 1)]
+
+
+def _chave(filtros):
+    return tuple(sorted(filtros.items()))
+
+
+def _marcar(resultado):
+    if has_request_context():
+        g.busca_cache = resultado
+
+
+def _remover(chave):
+    global _total_ids
+    entrada = _entradas.pop(chave, None)
+    if entrada is not None:
+        _total_ids -= entrada.tamanho
+
+
+def ids(filtros, calcular):
+    """
+    Ids da busca com `filtros`, do cache ou de `calcular()` (que fica guardado).
+    None se a lista passar de BUSCA_CACHE_IDS_ENTRADA: a rota pagina no banco.
+    """
+    global _total_ids
+    if not config.BUSCA_CACHE_ATIVO:
+        resultado = list(calcular())
+        return resultado if len(resultado) <= config.BUSCA_CACHE_IDS_ENTRADA else None
+
+    chave = _chave(filtros)
+    agora = time.monotonic()
+    with _lock:
+        entrada = _entradas.get(chave)
+        if entrada is not None and entrada.expira_em <= agora:
+            _remover(chave)
+            _contadores['expiradas'] += 1
+            entrada = None
+        if entrada is not None:
+            _entradas.move_to_end(chave)
+            _contadores['acertos'] += 1
+        else:
+            _contadores['falhas'] += 1
+        geracao = _geracao
+
+    if entrada is not None:
+        _marcar('hit')
+        return entrada.ids
+
+    _marcar('miss')
+    resultado = tuple(calcular())
+    if len(resultado) > config.BUSCA_CACHE_IDS_ENTRADA:
+        resultado = None
+
+    with _lock:
+        # Um commit invalidou o cache enquanto se calculava: a lista pode já estar velha
+        if geracao == _geracao:
+            _remover(chave)
+            entrada = _entradas[chave] = Entrada(filtros, resultado, agora + config.BUSCA_CACHE_TTL)
+            _total_ids += entrada.tamanho
+            while _total_ids > config.BUSCA_CACHE_IDS and len(_entradas) > 1:
+                _remover(next(iter(_entradas)))
+                _contadores['despejadas'] += 1
+    return resultado
+
+
+# ==================== INVALIDAÇÃO ====================
+
+def _estado_prestadores(conn, ids, com_documentos):
+    """Linhas atuais dos prestadores (disponivel, categoria, preço, experiência) e as palavras do documento"""
+    tabela = PrestadorServico.__table__
+    linhas = conn.execute(select(tabela.c.id, tabela.c.disponivel, tabela.c.categoria,
+                                 tabela.c.valor_hora, tabela.c.experiencia)
+                          .where(tabela.c.id.in_(ids))).all()
+
+    # Sem o índice a busca é ILIKE (substring): na dúvida, qualquer termo pode casar
+    palavras = {}
+    if com_documentos and busca.indice_disponivel(conn):
+        palavras = {documento['id']: ' '.join(valor for campo, valor in documento.items() if campo != 'id').split()
+                    for documento in busca.documentos(conn, ids)}
+    return [(linha, palavras.get(linha.id) if palavras else None) for linha in linhas]
+
+
+def _pode_conter(filtros, linha, palavras):
+    """O prestador satisfaz os filtros da entrada? (localização: na dúvida, sim)"""
+    if linha.disponivel != 'sim':
+        return False
+    if filtros['categoria'] and filtros['categoria'] != linha.categoria:
+        return False
+    if filtros['preco_min'] is not None and (linha.valor_hora is None or linha.valor_hora < filtros['preco_min']):
+        return False
+    if filtros['preco_max'] is not None and (linha.valor_hora is None or linha.valor_hora > filtros['preco_max']):
+        return False
+    if filtros['experiencia_min'] is not None and (linha.experiencia is None
+                                                   or linha.experiencia < filtros['experiencia_min']):
+        return False
+    if filtros['termos'] and palavras is not None:
+        return all(any(palavra.startswith(termo) for palavra in palavras) for termo in filtros['termos'])
+    return True
+
+
+def invalidar(prestadores, bind=engine):
+    """Descarta as entradas em que os prestadores alterados estavam ou podem passar a estar"""
+    global _geracao
+    with _lock:
+        _geracao += 1
+        entradas = list(_entradas.items())
+    if not entradas:
+        return 0
+
+    with bind.connect() as conn:
+        estado = _estado_prestadores(conn, list(prestadores),
+                                     com_documentos=any(entrada.filtros['termos'] for _, entrada in entradas))
+
+    afetadas = [chave for chave, entrada in entradas
+                if not entrada.conjunto.isdisjoint(prestadores)
+                or any(_pode_conter(entrada.filtros, linha, palavras) for linha, palavras in estado)]
+    with _lock:
+        for chave in afetadas:
+            _remover(chave)
+        _contadores['invalidadas'] += len(afetadas)
+    return len(afetadas)
+
+
+def geracao():
+    """Muda a cada commit que altera prestadores e em limpar(): caches derivados da busca comparam-na"""
+    return _geracao
+
+
+def limpar():
+    """Esvazia o cache (ex.: depois de alterações fora do ORM)"""
+    global _total_ids, _geracao
+    with _lock:
+        _entradas.clear()
+        _total_ids = 0
+        _geracao += 1
+
+
+def _guardar_alterados(session, prestadores):
+    """Junta os prestadores alterados pelo flush; as entradas só saem depois do commit"""
+    prestadores.update(prestadores_alterados(session, CAMPOS, CAMPOS_USUARIO))
+
+
+def _invalidar_alterados(prestadores):
+    try:
+        invalidar(prestadores)
+    except Exception:
+        # Sem saber o que mudou, nada do que está em cache é confiável
+        limpar()
+
+
+depois_do_commit('cache_busca_pendentes', _guardar_alterados, _invalidar_alterados)
+
+
+def relatorio():
+    """Contadores e ocupação do cache"""
+    with _lock:
+        consultas = _contadores['acertos'] + _contadores['falhas']
+        return dict(_contadores,
+                    entradas=len(_entradas),
+                    ids=_total_ids,
+                    taxa_acertos=round(_contadores['acertos'] / consultas, 3) if consultas else None)
+
+
+def init_app(app):
+    """Cabeçalho X-Busca-Cache em debug e a rota /debug-busca-cache"""
+
+    @app.after_request
+    def _cabecalho_cache(response):
+        if (app.debug or config.DEBUG) and g.get('busca_cache'):
+            response.headers['X-Busca-Cache'] = g.busca_cache
+        return response
+
+    @app.route('/debug-busca-cache')
+    def debug_busca_cache():
+        """Debug: acertos, falhas e ocupação do cache de resultados da busca"""
+        if not (app.debug or config.DEBUG) and not (current_user.is_authenticated and current_user.tipo == 'admin'):
+            abort(404)
+        return jsonify(relatorio())
@@ -0,0 +1,284 @@
+# caixa_entrada.py
+"""
+Caixa de entrada do chat: as conversas de um usuário numa só consulta.
+
+Cada linha traz a conversa, o agendamento, o título do serviço, o nome do
+outro participante, a última mensagem (subconsulta correlacionada no índice
+(conversa_id, data_envio)) e as não lidas (agrupadas no índice
+(conversa_id, lida, remetente_id)), da conversa com atividade mais recente
+para a mais antiga.
+
+A lista de cada usuário fica em memória (LRU de CHAT_CAIXA_USUARIOS, TTL de
+CHAT_CAIXA_TTL segundos, que é também o atraso para escritas de outros
+processos). Depois do commit:
+
+  - mensagem nova: a última mensagem e as não lidas dos participantes em
+    cache são atualizadas ali mesmo, sem consultar o banco;
+  - mensagem lida/por ler: só a contagem de não lidas muda;
+  - outras alterações do que aparece na lista (conversa, agendamento, título
+    do serviço, nome do usuário, mensagem editada ou apagada): a lista de
+    quem as tinha é descartada e recarregada no próximo pedido.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.orm import aliased
+
+from alteracoes import depois_do_commit
+from config import config
+from models import Agendamento, Conversa, Mensagem, PrestadorServico, Servico, Usuario
+
+# Campos que aparecem na caixa de entrada (alterá-los descarta as listas afetadas)
+CAMPOS = {
+    Agendamento: ('status', 'data_agendamento', 'modalidade', 'servico_id', 'prestador_id', 'cliente_id'),
+    Servico: ('titulo',),
+    Usuario: ('nome',),
+    PrestadorServico: ('especialidade', 'categoria', 'usuario_id'),
+    Mensagem: ('conteudo', 'conversa_id', 'remetente_id', 'data_envio'),
+}
+# Em cada linha da caixa, o id de cada modelo de que ela depende
+_REFERENCIAS = {Agendamento: 'agendamento_id', Servico: 'servico_id', Usuario: 'outro_usuario_id',
+                PrestadorServico: 'prestador_servico_id', Mensagem: 'conversa_id'}
+
+_lock = threading.Lock()
+_entradas = OrderedDict()   # usuario_id -> Entrada, da usada há mais tempo para a mais recente
+_leituras = 0               # número de cada consulta, por ordem de início
+_geracao = 0                # muda a cada commit aplicado: leituras a decorrer nessa altura não são guardadas
+
+
+class Entrada:
+    __slots__ = ('lado', 'linhas', 'expira_em', 'leitura')
+
+    def __init__(self, lado, linhas, expira_em, leitura):
+        self.lado = lado
+        self.linhas = linhas
+        self.expira_em = expira_em
+        self.leitura = leitura
+
+
+def _lado(usuario):
+    """Coluna de Conversa onde o usuário participa (como nas rotas do chat)"""
+    return 'cliente_id' if usuario.tipo == 'cliente' else 'prestador_id'
+
+
+def _ordem(linha):
+    """Atividade mais recente primeiro"""
+    ultima = linha['ultima_mensagem']
+    return (ultima['data_envio'] if ultima else linha['conversa']['data_criacao']) or datetime.min, linha['id']
+
+
+def consultar(session, usuario_id, lado):
+    """Conversas do usuário com tudo o que a caixa de entrada mostra, numa consulta"""
+    cliente, usuario_prestador, ultima = aliased(Usuario), aliased(Usuario), aliased(Mensagem)
+    participa = getattr(Conversa, lado) == usuario_id
+
+    id_ultima = (select(Mensagem.id)
+                 .where(Mensagem.conversa_id == Conversa.id)
+                 .order_by(Mensagem.data_envio.desc(), Mensagem.id.desc())
+                 .limit(1)
+                 .correlate(Conversa)
+                 .scalar_subquery())
+    nao_lidas = (select(Mensagem.conversa_id, func.count().label('total'))
+                 .where(Mensagem.conversa_id.in_(select(Conversa.id).where(participa)),
+                        Mensagem.lida == False,  # noqa: E712
+                        Mensagem.remetente_id != usuario_id)
+                 .group_by(Mensagem.conversa_id)
+                 .subquery())
+
+    consulta = (select(Conversa.id, Conversa.data_criacao,
+                       Agendamento.id.label('agendamento_id'), Agendamento.status, Agendamento.data_agendamento,
+                       Agendamento.modalidade, Servico.id.label('servico_id'), Servico.titulo,
+                       PrestadorServico.id.label('prestador_servico_id'), PrestadorServico.especialidade,
+                       PrestadorServico.categoria,
+                       usuario_prestador.id.label('prestador_usuario_id'),
+                       usuario_prestador.nome.label('prestador_nome'),
+                       cliente.id.label('cliente_usuario_id'), cliente.nome.label('cliente_nome'),
+                       ultima.id.label('mensagem_id'), ultima.conteudo, ultima.data_envio, ultima.remetente_id,
+                       func.coalesce(nao_lidas.c.total, 0).label('nao_lidas'))
+                .select_from(Conversa)
+                .join(Agendamento, Agendamento.id == Conversa.agendamento_id)
+                .join(Servico, Servico.id == Agendamento.servico_id)
+                .outerjoin(PrestadorServico, PrestadorServico.id == Agendamento.prestador_id)
+                .outerjoin(usuario_prestador, usuario_prestador.id == PrestadorServico.usuario_id)
+                .outerjoin(cliente, cliente.id == Agendamento.cliente_id)
+                .outerjoin(ultima, ultima.id == id_ultima)
+                .outerjoin(nao_lidas, nao_lidas.c.conversa_id == Conversa.id)
+                .where(participa))
+
+    linhas = []
+    for linha in session.execute(consulta):
+        if lado == 'cliente_id':
+            outro_id, outro_nome = linha.prestador_usuario_id, linha.prestador_nome or 'Prestador'
+            especialidade, categoria = linha.especialidade or '', linha.categoria
+        else:
+            outro_id, outro_nome = linha.cliente_usuario_id, linha.cliente_nome or 'Cliente'
+            especialidade = categoria = 'Cliente'
+        linhas.append({
+            'id': linha.id,
+            'conversa': {'id': linha.id, 'data_criacao': linha.data_criacao},
+            'agendamento': {'id': linha.agendamento_id, 'status': linha.status,
+                            'data_agendamento': linha.data_agendamento, 'modalidade': linha.modalidade},
+            'servico': {'id': linha.servico_id, 'titulo': linha.titulo},
+            'outro_usuario': {'id': outro_id, 'nome': outro_nome, 'categoria': categoria},
+            'outro_nome': outro_nome,
+            'especialidade': especialidade,
+            'ultima_mensagem': {'id': linha.mensagem_id, 'conteudo': linha.conteudo,
+                                'data_envio': linha.data_envio, 'remetente_id': linha.remetente_id}
+            if linha.mensagem_id is not None else None,
+            'mensagens_nao_lidas': linha.nao_lidas,
+            # Dependências, para a invalidação
+            'agendamento_id': linha.agendamento_id,
+            'servico_id': linha.servico_id,
+            'outro_usuario_id': outro_id,
+            'prestador_servico_id': linha.prestador_servico_id,
+            'conversa_id': linha.id,
+        })
+    linhas.sort(key=_ordem, reverse=True)
+    return linhas
+
+
+def conversas(session, usuario):
+    """Caixa de entrada do usuário (em cache); as linhas não devem ser alteradas por quem as recebe"""
+    global _leituras
+    lado = _lado(usuario)
+    agora = time.monotonic()
+    with _lock:
+        entrada = _entradas.get(usuario.id)
+        if entrada is not None and entrada.lado == lado and entrada.expira_em > agora:
+            _entradas.move_to_end(usuario.id)
+            return entrada.linhas
+        _leituras += 1
+        leitura, geracao = _leituras, _geracao
+
+    linhas = consultar(session, usuario.id, lado)
+    with _lock:
+        # Um commit foi aplicado enquanto se consultava: a lista pode não o incluir
+        if geracao == _geracao:
+            _entradas[usuario.id] = Entrada(lado, linhas, agora + config.CHAT_CAIXA_TTL, leitura)
+            _entradas.move_to_end(usuario.id)
+            while len(_entradas) > config.CHAT_CAIXA_USUARIOS:
+                _entradas.popitem(last=False)
+    return linhas
+
+
+def limpar():
+    """Esvazia o cache (ex.: depois de alterações fora do ORM)"""
+    with _lock:
+        _entradas.clear()
+
+
+# ==================== ATUALIZAÇÃO ====================
+
+def _aplicar(pendentes):
+    """Aplica ao cache as alterações de uma transação confirmada"""
+    global _geracao
+    with _lock:
+        _geracao += 1
+        for usuario_id in pendentes['usuarios']:
+            _entradas.pop(usuario_id, None)
+
+        # Raro (título, nome, conversa apagada...): só aqui se percorrem todas as listas
+        referencias = {modelo: ids for modelo, ids in pendentes['referencias'].items() if ids}
+        if referencias:
+            for usuario_id, entrada in list(_entradas.items()):
+                if any(linha[_REFERENCIAS[modelo]] in ids
+                       for modelo, ids in referencias.items() for linha in entrada.linhas):
+                    del _entradas[usuario_id]
+
+        # Mensagens novas e lidas: só as listas dos participantes dessas conversas
+        for usuario_id in pendentes['participantes']:
+            entrada = _entradas.get(usuario_id)
+            if entrada is None:
+                continue
+            # Lida depois do primeiro flush: pode já incluir a transação, não se soma outra vez
+            if entrada.leitura > pendentes['leitura']:
+                del _entradas[usuario_id]
+                continue
+
+            novas, mudou = [], False
+            for linha in entrada.linhas:
+                conversa_id = linha['id']
+                mensagens = pendentes['mensagens'].get(conversa_id, ())
+                lidas = pendentes['lidas'].get(conversa_id, ())
+                if mensagens or lidas:
+                    ultima = linha['ultima_mensagem']
+                    nao_lidas = linha['mensagens_nao_lidas']
+                    for mensagem in mensagens:
+                        if ultima is None or (mensagem['data_envio'], mensagem['id']) >= (ultima['data_envio'], ultima['id']):
+                            ultima = mensagem
+                        if not mensagem['lida'] and mensagem['remetente_id'] != usuario_id:
+                            nao_lidas += 1
+                    for remetente_id, variacao in lidas:
+                        if remetente_id != usuario_id:
+                            nao_lidas = max(nao_lidas + variacao, 0)
+                    if ultima is not linha['ultima_mensagem'] or nao_lidas != linha['mensagens_nao_lidas']:
+                        linha = dict(linha, ultima_mensagem=ultima, mensagens_nao_lidas=nao_lidas)
+                        mudou = True
+                novas.append(linha)
+            if mudou:
+                novas.sort(key=_ordem, reverse=True)
+                entrada.linhas = novas
+
+
+def _alteracoes(session, pendentes):
+    """Junta em `pendentes` o que o flush mudou na caixa de entrada"""
+    def valores(obj, atributo):
+        historico = inspect(obj).attrs[atributo].history
+        return [valor for valor in [getattr(obj, atributo), *historico.deleted] if valor is not None]
+
+    for obj in session.new:
+        if isinstance(obj, Mensagem):
+            pendentes['mensagens'].setdefault(obj.conversa_id, []).append({
+                'id': obj.id, 'conteudo': obj.conteudo, 'data_envio': obj.data_envio,
+                'remetente_id': obj.remetente_id, 'lida': bool(obj.lida)})
+        elif isinstance(obj, Conversa):
+            pendentes['usuarios'].update((obj.cliente_id, obj.prestador_id))
+
+    for obj in session.deleted:
+        if isinstance(obj, Conversa):
+            pendentes['usuarios'].update((obj.cliente_id, obj.prestador_id))
+        elif type(obj) in _REFERENCIAS:
+            pendentes['referencias'][type(obj)].add(obj.conversa_id if isinstance(obj, Mensagem) else obj.id)
+
+    for obj in session.dirty:
+        estado = inspect(obj).attrs
+        if isinstance(obj, Conversa):
+            if any(estado[campo].history.has_changes() for campo in ('agendamento_id', 'cliente_id', 'prestador_id')):
+                pendentes['usuarios'].update(valores(obj, 'cliente_id') + valores(obj, 'prestador_id'))
+        elif type(obj) in CAMPOS:
+            if any(estado[campo].history.has_changes() for campo in CAMPOS[type(obj)]):
+                chave = 'conversa_id' if isinstance(obj, Mensagem) else 'id'
+                pendentes['referencias'][type(obj)].update(valores(obj, chave))
+            elif isinstance(obj, Mensagem) and estado.lida.history.has_changes():
+                pendentes['lidas'].setdefault(obj.conversa_id, []).append(
+                    (obj.remetente_id, -1 if obj.lida else 1))
+
+    # Participantes das conversas com mensagens novas ou lidas: as únicas listas a atualizar
+    conversas = (set(pendentes['mensagens']) | set(pendentes['lidas'])) - pendentes['conversas_consultadas']
+    if conversas:
+        tabela = Conversa.__table__
+        for cliente_id, prestador_id in session.connection().execute(
+                select(tabela.c.cliente_id, tabela.c.prestador_id).where(tabela.c.id.in_(conversas))):
+            pendentes['participantes'].update((cliente_id, prestador_id))
+        pendentes['conversas_consultadas'].update(conversas)
+
+
+def _aplicar_alteracoes(pendentes):
+    try:
+        _aplicar(pendentes)
+    except Exception:
+        # Sem saber o que mudou, nada do que está em cache é confiável
+        limpar()
+
+
+def _novas_pendentes():
+    # `leitura`: consultas começadas depois do primeiro flush podem já ver a transação
+    return {'leitura': _leituras, 'mensagens': {}, 'lidas': {}, 'usuarios': set(),
+            'participantes': set(), 'conversas_consultadas': set(),
+            'referencias': {modelo: set() for modelo in _REFERENCIAS}}
+
+
+depois_do_commit('caixa_entrada_pendentes', _alteracoes, _aplicar_alteracoes, novo=_novas_pendentes)
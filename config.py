@@ -8,7 +8,120 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'servicos_pro_chave_dev_2024'
 
     # Banco de Dados
-    SQLALCHEMY_DATABASE_URL = "sqlite:///servicos_app.db"
+    SQLALCHEMY_DATABASE_URL = os.environ.get('DATABASE_URL') or "sqlite:///servicos_app.db"
+    SQLALCHEMY_ECHO = False
+
+    # Pool de conexões (QueuePool, usado tanto para MySQL como para SQLite em arquivo)
+    DB_POOL_SIZE = 5
+    DB_MAX_OVERFLOW = 10
+    DB_POOL_TIMEOUT = 30      # segundos à espera de uma conexão livre
+    DB_POOL_RECYCLE = 1800    # segundos; abaixo do wait_timeout do MySQL
+    DB_POOL_PRE_PING = True
+
+    # Métricas do pool e das sessões (metricas_pool.py, /debug-pool)
+    DB_METRICAS_AMOSTRAS = 1000       # últimas esperas por conexão usadas no p50/p95
+    DB_CONEXAO_PRESA_S = 30           # emprestada há mais que isto = suspeita de fuga
+    SESSAO_IDENTIDADES_ALERTA = 2000  # objetos no identity map no fim do pedido que vão para o log
+
+    # Réplicas de leitura (separadas por vírgula). Vazio = tudo vai para o primário
+    SQLALCHEMY_REPLICA_URLS = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    # Segundos após uma escrita em que o usuário continua lendo do primário
+    REPLICA_LAG_MAXIMO = int(os.environ.get('REPLICA_LAG_MAXIMO', 5))
+
+    # PRAGMAs aplicados a cada nova conexão SQLite
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',      # leitores não bloqueiam o escritor
+        'synchronous': 'NORMAL',    # seguro com WAL e bem mais rápido que FULL
+        'busy_timeout': 5000,       # ms à espera do lock antes de "database is locked"
+        'cache_size': -64000,       # negativo = KiB (64 MB por conexão)
+        'mmap_size': 268435456,     # 256 MB de leitura via mmap
+        'temp_store': 'MEMORY',
+    }
+
+    # Instrumentação SQL por pedido (monitor_sql.py)
+    SQL_MONITOR_ATIVO = True
+    SQL_LENTA_MS = 100            # consultas acima disto vão para o log
+    SQL_N_MAIS_1_MINIMO = 5       # mesma forma de SELECT repetida N vezes = suspeita de N+1
+    SQL_TOP_LENTAS = 5            # consultas mais lentas guardadas por pedido
+    SQL_LOG_ARQUIVO = os.environ.get('SQL_LOG_ARQUIVO', 'app.log')
+
+    # Paginação por cursor (paginacao.py)
+    PAGINACAO_TOTAL_TTL = 60           # segundos em cache do total aproximado
+    PAGINACAO_CACHE_TOTAIS_MAX = 1000  # consultas distintas com total em cache
+
+    # Busca por termo no índice de texto completo (busca.py)
+    BUSCA_LIMITE = 500        # resultados ordenados por relevância, no máximo
+    BUSCA_MAX_TERMOS = 8      # palavras consideradas do texto da busca
+    BUSCA_LOTE = 500          # prestadores por transação ao (re)gravar o índice
+    # Peso de cada coluna no bm25 (SQLite)
+    BUSCA_PESOS = {'nome': 5.0, 'especialidade': 10.0, 'categoria': 3.0, 'descricao': 1.0, 'servicos': 2.0}
+
+    # /api/busca: página máxima e exportação em NDJSON (?formato=ndjson)
+    BUSCA_API_POR_PAGINA_MAX = 50
+    BUSCA_EXPORTACAO_MAX = 10000         # resultados por exportação; depois, uma linha com next_cursor
+    BUSCA_EXPORTACAO_LOTE = 500          # prestadores lidos do banco de cada vez
+
+    # Cache das listas de ids da busca (cache_busca.py)
+    BUSCA_CACHE_ATIVO = True
+    BUSCA_CACHE_TTL = 120                # segundos; atraso máximo para escritas de outros processos
+    BUSCA_CACHE_IDS = 200000             # ids guardados no total (LRU)
+    BUSCA_CACHE_IDS_ENTRADA = 20000      # listas maiores não são guardadas (paginação no banco)
+
+    # Contagens por faceta dos resultados (facetas.py)
+    FACETAS_PRECOS = (500, 1000, 1500, 2000)   # limites das faixas de valor_hora
+    FACETAS_EXPERIENCIA = (2, 5, 10)           # limites das faixas de anos de experiência
+    FACETAS_TTL = 60                           # segundos em cache
+    FACETAS_CACHE_MAX = 1000                   # consultas distintas em cache
+
+    # Sugestões da caixa de busca, em memória (sugestoes.py, /api/sugestoes)
+    SUGESTOES_ATIVAS = True
+    SUGESTOES_LIMITE = 8              # sugestões por pedido
+    SUGESTOES_MINIMO = 1              # caracteres antes de sugerir
+    SUGESTOES_PALAVRAS = 4            # palavras de cada texto onde um prefixo pode começar
+    SUGESTOES_VARREDURA_MAX = 2000    # prefixos com mais chaves têm o topo guardado
+    SUGESTOES_RECONSTRUIR_S = 900     # reconstrução completa (escritas de outros processos)
+
+    # Pontuação de qualidade dos prestadores (ranking.py), usada na ordenação da busca
+    RANKING_PESOS = {'nota': 0.40, 'realizados': 0.25, 'verificado': 0.10, 'resposta': 0.15, 'recencia': 0.10}
+    RANKING_NOTA_PRIORI = 3.5            # média assumida antes das avaliações
+    RANKING_AVALIACOES_PRIORI = 5        # quantas avaliações a priori vale
+    RANKING_REALIZADOS_REFERENCIA = 50   # agendamentos realizados que dão a componente máxima
+    RANKING_RESPOSTA_PRIORI = 0.5        # taxa de resposta assumida sem pedidos
+    RANKING_PEDIDOS_PRIORI = 5           # quantos pedidos a priori vale
+    RANKING_PRAZO_RESPOSTA_H = 48        # pedidos mais novos ainda não contam para a resposta
+    RANKING_RECENCIA_DIAS = 30           # decaimento da atividade (e^-dias/isto)
+    RANKING_PESO_BUSCA = 1.0             # relevância do texto × (1 + isto × pontuação)
+
+    # Busca por proximidade (geo.py); mudar a célula exige "python geo.py --reconstruir"
+    GEO_CELULA_GRAUS = 0.1      # lado da célula da grelha (~11 km)
+    GEO_RAIO_PADRAO_KM = 10     # prestadores sem raio_atuacao
+    GEO_RAIO_MAXIMO_KM = 100    # raios maiores contam como este
+    GEO_RAIO_INICIAL_KM = 2     # primeira faixa da ordenação por distância
+
+    # Arranque: só verifica a versão do schema; migrar é com `python migracoes.py`
+    MIGRAR_AO_INICIAR = False
+    MIGRACAO_LOTE = 5000      # linhas por transação nos preenchimentos em lotes
+    MIGRACAO_PAUSA = 0.05     # segundos entre lotes, para os escritores da aplicação
+
+    # Caixa de entrada do chat em memória (caixa_entrada.py)
+    CHAT_CAIXA_TTL = 30           # segundos; atraso máximo para mensagens de outros processos
+    CHAT_CAIXA_USUARIOS = 5000    # usuários com a caixa em cache (LRU)
+
+    # Arquivamento de mensagens/notificações antigas (arquivamento.py)
+    ARQUIVO_MENSAGENS_DIAS = 180      # mensagens mais antigas saem de `mensagens`
+    ARQUIVO_NOTIFICACOES_DIAS = 60    # idem para `notificacoes`
+    ARQUIVO_LOTE = 1000               # linhas movidas/apagadas por transação
+    ARQUIVO_PAUSA = 0.05              # segundos entre lotes
+    # Dias que cada tipo de notificação é guardado (tabela quente ou arquivo); None = sempre
+    RETENCAO_NOTIFICACOES = {
+        'mensagem': 90,
+        'sistema': 180,
+        'agendamento': 365,
+        'avaliacao': 365,
+        'ticket': 365,
+        'pagamento': None,  # histórico financeiro
+    }
+
     # Configurações do Flask
     DEBUG = True
 
@@ -28,14 +141,30 @@ class Config:
 class DevelopmentConfig(Config):
     """Configurações para desenvolvimento"""
     DEBUG = True
-    SQLALCHEMY_DATABASE_URL = "sqlite:///servicos_app.db"
+    SQLALCHEMY_DATABASE_URL = os.environ.get('DATABASE_URL') or "sqlite:///servicos_app.db"
+    SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO', '1') == '1'
+    MIGRAR_AO_INICIAR = os.environ.get('MIGRAR_AO_INICIAR', '1') == '1'
 
 class ProductionConfig(Config):
     """Configurações para produção"""
     DEBUG = False
     # Em produção, usar variáveis de ambiente
     SQLALCHEMY_DATABASE_URL = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_ECHO = False
+
+    # Vários workers com threads: mais conexões por processo
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = 10
+    DB_POOL_RECYCLE = 1800
+
+    SQLITE_PRAGMAS = dict(Config.SQLITE_PRAGMAS, busy_timeout=15000)
+
 
+configs = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
 
-# Configuração ativa
-config = DevelopmentConfig
\ No newline at end of file
+# Configuração ativa (APP_ENV=production em produção)
+config = configs[os.environ.get('APP_ENV', 'development')]
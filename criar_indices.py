@@ -0,0 +1,216 @@
+# criar_indices.py
+"""
+Cria os índices compostos declarados em models.py num banco já existente.
+
+`create_all` só cria índices junto com tabelas novas; num banco em produção as
+tabelas já existem e os índices precisam ser construídos à parte. Este script:
+
+  1. guarda o plano (EXPLAIN) das consultas quentes dos blueprints;
+  2. constrói cada índice em falta, um por vez e numa transação curta;
+  3. atualiza as estatísticas do otimizador (ANALYZE);
+  4. compara os planos antes/depois e acusa as consultas que ainda fazem SCAN.
+
+Uso:
+    python criar_indices.py              # cria os índices e compara os planos
+    python criar_indices.py --verificar  # só mostra os planos atuais
+"""
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import inspect, select, func, text
+
+from database import engine
+from models import Base, Agendamento, Mensagem, Notificacao, TransacaoFinanceira, TicketSuporte
+
+
+# Tabelas cujos índices são mantidos por este script
+TABELAS_QUENTES = [
+    'agendamentos', 'mensagens', 'notificacoes', 'transacoes_financeiras', 'tickets_suporte'
+]
+
+# Abaixo disto o otimizador prefere SCAN mesmo com índice (depois do ANALYZE),
+# então um SCAN numa tabela pequena não é tratado como problema.
+LINHAS_MINIMAS_SCAN = 1000
+
+
+def consultas_quentes():
+    """Consultas mais frequentes dos blueprints (mesmos filtros e ordenações)"""
+    agora = datetime(2025, 1, 1)
+    return [
+        ('agenda do prestador (agendamentos.agendamentos_prestador)',
+         select(Agendamento).where(Agendamento.prestador_id == 1, Agendamento.status == 'pendente')
+         .order_by(Agendamento.data_agendamento.desc()).limit(10)),
+        ('conflito de horário (agendamentos.agendar)',
+         select(Agendamento).where(Agendamento.prestador_id == 1,
+                                   Agendamento.data_agendamento == agora,
+                                   Agendamento.status.in_(['pendente', 'confirmado', 'em_andamento']))),
+        ('dashboard do cliente (main.dashboard)',
+         select(Agendamento).where(Agendamento.cliente_id == 1)
+         .order_by(Agendamento.data_agendamento.desc())),
+        ('polling do chat (chat.obter_mensagens)',
+         select(Mensagem).where(Mensagem.conversa_id == 1).order_by(Mensagem.data_envio)),
+        ('mensagens não lidas (chat.index)',
+         select(func.count(Mensagem.id)).where(Mensagem.conversa_id == 1, Mensagem.lida == False,
+                                               Mensagem.remetente_id != 1)),
+        ('notificações não lidas (notificacoes.api_nao_lidas)',
+         select(func.count(Notificacao.id)).where(Notificacao.usuario_id == 1, Notificacao.lida == False)),
+        ('histórico financeiro (pagamentos.listar_transacoes)',
+         select(TransacaoFinanceira).where(TransacaoFinanceira.prestador_id == 1)
+         .order_by(TransacaoFinanceira.data_transacao.desc())),
+        ('tickets urgentes (admin.dashboard)',
+         select(TicketSuporte).where(TicketSuporte.status == 'aberto', TicketSuporte.prioridade == 'urgente')
+         .order_by(TicketSuporte.data_abertura.desc()).limit(5)),
+    ]
+
+
+def explicar(conn, consulta):
+    """Retorna as linhas do plano de execução de uma consulta"""
+    sql = str(consulta.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+
+    if conn.dialect.name == 'sqlite':
+        linhas = conn.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+        return [linha[-1] for linha in linhas]
+
+    linhas = conn.execute(text(f'EXPLAIN {sql}')).mappings().fetchall()
+    return [f"{linha['table']}: type={linha['type']} key={linha['key']} rows={linha['rows']}" for linha in linhas]
+
+
+def faz_scan_completo(plano):
+    """True se o plano percorre uma tabela inteira sem usar índice"""
+    for linha in plano:
+        if linha.startswith('SCAN ') and ' USING ' not in linha:
+            return True
+        if 'type=ALL' in linha:
+            return True
+    return False
+
+
+def capturar_planos():
+    """Plano e total de linhas da tabela principal de cada consulta quente"""
+    planos = {}
+    with engine.connect() as conn:
+        for nome, consulta in consultas_quentes():
+            tabela = consulta.get_final_froms()[0]
+            total_linhas = conn.execute(select(func.count()).select_from(tabela)).scalar()
+            planos[nome] = (explicar(conn, consulta), total_linhas)
+    return planos
+
+
+def indices_em_falta():
+    """Índices declarados nos modelos que ainda não existem no banco"""
+    inspetor = inspect(engine)
+    faltando = []
+
+    for nome_tabela in TABELAS_QUENTES:
+        if not inspetor.has_table(nome_tabela):
+            continue
+        existentes = {idx['name'] for idx in inspetor.get_indexes(nome_tabela)}
+        for indice in Base.metadata.tables[nome_tabela].indexes:
+            if indice.name not in existentes:
+                faltando.append(indice)
+
+    return faltando
+
+
+def ddl_indice(indice, dialeto):
+    """DDL de criação do índice, sem bloquear escritas quando o banco permite"""
+    colunas = ', '.join(coluna.name for coluna in indice.columns)
+    tabela = indice.table.name
+
+    if dialeto == 'mysql':
+        # Online DDL do InnoDB: leituras e escritas continuam durante a construção
+        return f'CREATE INDEX {indice.name} ON {tabela} ({colunas}) ALGORITHM=INPLACE LOCK=NONE'
+
+    # SQLite não tem construção online: o índice é criado numa transação curta por
+    # índice, e o busy_timeout faz os escritores esperarem em vez de falharem.
+    return f'CREATE INDEX IF NOT EXISTS {indice.name} ON {tabela} ({colunas})'
+
+
+def criar_indices():
+    """Cria os índices em falta, um por transação"""
+    faltando = indices_em_falta()
+
+    if not faltando:
+        print("✅ Todos os índices já existem!")
+        return []
+
+    dialeto = engine.dialect.name
+    criados = []
+
+    for indice in faltando:
+        print(f"📝 Criando índice {indice.name}...")
+        inicio = time.perf_counter()
+
+        with engine.connect() as conn:
+            if dialeto == 'sqlite':
+                conn.execute(text('PRAGMA busy_timeout = 30000'))
+            conn.execute(text(ddl_indice(indice, dialeto)))
+            conn.commit()
+
+        criados.append(indice.name)
+        print(f"✅ {indice.name} criado em {time.perf_counter() - inicio:.2f}s")
+
+    # Atualizar estatísticas para o otimizador escolher os novos índices
+    with engine.connect() as conn:
+        if dialeto == 'sqlite':
+            conn.execute(text('ANALYZE'))
+        else:
+            for nome_tabela in {indice.table.name for indice in faltando}:
+                conn.execute(text(f'ANALYZE TABLE {nome_tabela}'))
+        conn.commit()
+
+    return criados
+
+
+def imprimir_comparacao(antes, depois):
+    """Mostra os planos lado a lado; retorna as consultas que ainda fazem SCAN"""
+    ainda_com_scan = []
+
+    for nome, (plano_depois, total_linhas) in depois.items():
+        plano_antes = antes[nome][0]
+        com_scan = faz_scan_completo(plano_depois) and total_linhas >= LINHAS_MINIMAS_SCAN
+
+        if com_scan:
+            status = "⚠️  SCAN"
+        elif faz_scan_completo(plano_depois):
+            status = f"SCAN aceitável, {total_linhas} linhas"
+        else:
+            status = "✅ índice"
+        print(f"\n🔍 {nome} [{status}]")
+
+        if plano_antes != plano_depois:
+            for linha in plano_antes:
+                print(f"   antes:  {linha}")
+        for linha in plano_depois:
+            print(f"   depois: {linha}")
+
+        if com_scan:
+            ainda_com_scan.append(nome)
+
+    return ainda_com_scan
+
+
+if __name__ == "__main__":
+    try:
+        planos_antes = capturar_planos()
+
+        if '--verificar' in sys.argv:
+            ainda_com_scan = imprimir_comparacao(planos_antes, planos_antes)
+        else:
+            print("🔄 Criando índices das consultas quentes...")
+            criar_indices()
+            ainda_com_scan = imprimir_comparacao(planos_antes, capturar_planos())
+
+        print("\n" + "=" * 50)
+        if ainda_com_scan:
+            print(f"⚠️  {len(ainda_com_scan)} consulta(s) ainda fazem SCAN completo:")
+            for nome in ainda_com_scan:
+                print(f"   • {nome}")
+            sys.exit(1)
+
+        print("🎉 Todas as consultas quentes usam índices!")
+
+    except Exception as e:
+        print(f"❌ Erro ao criar índices: {e}")
+        sys.exit(1)
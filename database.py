@@ -1,9 +1,125 @@
 # database.py
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+import random
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session as flask_session
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.dml import UpdateBase
 from config import config
+from metricas_pool import PoolMedido, instrumentar_pool
+from monitor_sql import instrumentar_engine
+
+
+def _aplicar_pragmas_sqlite(engine, pragmas):
+    """Aplica os PRAGMAs do ambiente em cada nova conexão SQLite"""
+
+    @event.listens_for(engine, 'connect')
+    def _ao_conectar(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome} = {valor}')
+        cursor.close()
+
+
+def criar_engine(cfg=config, url=None):
+    """Cria o engine com o perfil de pool/pragmas do ambiente (DevelopmentConfig/ProductionConfig)"""
+    url = url or cfg.SQLALCHEMY_DATABASE_URL
+    if not url:
+        raise RuntimeError('DATABASE_URL não configurada para este ambiente')
+
+    opcoes = {'echo': cfg.SQLALCHEMY_ECHO}
+
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            # Banco em memória: uma única conexão partilhada entre threads
+            opcoes.update(poolclass=StaticPool, connect_args={'check_same_thread': False})
+        else:
+            # Arquivo: pool entre as threads do worker; o lock de escrita é do SQLite,
+            # então o busy_timeout (não o pool) é que evita "database is locked"
+            opcoes.update(
+                poolclass=PoolMedido,
+                pool_size=cfg.DB_POOL_SIZE,
+                max_overflow=cfg.DB_MAX_OVERFLOW,
+                pool_timeout=cfg.DB_POOL_TIMEOUT,
+                connect_args={'check_same_thread': False},
+            )
+
+        engine = create_engine(url, **opcoes)
+        _aplicar_pragmas_sqlite(engine, cfg.SQLITE_PRAGMAS)
+        return engine
+
+    # MySQL (mysqlclient / PyMySQL)
+    opcoes.update(
+        poolclass=PoolMedido,
+        pool_size=cfg.DB_POOL_SIZE,
+        max_overflow=cfg.DB_MAX_OVERFLOW,
+        pool_timeout=cfg.DB_POOL_TIMEOUT,
+        pool_recycle=cfg.DB_POOL_RECYCLE,
+        pool_pre_ping=cfg.DB_POOL_PRE_PING,
+    )
+    return create_engine(url, **opcoes)
+
+
+# ==================== ROTEAMENTO LEITURA/ESCRITA ====================
+
+def ler_da_replica(view):
+    """Decorator: a rota só lê, então as consultas podem ir para uma réplica"""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.ler_da_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _marcar_escrita():
+    """Depois de uma escrita, o resto do pedido e os próximos segundos ficam no primário"""
+    if has_request_context():
+        g.fixo_no_primario = True
+        flask_session['_ultima_escrita'] = time.time()
+
+
+def _pode_ler_da_replica():
+    if not engines_replica or not has_request_context():
+        return False
+    if not g.get('ler_da_replica') or g.get('fixo_no_primario'):
+        return False
+
+    # Ler as próprias escritas: a réplica pode ainda não ter recebido a última
+    ultima_escrita = flask_session.get('_ultima_escrita')
+    return not ultima_escrita or time.time() - ultima_escrita > config.REPLICA_LAG_MAXIMO
+
+
+class SessaoRoteada(Session):
+    """Sessão que envia as leituras das rotas @ler_da_replica para as réplicas"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, UpdateBase):
+            _marcar_escrita()
+            return engine
+
+        if _pode_ler_da_replica():
+            return random.choice(engines_replica)
+
+        return engine
+
+
+@event.listens_for(SessaoRoteada, 'after_flush')
+def _apos_flush(session, flush_context):
+    _marcar_escrita()
+
 
 # Configuração global do banco
-engine = create_engine(config.SQLALCHEMY_DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-db_session = scoped_session(SessionLocal)
\ No newline at end of file
+engine = criar_engine()
+engines_replica = [criar_engine(url=url) for url in config.SQLALCHEMY_REPLICA_URLS]
+for _engine in [engine, *engines_replica]:
+    instrumentar_engine(_engine)
+instrumentar_pool(engine, 'primario')
+for _numero, _engine in enumerate(engines_replica, 1):
+    instrumentar_pool(_engine, f'replica-{_numero}')
+SessionLocal = sessionmaker(class_=SessaoRoteada, autocommit=False, autoflush=False, bind=engine)
+db_session = scoped_session(SessionLocal)
@@ -0,0 +1,161 @@
+# facetas.py
+"""
+Contagens por faceta dos resultados de uma busca, numa só consulta.
+
+Facetas: categoria, faixa de valor_hora (FACETAS_PRECOS), faixa de
+experiência (FACETAS_EXPERIENCIA), modalidade (online/presencial, de
+disponivel_online) e cidade do usuário do prestador.
+
+Em vez de um COUNT por valor, a consulta da busca é agrupada por todas as
+facetas pedidas de uma vez (uma leitura, poucas linhas: o produto das
+faixas) e os totais de cada faceta são somados em Python. A categoria
+escolhida na busca não filtra a própria faceta: as outras categorias mostram
+quantos resultados teriam. Por isso a consulta passada não deve ter o filtro
+de categoria; ele vai em `categoria`.
+
+As linhas agrupadas ficam em cache por FACETAS_TTL segundos (por SQL e
+parâmetros): a mesma busca com outra categoria escolhida não consulta o banco.
+O cache é esvaziado quando um commit altera prestadores (cache_busca.geracao()),
+como a lista de ids da mesma busca: resultados e contagens não se contradizem.
+"""
+import threading
+import time
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import aliased
+
+import cache_busca
+from config import config
+from models import PrestadorServico, Usuario
+
+DIMENSOES = ('categoria', 'preco', 'experiencia', 'modalidade', 'cidade')
+
+_lock = threading.Lock()
+_cache = {}  # (sql, parâmetros) -> (expira_em, linhas agrupadas)
+_geracao = None  # cache_busca.geracao() das linhas em _cache
+
+
+def _faixa(coluna, limites):
+    """Índice da faixa de `coluna` (0 = abaixo do primeiro limite); NULL fica sem faixa"""
+    return case((coluna.is_(None), None),
+                *[(coluna < limite, numero) for numero, limite in enumerate(limites)],
+                else_=len(limites))
+
+
+def faixas(limites):
+    """[(rótulo, mínimo, máximo)] das faixas definidas por `limites` (máximo exclusivo; None = sem limite)"""
+    pontos = [0, *limites, None]
+    return [(f'{minimo}-{maximo}' if maximo is not None else f'{minimo}+', minimo, maximo)
+            for minimo, maximo in zip(pontos, pontos[1:])]
+
+
+def _expressoes(query, dimensoes):
+    """(consulta com as junções necessárias, [expressões rotuladas de cada dimensão])"""
+    expressoes = []
+    for dimensao in dimensoes:
+        if dimensao == 'categoria':
+            expressao = PrestadorServico.categoria
+        elif dimensao == 'preco':
+            expressao = _faixa(PrestadorServico.valor_hora, config.FACETAS_PRECOS)
+        elif dimensao == 'experiencia':
+            expressao = _faixa(PrestadorServico.experiencia, config.FACETAS_EXPERIENCIA)
+        elif dimensao == 'modalidade':
+            expressao = PrestadorServico.disponivel_online
+        elif dimensao == 'cidade':
+            # Alias: a consulta da rota pode já ter junção com usuarios
+            usuario = aliased(Usuario)
+            query = query.join(usuario, usuario.id == PrestadorServico.usuario_id)
+            expressao = usuario.cidade
+        else:
+            raise ValueError(f'Faceta desconhecida: {dimensao}')
+        expressoes.append(expressao.label(dimensao))
+    return query, expressoes
+
+
+def _valor(dimensao, valor):
+    """Valor agrupado -> rótulo da faceta"""
+    if dimensao == 'preco':
+        return faixas(config.FACETAS_PRECOS)[valor][0]
+    if dimensao == 'experiencia':
+        return faixas(config.FACETAS_EXPERIENCIA)[valor][0]
+    if dimensao == 'modalidade':
+        return 'online' if valor else 'presencial'
+    return valor
+
+
+def _linhas(query, dimensoes):
+    """Tuplas (dimensões..., total) da consulta agrupada, em cache por SQL e parâmetros"""
+    global _geracao
+    consulta, expressoes = _expressoes(query.order_by(None), dimensoes)
+    consulta = consulta.with_entities(*expressoes, func.count().label('total')).group_by(*expressoes)
+
+    compilado = consulta.statement.compile()
+    chave = (str(compilado), repr(sorted(compilado.params.items())))
+    agora = time.monotonic()
+    geracao = cache_busca.geracao()
+    with _lock:
+        if _geracao != geracao:
+            # Um commit alterou prestadores: nenhuma contagem guardada é confiável
+            _cache.clear()
+            _geracao = geracao
+        em_cache = _cache.get(chave)
+    if em_cache and em_cache[0] > agora:
+        return em_cache[1]
+
+    linhas = [tuple(linha) for linha in consulta]
+    with _lock:
+        # Um commit durante a consulta: as linhas podem já estar velhas, não são guardadas
+        if cache_busca.geracao() == geracao == _geracao:
+            if len(_cache) >= config.FACETAS_CACHE_MAX:
+                _cache.clear()
+            _cache[chave] = (agora + config.FACETAS_TTL, linhas)
+    return linhas
+
+
+def contar(query, dimensoes=DIMENSOES, categoria=None):
+    """
+    {faceta: {valor: total}} dos prestadores de `query` (consulta de
+    PrestadorServico com os filtros da busca, menos a categoria).
+
+    categoria: categoria escolhida; filtra as outras facetas, não a própria.
+    Faixas na ordem crescente, categorias e cidades da maior para a menor.
+    """
+    # Com categoria escolhida, ela é a primeira coluna do agrupamento
+    agrupar = list(dict.fromkeys((['categoria'] if categoria else []) + list(dimensoes)))
+    linhas = _linhas(query, agrupar)
+    contagens = {}
+    for dimensao in dimensoes:
+        posicao = agrupar.index(dimensao)
+        totais = {}
+        for linha in linhas:
+            if categoria and dimensao != 'categoria' and linha[0] != categoria:
+                continue
+            valor = linha[posicao]
+            if valor is not None and valor != '':
+                totais[valor] = totais.get(valor, 0) + linha[-1]
+
+        if dimensao in ('preco', 'experiencia'):
+            ordenados = sorted(totais.items())
+        else:
+            ordenados = sorted(totais.items(), key=lambda item: (-item[1], str(item[0])))
+        contagens[dimensao] = {_valor(dimensao, valor): total for valor, total in ordenados}
+    return contagens
+
+
+def total(contagens, categoria=None):
+    """Prestadores contados nas facetas: os da categoria escolhida ou todos (menos os sem categoria)"""
+    por_categoria = contagens['categoria']
+    return por_categoria.get(categoria, 0) if categoria else sum(por_categoria.values())
+
+
+def listar(contagens):
+    """Contagens em listas para a API (a ordem sobrevive ao JSON); faixas com mínimo e máximo"""
+    limites = {'preco': config.FACETAS_PRECOS, 'experiencia': config.FACETAS_EXPERIENCIA}
+    resultado = {}
+    for dimensao, totais in contagens.items():
+        if dimensao in limites:
+            resultado[dimensao] = [{'valor': rotulo, 'min': minimo, 'max': maximo, 'total': totais[rotulo]}
+                                   for rotulo, minimo, maximo in faixas(limites[dimensao]) if rotulo in totais]
+        else:
+            resultado[dimensao] = [{'valor': valor, 'total': total} for valor, total in totais.items()]
+    return resultado
@@ -1,31 +1,314 @@
+# fazer_dump.py
+"""
+Backup do banco SQLite com o serviço no ar.
+
+Formato 'backup' (padrão): cópia binária pela API de backup incremental do
+SQLite, N páginas por passo com uma pausa entre passos para a aplicação
+continuar a escrever. A cópia é um snapshot consistente: a conexão de origem
+mantém uma transação de leitura aberta (em WAL os escritores não esperam por
+ela). O resultado é comprimido em streaming (gzip) para o arquivo final.
+
+Formato 'sql': exportação em texto (iterdump), também em streaming e do mesmo
+snapshot, útil para inspecionar ou migrar para outro banco. As tabelas de
+TABELAS_DERIVADAS não levam dados: o iterdump grava as tabelas virtuais (FTS5)
+como um INSERT em sqlite_master, que não se restaura, e as tabelas sombra são
+internas. Vai só o CREATE VIRTUAL TABLE; o restaurar_backup.py refaz o
+conteúdo a partir das tabelas da aplicação.
+
+Cada backup gera um manifesto JSON ao lado (<arquivo>.manifest.json) com o
+SHA-256, tamanhos, versão do schema e duração, usado pelo restaurar_backup.py.
+
+Uso:
+    python fazer_dump.py                                   # servicos_app.db -> backups/...db.gz
+    python fazer_dump.py servicos_app.db backup.db.gz --paginas 2000 --pausa 0.02
+    python fazer_dump.py servicos_app.db servicos_app.sql  # exportação SQL (pelo nome)
+    python fazer_dump.py --formato sql --sem-compressao
+"""
+import argparse
+import gzip
+import hashlib
+import json
 import os
+import re
 import sqlite3
 import sys
+import time
+from datetime import datetime
+
+BLOCO = 1024 * 1024
+PASTA_BACKUPS = 'backups'
+PAGINAS_POR_PASSO = 1000   # ~4 MB com páginas de 4 KB
+PAUSA_ENTRE_PASSOS = 0.05  # segundos; é quando os escritores da aplicação avançam
+NIVEL_COMPRESSAO = 6       # o 9 do gzip custa o dobro do tempo para ~3% menos
+
+# Tabelas virtuais calculadas das outras (índice da busca, busca.py), com as suas tabelas sombra
+TABELAS_DERIVADAS = ('busca_prestadores',)
+
+_RE_TABELA = re.compile(r'''^\s*(?:CREATE\s+(?P<virtual>VIRTUAL\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?|INSERT\s+INTO\s+)'''
+                        r'''["'`]?(?P<tabela>\w+)["'`]?''', re.IGNORECASE)
+# Como o iterdump grava uma tabela virtual
+_RE_CATALOGO = re.compile(r"^INSERT INTO sqlite_master\(type,name,tbl_name,rootpage,sql\)"
+                          r"VALUES\('table','(?P<tabela>\w+)','\w+',0,'(?P<sql>.*)'\);$", re.DOTALL)
+
+
+class SaidaComHash:
+    """Arquivo de saída que calcula SHA-256 e tamanho do que é escrito"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.hash = hashlib.sha256()
+        self.tamanho = 0
+
+    def write(self, dados):
+        self.hash.update(dados)
+        self.tamanho += len(dados)
+        return self.arquivo.write(dados)
+
+    def flush(self):
+        self.arquivo.flush()
+
+
+def sha256_arquivo(caminho):
+    """SHA-256 de um arquivo, lido em blocos"""
+    resultado = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(BLOCO), b''):
+            resultado.update(bloco)
+    return resultado.hexdigest()
 
 
-def fazer_dump(banco_entrada, arquivo_saida):
-    """Faz dump completo do banco SQLite"""
+def caminho_manifesto(arquivo_backup):
+    return f'{arquivo_backup}.manifest.json'
+
+
+def ler_manifesto(arquivo_backup):
+    """Manifesto de um backup, ou None se não existir"""
+    caminho = caminho_manifesto(arquivo_backup)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _escrever_manifesto(arquivo_backup, manifesto):
+    parcial = caminho_manifesto(arquivo_backup) + '.parcial'
+    with open(parcial, 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+    os.replace(parcial, caminho_manifesto(arquivo_backup))
+
+
+def _versao_schema(conn):
     try:
-        # Conectar ao banco
-        conn = sqlite3.connect(banco_entrada)
+        return conn.execute('SELECT MAX(versao) FROM versao_schema').fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
 
-        # Criar arquivo de dump
-        with open(arquivo_saida, 'w', encoding='utf-8') as f:
-            # Escrever todas as linhas do dump
-            for linha in conn.iterdump():
-                f.write(f"{linha};\n")
 
-        conn.close()
-        print(f"✅ Dump criado com sucesso: {arquivo_saida}")
-        print(f"📊 Tamanho do arquivo: {os.path.getsize(arquivo_saida)} bytes")
+def _abrir_origem(banco_entrada):
+    """Conexão com uma transação de leitura aberta: todas as leituras veem o mesmo snapshot"""
+    if not os.path.exists(banco_entrada):
+        raise FileNotFoundError(f'Banco não encontrado: {banco_entrada}')
+    conn = sqlite3.connect(banco_entrada, isolation_level=None, timeout=30)
+    conn.execute('BEGIN')
+    conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+    return conn
+
+
+def tabela_derivada(comando):
+    """
+    (tabela de TABELAS_DERIVADAS, CREATE VIRTUAL TABLE dela ou None) se o
+    comando do dump for dessa tabela ou de uma das suas tabelas sombra;
+    (None, None) para os outros comandos
+    """
+    catalogo = _RE_CATALOGO.match(comando)
+    if catalogo:
+        nome, ddl = catalogo['tabela'], catalogo['sql'].replace("''", "'") + ';'
+    else:
+        encontrado = _RE_TABELA.match(comando)
+        if not encontrado:
+            return None, None
+        nome, ddl = encontrado['tabela'], comando if encontrado['virtual'] else None
+
+    for derivada in TABELAS_DERIVADAS:
+        if nome == derivada:
+            return derivada, ddl
+        if nome.startswith(derivada + '_'):
+            return derivada, None
+    return None, None
+
+
+def comandos_exportados(origem):
+    """Comandos do iterdump, com as tabelas derivadas reduzidas ao CREATE VIRTUAL TABLE"""
+    for comando in origem.iterdump():
+        derivada, ddl = tabela_derivada(comando)
+        if derivada is None:
+            yield comando
+        elif ddl:
+            yield ddl
 
-    except Exception as e:
-        print(f"❌ Erro: {e}")
+
+def backup_binario(origem, saida, comprimir, paginas, pausa):
+    """Backup incremental para um arquivo temporário e compressão em streaming para `saida`"""
+    temporario = saida + '.db.tmp'
+    inicio = time.perf_counter()
+    ultimo_aviso = [0.0]
+
+    def progresso(status, restantes, total):
+        if time.perf_counter() - ultimo_aviso[0] >= 2 or not restantes:
+            print(f"   ⏳ {100 * (total - restantes) / max(total, 1):.0f}% ({total - restantes}/{total} páginas)")
+            ultimo_aviso[0] = time.perf_counter()
+        # O `sleep` do backup() só conta quando um passo encontra o banco ocupado:
+        # a pausa entre passos é feita aqui
+        if restantes and pausa:
+            time.sleep(pausa)
+
+    destino = sqlite3.connect(temporario)
+    try:
+        origem.backup(destino, pages=paginas, progress=progresso, sleep=pausa)
+        tamanho_pagina = destino.execute('PRAGMA page_size').fetchone()[0]
+        total_paginas = destino.execute('PRAGMA page_count').fetchone()[0]
+        # O arquivo copiado herda o modo WAL da origem; em DELETE fica um único arquivo
+        destino.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        destino.close()
+
+    try:
+        hash_bruto = hashlib.sha256()
+        with open(saida, 'wb') as arquivo:
+            saida_hash = SaidaComHash(arquivo)
+            destino_dados = gzip.GzipFile(fileobj=saida_hash, mode='wb', compresslevel=NIVEL_COMPRESSAO, mtime=0) if comprimir else saida_hash
+            with open(temporario, 'rb') as copia:
+                for bloco in iter(lambda: copia.read(BLOCO), b''):
+                    hash_bruto.update(bloco)
+                    destino_dados.write(bloco)
+            if comprimir:
+                destino_dados.close()
+        tamanho_bruto = os.path.getsize(temporario)
+    finally:
+        os.remove(temporario)
+
+    return {
+        'paginas': total_paginas,
+        'tamanho_pagina': tamanho_pagina,
+        'tamanho_bruto': tamanho_bruto,
+        'sha256_bruto': hash_bruto.hexdigest(),
+        'sha256': saida_hash.hash.hexdigest(),
+        'tamanho': saida_hash.tamanho,
+        'duracao_s': round(time.perf_counter() - inicio, 2),
+    }
+
+
+def exportar_sql(origem, saida, comprimir):
+    """Exportação SQL (iterdump, sem as tabelas derivadas) em streaming, comprimida se pedido"""
+    inicio = time.perf_counter()
+    hash_bruto = hashlib.sha256()
+    tamanho_bruto = 0
+    comandos = 0
+
+    with open(saida, 'wb') as arquivo:
+        saida_hash = SaidaComHash(arquivo)
+        destino = gzip.GzipFile(fileobj=saida_hash, mode='wb', compresslevel=NIVEL_COMPRESSAO, mtime=0) if comprimir else saida_hash
+        for linha in comandos_exportados(origem):
+            dados = f'{linha}\n'.encode('utf-8')
+            hash_bruto.update(dados)
+            tamanho_bruto += len(dados)
+            destino.write(dados)
+            comandos += 1
+        if comprimir:
+            destino.close()
+
+    return {
+        'comandos': comandos,
+        'tamanho_bruto': tamanho_bruto,
+        'sha256_bruto': hash_bruto.hexdigest(),
+        'sha256': saida_hash.hash.hexdigest(),
+        'tamanho': saida_hash.tamanho,
+        'duracao_s': round(time.perf_counter() - inicio, 2),
+    }
+
+
+def nome_padrao(banco_entrada, formato, comprimir):
+    base = os.path.splitext(os.path.basename(banco_entrada))[0]
+    extensao = '.db' if formato == 'backup' else '.sql'
+    return os.path.join(PASTA_BACKUPS, f"{base}-{datetime.now():%Y%m%d-%H%M%S}{extensao}{'.gz' if comprimir else ''}")
+
+
+def fazer_dump(banco_entrada, arquivo_saida=None, formato='backup', comprimir=True,
+               paginas=PAGINAS_POR_PASSO, pausa=PAUSA_ENTRE_PASSOS, origem=None):
+    """Cria o backup e o manifesto; devolve o manifesto
+
+    `origem` permite copiar de uma conexão que já tem a transação de leitura
+    aberta (o arquivo_wal.py precisa de saber em que ponto do WAL está o
+    snapshot); nesse caso ela não é fechada aqui.
+    """
+    arquivo_saida = arquivo_saida or nome_padrao(banco_entrada, formato, comprimir)
+    pasta = os.path.dirname(os.path.abspath(arquivo_saida))
+    os.makedirs(pasta, exist_ok=True)
+    parcial = arquivo_saida + '.parcial'
+
+    propria = origem is None
+    if propria:
+        origem = _abrir_origem(banco_entrada)
+    try:
+        versao = _versao_schema(origem)
+        print(f"🔄 Backup {formato} de {banco_entrada} -> {arquivo_saida}")
+        if formato == 'backup':
+            resultado = backup_binario(origem, parcial, comprimir, paginas, pausa)
+        else:
+            resultado = exportar_sql(origem, parcial, comprimir)
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    finally:
+        if propria:
+            origem.close()
+
+    os.replace(parcial, arquivo_saida)
+    manifesto = dict(
+        resultado,
+        formato=formato,
+        comprimido=comprimir,
+        arquivo=os.path.basename(arquivo_saida),
+        banco_origem=os.path.abspath(banco_entrada),
+        versao_schema=versao,
+        sqlite=sqlite3.sqlite_version,
+        criado_em=datetime.now().isoformat(timespec='seconds'),
+    )
+    _escrever_manifesto(arquivo_saida, manifesto)
+    return manifesto
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Backup online do banco SQLite')
+    parser.add_argument('banco', nargs='?', default='servicos_app.db')
+    parser.add_argument('saida', nargs='?', help='padrão: backups/<banco>-<data>.db.gz')
+    parser.add_argument('--formato', choices=['backup', 'sql'],
+                        help="'backup' (binário) ou 'sql' (texto); padrão pelo nome da saída")
+    parser.add_argument('--sem-compressao', action='store_true')
+    parser.add_argument('--paginas', type=int, default=PAGINAS_POR_PASSO, help='páginas copiadas por passo')
+    parser.add_argument('--pausa', type=float, default=PAUSA_ENTRE_PASSOS, help='segundos entre passos')
+    argumentos = parser.parse_args()
+
+    saida = argumentos.saida or ''
+    if not argumentos.formato:
+        argumentos.formato = 'sql' if saida.endswith(('.sql', '.sql.gz')) else 'backup'
+    if saida and not argumentos.sem_compressao and not saida.endswith('.gz'):
+        # Nome explícito sem .gz (ex.: servicos_app.sql): o arquivo não é comprimido
+        argumentos.sem_compressao = True
+    return argumentos
 
 
 if __name__ == "__main__":
-    if len(sys.argv) == 3:
-        fazer_dump(sys.argv[1], sys.argv[2])
-    else:
-        # Uso padrão
-        fazer_dump('servicos_app.db', 'servicos_app.sql')
\ No newline at end of file
+    try:
+        argumentos = ler_argumentos()
+        manifesto = fazer_dump(argumentos.banco, argumentos.saida, argumentos.formato,
+                               comprimir=not argumentos.sem_compressao,
+                               paginas=argumentos.paginas, pausa=argumentos.pausa)
+        print(f"✅ Backup criado com sucesso: {manifesto['arquivo']} em {manifesto['duracao_s']}s")
+        print(f"📊 Tamanho: {manifesto['tamanho']:,} bytes ({manifesto['tamanho_bruto']:,} sem compressão)")
+        print(f"🔐 SHA-256: {manifesto['sha256']}")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        sys.exit(1)
@@ -0,0 +1,289 @@
+# geo.py
+"""
+Busca por proximidade: prestadores cujo raio de atuação cobre o cliente.
+
+As coordenadas do usuário ("lat,lng" em usuarios.coordenadas) são copiadas
+para usuarios.latitude/longitude sempre que mudam. O mundo é dividido numa
+grelha de células de config.GEO_CELULA_GRAUS graus e cada prestador tem, em
+prestadores_cobertura, as células que o círculo do seu raio_atuacao toca.
+
+"Perto de mim" é então:
+
+  1. a célula do cliente -> leitura de intervalo na chave (celula, prestador_id),
+     que devolve só os prestadores que podem cobri-lo;
+  2. distância exata só desses candidatos (aproximação equiretangular, só
+     aritmética, portável entre SQLite e MySQL): distância <= raio do prestador.
+     As linhas da célula levam a posição e o raio, então isto é feito durante
+     a leitura do intervalo, sem ir às tabelas de prestadores e usuários.
+
+A grelha é mantida na mesma transação das escritas (evento after_flush) quando
+mudam as coordenadas do usuário ou o raio do prestador. A migração 7 preenche
+as colunas e a grelha; depois de cargas fora do ORM:
+
+    python geo.py --reconstruir
+"""
+import math
+import sys
+import time
+
+from sqlalchemy import and_, bindparam, delete, event, func, select, update
+from sqlalchemy.orm import Session
+
+from alteracoes import prestadores_alterados
+from config import config
+from database import engine
+from models import CoberturaPrestador, PrestadorServico, Usuario
+
+KM_POR_GRAU = 111.32
+# Folga ao escolher as células: a distância exata é verificada na consulta
+FOLGA_KM = 0.5
+
+# Campos que mudam as células de um prestador
+CAMPOS = {PrestadorServico: ('raio_atuacao', 'usuario_id')}
+CAMPOS_USUARIO = ('latitude', 'longitude')
+
+
+def ler_coordenadas(texto):
+    """(lat, lng) a partir de "lat,lng"; None se vazio ou inválido"""
+    try:
+        lat, lng = (float(parte) for parte in (texto or '').split(','))
+    except ValueError:
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or math.isnan(lat) or math.isnan(lng):
+        return None
+    return lat, lng
+
+
+def _indices(lat, lng):
+    graus = config.GEO_CELULA_GRAUS
+    return int((lat + 90) // graus), int((lng + 180) // graus)
+
+
+def _celula(linha, coluna):
+    return linha * (int(360 / config.GEO_CELULA_GRAUS) + 2) + coluna
+
+
+def celula(lat, lng):
+    """Número da célula da grelha que contém o ponto"""
+    return _celula(*_indices(lat, lng))
+
+
+def raio_efetivo(raio):
+    return min(raio or config.GEO_RAIO_PADRAO_KM, config.GEO_RAIO_MAXIMO_KM)
+
+
+def celulas_cobertura(lat, lng, raio):
+    """Células tocadas pelo círculo de `raio` km à volta do ponto"""
+    graus = config.GEO_CELULA_GRAUS
+    raio = raio_efetivo(raio) + FOLGA_KM
+    fator = max(math.cos(math.radians(lat)), 0.01)
+    delta_lat = raio / KM_POR_GRAU
+    # Longitude medida na latitude mais afastada do equador dentro do círculo
+    delta_lng = min(raio / (KM_POR_GRAU * max(math.cos(math.radians(min(abs(lat) + delta_lat, 89.9))), 0.01)), 180)
+
+    # Sem dar a volta ao antimeridiano: o círculo é cortado em ±180
+    linha_min, coluna_min = _indices(max(lat - delta_lat, -90), max(lng - delta_lng, -180))
+    linha_max, coluna_max = _indices(min(lat + delta_lat, 90), min(lng + delta_lng, 180))
+    celulas = []
+    for linha in range(linha_min, linha_max + 1):
+        sul = linha * graus - 90
+        for coluna in range(coluna_min, coluna_max + 1):
+            oeste = coluna * graus - 180
+            # Ponto da célula mais próximo do centro
+            dy = (min(max(lat, sul), sul + graus) - lat) * KM_POR_GRAU
+            dx = (min(max(lng, oeste), oeste + graus) - lng) * KM_POR_GRAU * fator
+            if dx * dx + dy * dy <= raio * raio:
+                celulas.append(_celula(linha, coluna))
+    return celulas
+
+
+def distancia_km(lat1, lng1, lat2, lng2):
+    """Distância aproximada (equiretangular) entre dois pontos"""
+    fator = math.cos(math.radians(lat1))
+    dy = (lat2 - lat1) * KM_POR_GRAU
+    dx = (lng2 - lng1) * KM_POR_GRAU * fator
+    return math.sqrt(dx * dx + dy * dy)
+
+
+# ==================== ESCRITA ====================
+
+@event.listens_for(Usuario.coordenadas, 'set')
+def _copiar_coordenadas(target, value, oldvalue, initiator):
+    """latitude/longitude acompanham a string de coordenadas"""
+    ponto = ler_coordenadas(value)
+    target.latitude, target.longitude = ponto if ponto else (None, None)
+
+
+def _cobertura(conn, condicao):
+    """Linhas de prestadores_cobertura dos prestadores que satisfazem `condicao`"""
+    prestadores, usuarios = PrestadorServico.__table__, Usuario.__table__
+    consulta = (select(prestadores.c.id, prestadores.c.raio_atuacao, usuarios.c.latitude, usuarios.c.longitude)
+                .select_from(prestadores.join(usuarios, usuarios.c.id == prestadores.c.usuario_id))
+                .where(condicao, usuarios.c.latitude.isnot(None), usuarios.c.longitude.isnot(None)))
+    return [{'celula': numero, 'prestador_id': linha.id, 'latitude': linha.latitude,
+             'longitude': linha.longitude, 'raio_km': raio_efetivo(linha.raio_atuacao)}
+            for linha in conn.execute(consulta)
+            for numero in celulas_cobertura(linha.latitude, linha.longitude, linha.raio_atuacao)]
+
+
+def gravar_cobertura(conn, ids):
+    """Regrava as células dos prestadores `ids` (sem coordenadas ou apagados: nenhuma)"""
+    tabela, prestadores = CoberturaPrestador.__table__, PrestadorServico.__table__
+    ids = sorted(set(ids))
+    for inicio in range(0, len(ids), config.BUSCA_LOTE):
+        parte = ids[inicio:inicio + config.BUSCA_LOTE]
+        conn.execute(delete(tabela).where(tabela.c.prestador_id.in_(parte)))
+        linhas = _cobertura(conn, prestadores.c.id.in_(parte))
+        if linhas:
+            conn.execute(tabela.insert(), linhas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_cobertura(session, flush_context):
+    """Mantém prestadores_cobertura na mesma transação das alterações"""
+    prestadores = prestadores_alterados(session, CAMPOS, CAMPOS_USUARIO)
+    if prestadores:
+        gravar_cobertura(session.connection(), prestadores)
+
+
+def _em_faixas(bind, tabela, lote, ao_avancar, passo):
+    """Chama passo(conn, inicio, fim) por faixas da chave primária, uma transação por faixa"""
+    with bind.connect() as conn:
+        maximo = conn.execute(select(func.max(tabela.c.id))).scalar() or 0
+    atual = total = 0
+    while atual < maximo:
+        fim = min(atual + lote, maximo)
+        with bind.begin() as conn:
+            total += passo(conn, atual, fim)
+        atual = fim
+        if ao_avancar:
+            ao_avancar()
+    return total
+
+
+def preencher_coordenadas(bind=engine, lote=None, ao_avancar=None):
+    """usuarios.latitude/longitude a partir de `coordenadas`; devolve quantos usuários"""
+    tabela = Usuario.__table__
+    atualizar = (update(tabela).where(tabela.c.id == bindparam('b_id'))
+                 .values(latitude=bindparam('b_lat'), longitude=bindparam('b_lng')))
+
+    def passo(conn, inicio, fim):
+        linhas = []
+        for linha in conn.execute(select(tabela.c.id, tabela.c.coordenadas)
+                                  .where(tabela.c.id > inicio, tabela.c.id <= fim, tabela.c.coordenadas.isnot(None))):
+            ponto = ler_coordenadas(linha.coordenadas)
+            if ponto:
+                linhas.append({'b_id': linha.id, 'b_lat': ponto[0], 'b_lng': ponto[1]})
+        if linhas:
+            conn.execute(atualizar, linhas)
+        return len(linhas)
+
+    return _em_faixas(bind, tabela, lote or config.MIGRACAO_LOTE, ao_avancar, passo)
+
+
+def reconstruir_cobertura(bind=engine, lote=None, ao_avancar=None):
+    """Regrava prestadores_cobertura inteira; devolve quantas células"""
+    tabela, prestadores = CoberturaPrestador.__table__, PrestadorServico.__table__
+
+    def passo(conn, inicio, fim):
+        conn.execute(delete(tabela).where(tabela.c.prestador_id > inicio, tabela.c.prestador_id <= fim))
+        linhas = _cobertura(conn, and_(prestadores.c.id > inicio, prestadores.c.id <= fim))
+        if linhas:
+            conn.execute(tabela.insert(), linhas)
+        return len(linhas)
+
+    return _em_faixas(bind, prestadores, lote or config.BUSCA_LOTE, ao_avancar, passo)
+
+
+# ==================== BUSCA ====================
+
+def ponto_da_busca(args, usuario=None):
+    """
+    Ponto da busca "perto de mim": ?lat=&lng= ou ?perto=1 com as coordenadas
+    do usuário autenticado. None se não foi pedido; ValueError se inválido.
+    """
+    if args.get('lat') or args.get('lng'):
+        ponto = ler_coordenadas(f"{args.get('lat', '')},{args.get('lng', '')}")
+        if not ponto:
+            raise ValueError('Coordenadas inválidas')
+        return ponto
+    if args.get('perto') and usuario is not None and getattr(usuario, 'latitude', None) is not None:
+        return usuario.latitude, usuario.longitude
+    return None
+
+
+def filtrar_por_cobertura(query, lat, lng):
+    """
+    Restringe uma consulta de PrestadorServico aos prestadores que atendem em
+    (lat, lng). Devolve (consulta, expressão do quadrado da distância em km²)
+    para ordenar por proximidade.
+    """
+    fator = math.cos(math.radians(lat))
+    dy = (CoberturaPrestador.latitude - lat) * KM_POR_GRAU
+    dx = (CoberturaPrestador.longitude - lng) * (KM_POR_GRAU * fator)
+    distancia2 = dy * dy + dx * dx
+
+    query = (query
+             .join(CoberturaPrestador, and_(CoberturaPrestador.prestador_id == PrestadorServico.id,
+                                            CoberturaPrestador.celula == celula(lat, lng)))
+             .filter(distancia2 <= CoberturaPrestador.raio_km * CoberturaPrestador.raio_km))
+    return query, distancia2
+
+
+def ids_por_distancia(query, distancia2, lat, lng, limite=None):
+    """
+    Ids da consulta filtrada por filtrar_por_cobertura, do mais perto para o mais longe.
+
+    Numa célula densa quase todos cobrem o cliente; em vez de ordenar todos,
+    procura primeiro numa faixa de latitude de GEO_RAIO_INICIAL_KM à volta do
+    cliente (leitura de intervalo na chave) e dobra a faixa até ter `limite`
+    prestadores: os mais próximos estão garantidamente entre eles.
+    """
+    limite = limite or config.BUSCA_LIMITE
+    consulta = query.with_entities(PrestadorServico.id).order_by(None).order_by(distancia2, PrestadorServico.id)
+
+    # Célula com poucos candidatos: ordenar todos é mais barato que as faixas
+    densa = (query.session.query(CoberturaPrestador.prestador_id)
+             .filter(CoberturaPrestador.celula == celula(lat, lng))
+             .offset(limite * 4).limit(1).first()) is not None
+
+    raio = config.GEO_RAIO_INICIAL_KM
+    while densa and raio < config.GEO_RAIO_MAXIMO_KM:
+        delta = raio / KM_POR_GRAU
+        ids = [linha[0] for linha in consulta
+               .filter(CoberturaPrestador.latitude.between(lat - delta, lat + delta), distancia2 <= raio * raio)
+               .limit(limite).all()]
+        if len(ids) >= limite:
+            return ids
+        raio *= 2
+    return [linha[0] for linha in consulta.limit(limite).all()]
+
+
+if __name__ == "__main__":
+    try:
+        if '--reconstruir' in sys.argv:
+            inicio = time.perf_counter()
+            usuarios = preencher_coordenadas()
+            celulas = reconstruir_cobertura()
+            print(f"✅ {usuarios} usuário(s) com coordenadas, {celulas} célula(s) de cobertura "
+                  f"em {time.perf_counter() - inicio:.1f}s")
+            sys.exit(0)
+
+        if len(sys.argv) != 3:
+            print('Uso: python geo.py --reconstruir | python geo.py <lat> <lng>')
+            sys.exit(1)
+
+        from database import db_session
+        lat, lng = ler_coordenadas(f'{sys.argv[1]},{sys.argv[2]}')
+        inicio = time.perf_counter()
+        consulta, distancia2 = filtrar_por_cobertura(db_session.query(PrestadorServico), lat, lng)
+        ids = ids_por_distancia(consulta, distancia2, lat, lng)
+        print(f"📍 {len(ids)} prestador(es) atendem em {lat},{lng} ({(time.perf_counter() - inicio) * 1000:.1f} ms)")
+        for prestador in db_session.query(PrestadorServico).filter(PrestadorServico.id.in_(ids[:10])):
+            usuario = prestador.usuario
+            print(f"   {prestador.id:>6}  {distancia_km(lat, lng, usuario.latitude, usuario.longitude):5.1f} km "
+                  f"(raio {prestador.raio_atuacao} km)  {prestador.especialidade}")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        sys.exit(1)
@@ -0,0 +1,222 @@
+# metricas_pool.py
+"""
+Métricas do pool de conexões e das sessões por pedido.
+
+- PoolMedido (o QueuePool de sempre) mede quanto tempo se esperou por cada
+  conexão e quantas vezes o pool esgotou (TimeoutError);
+- os eventos do pool contam checkouts, conexões novas e invalidadas, o pico de
+  conexões em uso e de overflow, e há quanto tempo cada conexão está
+  emprestada: as que passam de DB_CONEXAO_PRESA_S aparecem com o endpoint que
+  as pediu (sessão que não foi fechada = fuga);
+- registrar_sessao() guarda, por endpoint, o tamanho do identity map no fim do
+  pedido (app.py chama-a antes do db_session.remove()).
+
+/debug-pool mostra tudo; em debug os pedidos levam X-DB-Espera-ms.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request, jsonify, abort
+from flask_login import current_user
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from config import config
+
+# Mesmo logger (e arquivo) da instrumentação SQL
+logger = logging.getLogger('servicos.sql')
+
+_lock = threading.Lock()
+_local = threading.local()
+_pools = {}     # nome do engine -> EstatisticasPool
+_sessoes = {}   # endpoint -> totais do identity map
+
+
+def _percentil(valores, fracao):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fracao * len(ordenados)))]
+
+
+def _origem():
+    """Quem está a usar a conexão: endpoint do pedido ou nome da thread"""
+    if has_request_context():
+        return request.endpoint or request.path
+    return threading.current_thread().name
+
+
+class EstatisticasPool:
+    """Contadores de um pool, atualizados pelos eventos e pelo PoolMedido"""
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.pool = None
+        self.checkouts = 0
+        self.conexoes_novas = 0
+        self.invalidadas = 0
+        self.esgotado = 0
+        self.esperas = deque(maxlen=config.DB_METRICAS_AMOSTRAS)
+        self.espera_max = 0.0
+        self.pico_em_uso = 0
+        self.pico_overflow = 0
+        self.uso_max = 0.0
+        self.emprestadas = {}  # id do registro -> (desde, origem)
+
+    def registrar_espera(self, segundos):
+        with _lock:
+            self.esperas.append(segundos)
+            self.espera_max = max(self.espera_max, segundos)
+        if has_request_context():
+            g._espera_pool = g.get('_espera_pool', 0.0) + segundos
+
+    def como_dict(self):
+        pool = self.pool
+        agora = time.monotonic()
+        with _lock:
+            esperas = list(self.esperas)
+            presas = sorted(
+                ({'origem': origem, 'ha_s': round(agora - desde, 1)}
+                 for desde, origem in self.emprestadas.values()
+                 if agora - desde >= config.DB_CONEXAO_PRESA_S),
+                key=lambda item: item['ha_s'], reverse=True)
+            return {
+                'engine': self.nome,
+                'pool': type(pool).__name__ if pool else None,
+                'tamanho': pool.size() if hasattr(pool, 'size') else None,
+                'em_uso': pool.checkedout() if hasattr(pool, 'checkedout') else len(self.emprestadas),
+                'livres': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+                'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+                'pico_em_uso': self.pico_em_uso,
+                'pico_overflow': self.pico_overflow,
+                'checkouts': self.checkouts,
+                'conexoes_novas': self.conexoes_novas,
+                'invalidadas': self.invalidadas,
+                'esgotado': self.esgotado,
+                'espera_ms': {
+                    'p50': round(_percentil(esperas, 0.50) * 1000, 2),
+                    'p95': round(_percentil(esperas, 0.95) * 1000, 2),
+                    'max': round(self.espera_max * 1000, 2),
+                    'amostras': len(esperas),
+                },
+                'uso_max_s': round(self.uso_max, 2),
+                'presas': presas,
+            }
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede a espera por uma conexão e conta os esgotamentos"""
+
+    def _do_get(self):
+        # O QueuePool chama-se recursivamente; só a chamada de fora é medida
+        if getattr(_local, 'medindo', False):
+            return super()._do_get()
+
+        _local.medindo = True
+        inicio = time.perf_counter()
+        estatisticas = _pools.get(getattr(self, '_nome_metricas', None))
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if estatisticas:
+                with _lock:
+                    estatisticas.esgotado += 1
+            logger.warning(json.dumps({
+                'evento': 'pool_esgotado',
+                'momento': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'origem': _origem(),
+                'pool': self.status(),
+            }, ensure_ascii=False))
+            raise
+        finally:
+            _local.medindo = False
+            if estatisticas:
+                estatisticas.registrar_espera(time.perf_counter() - inicio)
+
+
+def instrumentar_pool(engine, nome):
+    """Liga os eventos de métricas ao pool de um engine (primário ou réplica)"""
+    estatisticas = _pools[nome] = EstatisticasPool(nome)
+    estatisticas.pool = engine.pool
+    engine.pool._nome_metricas = nome
+
+    @event.listens_for(engine, 'connect')
+    def _conectou(dbapi_conn, registro):
+        with _lock:
+            estatisticas.conexoes_novas += 1
+
+    @event.listens_for(engine, 'checkout')
+    def _emprestou(dbapi_conn, registro, proxy):
+        pool = estatisticas.pool
+        with _lock:
+            estatisticas.checkouts += 1
+            estatisticas.emprestadas[id(registro)] = (time.monotonic(), _origem())
+            em_uso = pool.checkedout() if hasattr(pool, 'checkedout') else len(estatisticas.emprestadas)
+            estatisticas.pico_em_uso = max(estatisticas.pico_em_uso, em_uso)
+            if hasattr(pool, 'overflow'):
+                estatisticas.pico_overflow = max(estatisticas.pico_overflow, pool.overflow())
+
+    @event.listens_for(engine, 'checkin')
+    def _devolveu(dbapi_conn, registro):
+        with _lock:
+            emprestada = estatisticas.emprestadas.pop(id(registro), None)
+            if emprestada:
+                estatisticas.uso_max = max(estatisticas.uso_max, time.monotonic() - emprestada[0])
+
+    @event.listens_for(engine, 'invalidate')
+    def _invalidou(dbapi_conn, registro, excecao):
+        with _lock:
+            estatisticas.invalidadas += 1
+
+
+def registrar_sessao(endpoint, identidades, pendentes=0):
+    """Tamanho do identity map de uma sessão no fim do pedido"""
+    with _lock:
+        totais = _sessoes.setdefault(endpoint, {
+            'pedidos': 0, 'identidades': 0, 'max_identidades': 0, 'descartadas': 0,
+        })
+        totais['pedidos'] += 1
+        totais['identidades'] += identidades
+        totais['max_identidades'] = max(totais['max_identidades'], identidades)
+        if pendentes:
+            totais['descartadas'] += 1
+
+    if identidades >= config.SESSAO_IDENTIDADES_ALERTA or pendentes:
+        logger.warning(json.dumps({
+            'evento': 'sessao_grande' if identidades >= config.SESSAO_IDENTIDADES_ALERTA else 'sessao_nao_confirmada',
+            'momento': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'endpoint': endpoint,
+            'identidades': identidades,
+            'pendentes': pendentes,
+        }, ensure_ascii=False))
+
+
+def relatorio():
+    """Estado e contadores de cada pool e o identity map por endpoint"""
+    pools = [estatisticas.como_dict() for estatisticas in _pools.values()]
+    with _lock:
+        sessoes = [dict(totais, endpoint=endpoint,
+                        media_identidades=round(totais['identidades'] / totais['pedidos'], 1))
+                   for endpoint, totais in _sessoes.items()]
+    sessoes.sort(key=lambda item: item['max_identidades'], reverse=True)
+    return {'pools': pools, 'sessoes': sessoes}
+
+
+def init_app(app):
+    """Cabeçalho de debug com a espera pelo pool e a rota /debug-pool"""
+
+    @app.after_request
+    def _cabecalho_espera(response):
+        if app.debug or config.DEBUG:
+            response.headers['X-DB-Espera-ms'] = f"{g.get('_espera_pool', 0.0) * 1000:.2f}"
+        return response
+
+    @app.route('/debug-pool')
+    def debug_pool():
+        """Debug: pools de conexões e tamanho das sessões por endpoint"""
+        if not (app.debug or config.DEBUG) and not (current_user.is_authenticated and current_user.tipo == 'admin'):
+            abort(404)
+        return jsonify(relatorio())
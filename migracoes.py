@@ -0,0 +1,473 @@
+# migracoes.py
+"""
+Versão do schema do banco e migrações online.
+
+O arranque da aplicação (create_app) só lê a versão gravada em versao_schema,
+numa única consulta, e recusa arrancar com um banco desatualizado. Criar
+tabelas e aplicar alterações é feito pelo comando de migração, uma vez por
+deploy, com o serviço no ar:
+
+    python migracoes.py            # migra até SCHEMA_VERSAO
+    python migracoes.py --status   # mostra a versão do banco e a esperada
+
+Em desenvolvimento (config.MIGRAR_AO_INICIAR) o próprio arranque migra.
+
+Para alterar o schema: acrescentar um passo em MIGRACOES (a versão seguinte)
+usando as operações da classe Migracao, que não bloqueiam a aplicação:
+
+  - adicionar_coluna: coluna anulável ou com default; no SQLite é só uma
+    alteração do catálogo, no MySQL usa ALGORITHM=INSTANT (ou INPLACE, LOCK=NONE);
+  - criar_indice: online no MySQL, transação curta por índice no SQLite;
+  - adicionar_chave_estrangeira: online no MySQL; no SQLite exigiria recriar a
+    tabela, por isso é ignorada (o SQLite não verifica FKs por omissão);
+  - preencher_em_lotes: UPDATE por faixas da chave primária, uma transação
+    curta por lote, com o progresso gravado para retomar após uma interrupção.
+
+No SQLite o bloqueio da migração é uma linha com prazo (BLOQUEIO_EXPIRA),
+renovada a cada lote; comandos sem lotes (DDL, CREATE) vão dentro de
+`m.renovando()`, que o renova enquanto correm. As operações acima já o fazem.
+
+Os passos têm de ser idempotentes: se a migração for interrompida, o passo
+é repetido na próxima execução (os preenchimentos continuam de onde pararam).
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+import busca
+import geo
+import ranking
+from config import config
+from criar_indices import TABELAS_QUENTES, ddl_indice
+from database import engine
+from models import (Base, BloqueioMigracao, CategoriaServico, CoberturaPrestador, MensagemArquivada,
+                    Notificacao, NotificacaoArquivada, PrestadorServico, ProgressoMigracao, Usuario,
+                    VersaoSchema)
+
+# Espera por outra migração em andamento antes de desistir
+ESPERA_BLOQUEIO = 300
+# Bloqueio sem renovação há mais que isto é de um processo que morreu
+BLOQUEIO_EXPIRA = timedelta(minutes=10)
+# Durante um DDL (que pode passar de BLOQUEIO_EXPIRA) o bloqueio é renovado com este intervalo, em segundos
+RENOVACAO_BLOQUEIO = BLOQUEIO_EXPIRA.total_seconds() / 4
+# Intervalo mínimo entre linhas de progresso dos preenchimentos
+INTERVALO_PROGRESSO = 5.0
+
+
+class SchemaDesatualizado(RuntimeError):
+    """O banco está numa versão diferente da que o código espera"""
+
+
+class Migracao:
+    """Operações online disponíveis para os passos de MIGRACOES"""
+
+    def __init__(self, engine, versao, dono=None):
+        self.engine = engine
+        self.dialeto = engine.dialect.name
+        self.versao = versao
+        self.dono = dono
+
+    def _inspetor(self):
+        # Novo a cada chamada: o inspetor guarda em cache o que já refletiu
+        return inspect(self.engine)
+
+    @contextmanager
+    def renovando(self):
+        """
+        Mantém o bloqueio vivo durante um comando que não avança aos lotes
+        (índice grande, ALTER ou CREATE): renova antes, a cada
+        RENOVACAO_BLOQUEIO numa thread e depois.
+        """
+        self.renovar_bloqueio()
+        if not self.dono or self.dialeto == 'mysql':
+            yield
+            return
+
+        parar = threading.Event()
+
+        def renovar():
+            while not parar.wait(RENOVACAO_BLOQUEIO):
+                try:
+                    self.renovar_bloqueio()
+                except DBAPIError:
+                    # Banco ocupado pelo próprio DDL: tenta de novo no próximo intervalo
+                    pass
+
+        renovacao = threading.Thread(target=renovar, name='migracao-bloqueio', daemon=True)
+        renovacao.start()
+        try:
+            yield
+        finally:
+            parar.set()
+            renovacao.join()
+        self.renovar_bloqueio()
+
+    def executar(self, sql, **parametros):
+        """Executa um comando numa transação própria"""
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql) if isinstance(sql, str) else sql, parametros)
+
+    def tem_coluna(self, tabela, nome):
+        return any(coluna['name'] == nome for coluna in self._inspetor().get_columns(tabela))
+
+    def adicionar_coluna(self, coluna):
+        """Adiciona uma coluna declarada no modelo (ex.: Agendamento.__table__.c.nova), se faltar"""
+        tabela = coluna.table.name
+        if self.tem_coluna(tabela, coluna.name):
+            return False
+        if not coluna.nullable and coluna.server_default is None:
+            raise ValueError(f'{tabela}.{coluna.name}: uma coluna nova tem de ser anulável ou ter server_default')
+
+        ddl = f'ALTER TABLE {tabela} ADD COLUMN {coluna.name} {coluna.type.compile(dialect=self.engine.dialect)}'
+        if coluna.server_default is not None:
+            padrao = coluna.server_default.arg
+            ddl += f" DEFAULT {padrao.text if hasattr(padrao, 'text') else repr(str(padrao))}"
+        if not coluna.nullable:
+            ddl += ' NOT NULL'
+
+        print(f"   ➕ coluna {tabela}.{coluna.name}")
+        with self.renovando():
+            if self.dialeto != 'mysql':
+                # SQLite: ADD COLUMN só reescreve a definição no catálogo, as linhas não são tocadas
+                self.executar(ddl)
+                return True
+
+            try:
+                self.executar(ddl + ', ALGORITHM=INSTANT')
+            except DBAPIError:
+                # MySQL < 8.0.12: reconstrução online, leituras e escritas continuam
+                self.executar(ddl + ', ALGORITHM=INPLACE, LOCK=NONE')
+        return True
+
+    def criar_indice(self, indice):
+        """Cria um índice declarado no modelo, se faltar, sem bloquear escritas no MySQL"""
+        tabela = indice.table.name
+        if indice.name in {existente['name'] for existente in self._inspetor().get_indexes(tabela)}:
+            return False
+
+        print(f"   📇 índice {indice.name}")
+        with self.renovando(), self.engine.connect() as conn:
+            if self.dialeto == 'sqlite':
+                conn.execute(text('PRAGMA busy_timeout = 30000'))
+            conn.execute(text(ddl_indice(indice, self.dialeto)))
+            conn.execute(text(f'ANALYZE TABLE {tabela}' if self.dialeto == 'mysql' else f'ANALYZE {tabela}'))
+            conn.commit()
+        return True
+
+    def adicionar_chave_estrangeira(self, coluna):
+        """Chave estrangeira de uma coluna do modelo; só no MySQL (ver docstring do módulo)"""
+        if self.dialeto != 'mysql':
+            return False
+
+        tabela = coluna.table.name
+        existentes = self._inspetor().get_foreign_keys(tabela)
+        if any(fk['constrained_columns'] == [coluna.name] for fk in existentes):
+            return False
+
+        referencia = next(iter(coluna.foreign_keys)).column
+        # Com foreign_key_checks=0 o MySQL cria a FK sem copiar a tabela, mas também
+        # sem validar as linhas existentes, por isso os órfãos são verificados antes
+        orfaos = self.executar(
+            select(func.count()).select_from(coluna.table)
+            .where(coluna.isnot(None), coluna.notin_(select(referencia)))
+        ).scalar()
+        if orfaos:
+            raise ValueError(f'{tabela}.{coluna.name}: {orfaos} linha(s) sem correspondente em {referencia.table.name}')
+
+        print(f"   🔗 chave estrangeira {tabela}.{coluna.name}")
+        with self.renovando(), self.engine.begin() as conn:
+            conn.execute(text('SET foreign_key_checks = 0'))
+            conn.execute(text(
+                f'ALTER TABLE {tabela} ADD CONSTRAINT fk_{tabela}_{coluna.name} '
+                f'FOREIGN KEY ({coluna.name}) REFERENCES {referencia.table.name} ({referencia.name}), '
+                f'ALGORITHM=INPLACE, LOCK=NONE'))
+            conn.execute(text('SET foreign_key_checks = 1'))
+        return True
+
+    def preencher_em_lotes(self, nome, tabela, valores, onde=None, lote=None):
+        """
+        UPDATE tabela SET valores [WHERE onde] por faixas da chave primária.
+
+        Cada lote é uma transação curta, seguida de uma pausa para os escritores
+        da aplicação. O último id processado fica em migracoes_progresso; uma
+        migração interrompida retoma a partir dele. Linhas inseridas depois do
+        início já devem ser gravadas com o valor pelo código novo.
+        """
+        lote = lote or config.MIGRACAO_LOTE
+        chave = tabela.primary_key.columns.values()[0]
+        nome = f'{self.versao}:{nome}'
+        progresso = ProgressoMigracao.__table__
+
+        with self.engine.begin() as conn:
+            registro = conn.execute(select(progresso).where(progresso.c.nome == nome)).first()
+            if registro and registro.concluido:
+                return 0
+            if not registro:
+                conn.execute(insert(progresso).values(nome=nome, ultimo_id=0, concluido=False,
+                                                      atualizado_em=datetime.utcnow()))
+            atual = registro.ultimo_id if registro else 0
+            maximo = conn.execute(select(func.max(chave))).scalar() or 0
+
+        if atual:
+            print(f"   ↩️  {nome}: retomando a partir do id {atual}")
+        inicio, alteradas, ultimo_aviso = atual, 0, time.monotonic()
+
+        while atual < maximo:
+            fim = min(atual + lote, maximo)
+            filtro = [chave > atual, chave <= fim]
+            if onde is not None:
+                filtro.append(onde)
+
+            with self.engine.begin() as conn:
+                alteradas += conn.execute(update(tabela).where(*filtro).values(valores)).rowcount
+                conn.execute(update(progresso).where(progresso.c.nome == nome)
+                             .values(ultimo_id=fim, atualizado_em=datetime.utcnow()))
+            atual = fim
+            self.renovar_bloqueio()
+
+            if time.monotonic() - ultimo_aviso >= INTERVALO_PROGRESSO or atual >= maximo:
+                percentual = 100 * (atual - inicio) / (maximo - inicio)
+                print(f"   ⏳ {nome}: {percentual:.0f}% (id {atual}/{maximo}, {alteradas} linha(s))")
+                ultimo_aviso = time.monotonic()
+            time.sleep(config.MIGRACAO_PAUSA)
+
+        with self.engine.begin() as conn:
+            conn.execute(update(progresso).where(progresso.c.nome == nome)
+                         .values(concluido=True, atualizado_em=datetime.utcnow()))
+        return alteradas
+
+    def renovar_bloqueio(self):
+        """Mostra que a migração continua viva (passos longos no SQLite)"""
+        if self.dono and self.dialeto != 'mysql':
+            tabela = BloqueioMigracao.__table__
+            with self.engine.begin() as conn:
+                conn.execute(update(tabela).where(tabela.c.dono == self.dono).values(desde=datetime.utcnow()))
+
+
+# ==================== PASSOS ====================
+
+def _schema_inicial(m):
+    """Cria as tabelas em falta (bancos anteriores ao versionamento)"""
+    with m.renovando():
+        Base.metadata.create_all(bind=m.engine, checkfirst=True)
+
+
+def _indices_consultas_quentes(m):
+    """Índices compostos das consultas quentes em bancos criados antes deles"""
+    for nome_tabela in TABELAS_QUENTES:
+        for indice in sorted(Base.metadata.tables[nome_tabela].indexes, key=lambda indice: indice.name):
+            m.criar_indice(indice)
+
+
+def _categoria_id_prestadores(m):
+    """prestadores_servico.categoria_id preenchido a partir do slug em `categoria` (era o update_database.py)"""
+    tabela = PrestadorServico.__table__
+    m.adicionar_coluna(tabela.c.categoria_id)
+    m.preencher_em_lotes(
+        'prestadores_servico.categoria_id', tabela,
+        {'categoria_id': select(CategoriaServico.id)
+            .where(CategoriaServico.slug == tabela.c.categoria).scalar_subquery()},
+        onde=tabela.c.categoria_id.is_(None),
+    )
+    m.adicionar_chave_estrangeira(tabela.c.categoria_id)
+
+
+def _tabelas_arquivo(m):
+    """Tabelas de arquivo de mensagens/notificações e o índice da retenção por tipo"""
+    with m.renovando():
+        Base.metadata.create_all(bind=m.engine, checkfirst=True,
+                                 tables=[MensagemArquivada.__table__, NotificacaoArquivada.__table__])
+    m.criar_indice(next(indice for indice in Notificacao.__table__.indexes
+                        if indice.name == 'ix_notificacoes_tipo_data'))
+
+
+def _indice_busca(m):
+    """Índice de texto completo da busca (FTS5 / FULLTEXT), preenchido com os prestadores atuais"""
+    with m.renovando():
+        criado = busca.criar_indice(m.engine)
+    if not criado:
+        return
+    total = busca.reindexar(m.engine, ao_avancar=m.renovar_bloqueio)
+    print(f"   🔍 {total} prestador(es) indexado(s) em {busca.TABELA}")
+
+
+def _busca_normalizada(m):
+    """Regrava os documentos da busca normalizados (sem acentos, radical leve)"""
+    if not busca.indice_disponivel(m.engine):
+        return
+    total = busca.reindexar(m.engine, ao_avancar=m.renovar_bloqueio)
+    print(f"   🔍 {total} prestador(es) reindexado(s)")
+
+
+def _cobertura_geografica(m):
+    """usuarios.latitude/longitude a partir de `coordenadas` e a grelha de cobertura dos prestadores"""
+    tabela = Usuario.__table__
+    m.adicionar_coluna(tabela.c.latitude)
+    m.adicionar_coluna(tabela.c.longitude)
+    with m.renovando():
+        CoberturaPrestador.__table__.create(bind=m.engine, checkfirst=True)
+
+    usuarios = geo.preencher_coordenadas(m.engine, ao_avancar=m.renovar_bloqueio)
+    celulas = geo.reconstruir_cobertura(m.engine, ao_avancar=m.renovar_bloqueio)
+    print(f"   📍 {usuarios} usuário(s) com coordenadas, {celulas} célula(s) de cobertura")
+
+
+def _pontuacao_prestadores(m):
+    """prestadores_servico.pontuacao, os índices da ordenação por qualidade e o cálculo inicial"""
+    tabela = PrestadorServico.__table__
+    m.adicionar_coluna(tabela.c.pontuacao)
+    for indice in sorted(tabela.indexes, key=lambda indice: indice.name):
+        m.criar_indice(indice)
+    total = ranking.recalcular(m.engine, ao_avancar=m.renovar_bloqueio)
+    print(f"   🏆 {total} prestador(es) pontuado(s)")
+
+
+# versão -> (descrição, função que recebe a Migracao)
+MIGRACOES = {
+    1: ('schema inicial', _schema_inicial),
+    2: ('índices compostos das consultas quentes', _indices_consultas_quentes),
+    3: ('categoria_id dos prestadores', _categoria_id_prestadores),
+    4: ('arquivo de mensagens e notificações antigas', _tabelas_arquivo),
+    5: ('índice de texto completo da busca', _indice_busca),
+    6: ('busca sem acentos e com radicais', _busca_normalizada),
+    7: ('coordenadas numéricas e cobertura geográfica', _cobertura_geografica),
+    8: ('pontuação de qualidade dos prestadores', _pontuacao_prestadores),
+    9: ('radical comum a -ês, -esa e -eses na busca', _busca_normalizada),
+}
+
+SCHEMA_VERSAO = max(MIGRACOES)
+
+
+# ==================== EXECUÇÃO ====================
+
+def versao_banco(conn):
+    """Última versão aplicada; 0 se o banco ainda não é versionado"""
+    if not inspect(conn).has_table(VersaoSchema.__tablename__):
+        return 0
+    return conn.execute(select(func.max(VersaoSchema.versao))).scalar() or 0
+
+
+def verificar_schema():
+    """
+    Verificação do arranque: uma consulta à versão. Levanta SchemaDesatualizado
+    se o banco não estiver em SCHEMA_VERSAO (em desenvolvimento, migra).
+    """
+    with engine.connect() as conn:
+        try:
+            versao = conn.execute(select(func.max(VersaoSchema.versao))).scalar() or 0
+        except DBAPIError:
+            # Tabela ainda não existe: banco anterior ao versionamento
+            conn.rollback()
+            versao = 0
+
+    if versao == SCHEMA_VERSAO:
+        return versao
+
+    if versao > SCHEMA_VERSAO:
+        raise SchemaDesatualizado(
+            f'Banco na versão {versao}, mais nova que a do código ({SCHEMA_VERSAO}); atualize a aplicação')
+
+    if not config.MIGRAR_AO_INICIAR:
+        raise SchemaDesatualizado(
+            f'Banco na versão {versao}, esperada {SCHEMA_VERSAO}; rode "python migracoes.py" antes de iniciar')
+
+    return migrar()
+
+
+def _criar_tabelas_controle():
+    for modelo in (VersaoSchema, ProgressoMigracao, BloqueioMigracao):
+        try:
+            modelo.__table__.create(bind=engine, checkfirst=True)
+        except DBAPIError:
+            # Outro processo criou a tabela entre a verificação e o CREATE
+            if not inspect(engine).has_table(modelo.__tablename__):
+                raise
+
+
+@contextmanager
+def _bloqueio():
+    """Uma migração de cada vez, sem prender as tabelas da aplicação"""
+    if engine.dialect.name == 'mysql':
+        with engine.connect() as conn:
+            if not conn.execute(text("SELECT GET_LOCK('servicos_migracao', :espera)"),
+                                {'espera': ESPERA_BLOQUEIO}).scalar():
+                raise SchemaDesatualizado('Outra migração está em andamento')
+            try:
+                yield None
+            finally:
+                conn.execute(text("SELECT RELEASE_LOCK('servicos_migracao')"))
+        return
+
+    # Sem lock consultivo: uma linha em migracoes_bloqueio, renovada pelos passos longos
+    tabela = BloqueioMigracao.__table__
+    dono = f'{socket.gethostname()}:{os.getpid()}'
+    limite = time.monotonic() + ESPERA_BLOQUEIO
+    while True:
+        try:
+            with engine.begin() as conn:
+                conn.execute(delete(tabela).where(tabela.c.desde < datetime.utcnow() - BLOQUEIO_EXPIRA))
+                conn.execute(insert(tabela).values(id=1, dono=dono, desde=datetime.utcnow()))
+            break
+        except IntegrityError:
+            if time.monotonic() > limite:
+                raise SchemaDesatualizado('Outra migração está em andamento')
+            time.sleep(1)
+
+    try:
+        yield dono
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(tabela).where(tabela.c.dono == dono))
+
+
+def migrar(alvo=SCHEMA_VERSAO):
+    """Aplica, em ordem, os passos acima da versão atual; devolve a versão final"""
+    _criar_tabelas_controle()
+
+    with _bloqueio() as dono:
+        # Lido depois do bloqueio: outro processo pode ter acabado de migrar
+        with engine.connect() as conn:
+            versao = versao_banco(conn)
+
+        for numero in sorted(MIGRACOES):
+            if numero <= versao or numero > alvo:
+                continue
+            descricao, passo = MIGRACOES[numero]
+            print(f"📝 Migração {numero}: {descricao}...")
+            inicio = time.perf_counter()
+
+            passo(Migracao(engine, numero, dono))
+            with engine.begin() as conn:
+                conn.execute(insert(VersaoSchema.__table__).values(
+                    versao=numero, descricao=descricao, aplicada_em=datetime.utcnow()))
+
+            versao = numero
+            print(f"✅ Migração {numero} aplicada em {time.perf_counter() - inicio:.2f}s")
+
+    return versao
+
+
+if __name__ == "__main__":
+    try:
+        with engine.connect() as conexao:
+            atual = versao_banco(conexao)
+
+        print(f"📊 Banco na versão {atual}, código na versão {SCHEMA_VERSAO}")
+        if '--status' in sys.argv:
+            sys.exit(0 if atual == SCHEMA_VERSAO else 1)
+
+        if atual >= SCHEMA_VERSAO:
+            print("✅ Nada a migrar!")
+        else:
+            print(f"🎉 Banco migrado para a versão {migrar()}!")
+
+    except Exception as e:
+        print(f"❌ Erro na migração: {e}")
+        sys.exit(1)
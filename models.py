@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean, JSON, Index, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, Session
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
@@ -20,6 +20,8 @@ class Usuario(Base, UserMixin):
     cidade = Column(String(100))
     bairro = Column(String(100))
     coordenadas = Column(String(100))  # lat,lng
+    latitude = Column(Float)   # preenchidas a partir de coordenadas (geo.py)
+    longitude = Column(Float)
     avatar_url = Column(String(500))
     data_cadastro = Column(DateTime, default=datetime.utcnow)
     ultimo_login = Column(DateTime)
@@ -64,6 +66,11 @@ class CategoriaServico(Base):
 
 class PrestadorServico(Base):
     __tablename__ = 'prestadores_servico'
+    __table_args__ = (
+        # Listagem e busca ordenadas pela pontuação (ranking.py), com e sem filtro de categoria
+        Index('ix_prestadores_servico_ranking', 'disponivel', 'pontuacao', 'id'),
+        Index('ix_prestadores_servico_categoria_ranking', 'categoria', 'disponivel', 'pontuacao', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
@@ -80,6 +87,7 @@ class PrestadorServico(Base):
     verificado = Column(Boolean, default=False)
     saldo_disponivel = Column(Float, default=0.0)
     total_ganho = Column(Float, default=0.0)
+    pontuacao = Column(Float, default=0.0, nullable=False, server_default='0')  # ranking.py
 
     # Relacionamentos
     usuario = relationship("Usuario", back_populates="prestador")
@@ -89,6 +97,15 @@ class PrestadorServico(Base):
     documentos = relationship("DocumentoPrestador", back_populates="prestador")
     transacoes_financeiras = relationship("TransacaoFinanceira", back_populates="prestador")
     categoria_obj = relationship("CategoriaServico", back_populates="prestadores")
+    resumo_avaliacoes = relationship("ResumoAvaliacoes", back_populates="prestador", uselist=False)
+
+    @property
+    def avaliacao_media(self):
+        return self.resumo_avaliacoes.media if self.resumo_avaliacoes else 0
+
+    @property
+    def total_avaliacoes(self):
+        return self.resumo_avaliacoes.total if self.resumo_avaliacoes else 0
 
     def __repr__(self):
         return f'<Prestador {self.especialidade}>'
@@ -117,6 +134,12 @@ class Servico(Base):
 
 class Agendamento(Base):
     __tablename__ = 'agendamentos'
+    __table_args__ = (
+        # Agenda do prestador (filtro por status + ordenação por data) e conflitos de horário
+        Index('ix_agendamentos_prestador_status_data', 'prestador_id', 'status', 'data_agendamento'),
+        # Dashboard / lista de agendamentos do cliente
+        Index('ix_agendamentos_cliente_data', 'cliente_id', 'data_agendamento'),
+    )
 
     id = Column(Integer, primary_key=True)
     cliente_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
@@ -164,6 +187,12 @@ class Conversa(Base):
 
 class Mensagem(Base):
     __tablename__ = 'mensagens'
+    __table_args__ = (
+        # Histórico e polling do chat
+        Index('ix_mensagens_conversa_data', 'conversa_id', 'data_envio'),
+        # Contagem de não lidas por conversa
+        Index('ix_mensagens_conversa_lida_remetente', 'conversa_id', 'lida', 'remetente_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     conversa_id = Column(Integer, ForeignKey('conversas.id'), nullable=False)
@@ -226,8 +255,70 @@ class Avaliacao(Base):
         return f'<Avaliacao {self.rating} estrelas>'
 
 
+class ResumoAvaliacoes(Base):
+    """Agregado das avaliações de um prestador (total, soma e distribuição por estrelas)"""
+    __tablename__ = 'avaliacoes_resumo'
+
+    prestador_id = Column(Integer, ForeignKey('prestadores_servico.id'), primary_key=True)
+    total = Column(Integer, default=0, nullable=False)
+    soma = Column(Integer, default=0, nullable=False)
+    estrelas_1 = Column(Integer, default=0, nullable=False)
+    estrelas_2 = Column(Integer, default=0, nullable=False)
+    estrelas_3 = Column(Integer, default=0, nullable=False)
+    estrelas_4 = Column(Integer, default=0, nullable=False)
+    estrelas_5 = Column(Integer, default=0, nullable=False)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relacionamentos
+    prestador = relationship("PrestadorServico", back_populates="resumo_avaliacoes")
+
+    @property
+    def media(self):
+        return round(self.soma / self.total, 1) if self.total else 0
+
+    @property
+    def distribuicao(self):
+        return {estrelas: getattr(self, f'estrelas_{estrelas}') or 0 for estrelas in range(1, 6)}
+
+    def como_dict(self):
+        return {
+            'total_avaliacoes': self.total,
+            'media_rating': self.media,
+            'distribuicao': self.distribuicao,
+        }
+
+    def __repr__(self):
+        return f'<ResumoAvaliacoes prestador={self.prestador_id} media={self.media}>'
+
+
+class CoberturaPrestador(Base):
+    """Células da grelha geográfica cobertas pelo raio de atuação de um prestador (geo.py)"""
+    __tablename__ = 'prestadores_cobertura'
+    __table_args__ = (
+        # Apagar/regravar as células de um prestador
+        Index('ix_prestadores_cobertura_prestador', 'prestador_id'),
+        {'sqlite_with_rowid': False},
+    )
+
+    # Chave (celula, latitude, prestador_id): "perto de mim" lê uma célula, por
+    # faixas de latitude a partir do cliente (geo.ids_por_distancia)
+    celula = Column(Integer, primary_key=True, autoincrement=False)
+    latitude = Column(Float, primary_key=True, autoincrement=False)
+    # Sem FK: as linhas são apagadas depois do prestador, no after_flush
+    prestador_id = Column(Integer, primary_key=True, autoincrement=False)
+    # Cópias para a distância ser calculada na própria leitura da célula
+    longitude = Column(Float, nullable=False)
+    raio_km = Column(Float, nullable=False)
+
+
 class Notificacao(Base):
     __tablename__ = 'notificacoes'
+    __table_args__ = (
+        # Contador de não lidas e lista de notificações do usuário
+        Index('ix_notificacoes_usuario_lida_data', 'usuario_id', 'lida', 'data_criacao'),
+        # Retenção por tipo (arquivamento.py)
+        Index('ix_notificacoes_tipo_data', 'tipo', 'data_criacao'),
+    )
 
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'))
@@ -245,8 +336,56 @@ class Notificacao(Base):
         return f'<Notificacao {self.tipo}>'
 
 
+class MensagemArquivada(Base):
+    """Mensagens antigas movidas de `mensagens` pelo arquivamento.py (mesmo id)"""
+    __tablename__ = 'mensagens_arquivo'
+    __table_args__ = (
+        Index('ix_mensagens_arquivo_conversa_data', 'conversa_id', 'data_envio'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    conversa_id = Column(Integer, ForeignKey('conversas.id'), nullable=False)
+    remetente_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
+    conteudo = Column(Text, nullable=False)
+    tipo = Column(String(20), default='texto')
+    arquivo_url = Column(String(500))
+    data_envio = Column(DateTime)
+    lida = Column(Boolean, default=False)
+    arquivada_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<MensagemArquivada {self.id}>'
+
+
+class NotificacaoArquivada(Base):
+    """Notificações antigas movidas de `notificacoes` pelo arquivamento.py (mesmo id)"""
+    __tablename__ = 'notificacoes_arquivo'
+    __table_args__ = (
+        Index('ix_notificacoes_arquivo_usuario_data', 'usuario_id', 'data_criacao'),
+        # Retenção por tipo
+        Index('ix_notificacoes_arquivo_tipo_data', 'tipo', 'data_criacao'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, ForeignKey('usuarios.id'))
+    tipo = Column(String(50))
+    titulo = Column(String(200))
+    mensagem = Column(Text)
+    lida = Column(Boolean, default=False)
+    data_criacao = Column(DateTime)
+    link_acao = Column(String(500))
+    arquivada_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotificacaoArquivada {self.tipo}>'
+
+
 class TransacaoFinanceira(Base):
     __tablename__ = 'transacoes_financeiras'
+    __table_args__ = (
+        # Histórico financeiro do prestador
+        Index('ix_transacoes_prestador_data', 'prestador_id', 'data_transacao'),
+    )
 
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'))
@@ -270,6 +409,10 @@ class TransacaoFinanceira(Base):
 # KEEP ONLY ONE TicketSuporte CLASS - REMOVED THE DUPLICATE
 class TicketSuporte(Base):
     __tablename__ = 'tickets_suporte'
+    __table_args__ = (
+        # Fila de tickets do admin (status + prioridade, mais recentes primeiro)
+        Index('ix_tickets_status_prioridade_data', 'status', 'prioridade', 'data_abertura'),
+    )
 
     id = Column(Integer, primary_key=True)
     usuario_id = Column(Integer, ForeignKey('usuarios.id'), nullable=False)
@@ -337,4 +480,124 @@ class ConfiguracaoPlataforma(Base):
     atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
-        return f'<Configuracao {self.chave}>'
\ No newline at end of file
+        return f'<Configuracao {self.chave}>'
+
+
+class VersaoSchema(Base):
+    """Migrações aplicadas ao banco (uma linha por versão, ver migracoes.py)"""
+    __tablename__ = 'versao_schema'
+
+    versao = Column(Integer, primary_key=True, autoincrement=False)
+    descricao = Column(String(200))
+    aplicada_em = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<VersaoSchema {self.versao}>'
+
+
+class ProgressoMigracao(Base):
+    """Ponto de retoma dos preenchimentos em lotes das migrações"""
+    __tablename__ = 'migracoes_progresso'
+
+    nome = Column(String(100), primary_key=True)
+    ultimo_id = Column(Integer, nullable=False, default=0)
+    concluido = Column(Boolean, default=False)
+    atualizado_em = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class BloqueioMigracao(Base):
+    """Garante uma única migração de cada vez em bancos sem lock consultivo (SQLite)"""
+    __tablename__ = 'migracoes_bloqueio'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    dono = Column(String(100), nullable=False)
+    desde = Column(DateTime, default=datetime.utcnow)
+
+
+# ==================== EVENTOS ====================
+
+def _somar_variacao(variacoes, prestador_id, rating, sinal):
+    """Acumula a variação de uma avaliação no agregado do prestador"""
+    if not prestador_id or rating not in (1, 2, 3, 4, 5):
+        return
+    variacao = variacoes.setdefault(prestador_id, {'total': 0, 'soma': 0})
+    variacao['total'] += sinal
+    variacao['soma'] += sinal * rating
+    coluna = f'estrelas_{rating}'
+    variacao[coluna] = variacao.get(coluna, 0) + sinal
+
+
+@event.listens_for(Avaliacao.rating, 'set', active_history=True)
+@event.listens_for(Avaliacao.prestador_id, 'set', active_history=True)
+def _guardar_valor_anterior(target, value, oldvalue, initiator):
+    """Carrega o valor gravado antes da alteração, necessário para desfazer a variação antiga"""
+
+
+def _valor_gravado(obj, atributo):
+    """Valor do atributo como está no banco (antes das alterações pendentes)"""
+    historico = inspect(obj).attrs[atributo].history
+    return historico.deleted[0] if historico.deleted else getattr(obj, atributo)
+
+
+def _variacoes_avaliacoes(session):
+    """Variações por prestador a partir das avaliações criadas, alteradas ou removidas"""
+    variacoes = {}
+
+    for obj in session.new:
+        if isinstance(obj, Avaliacao):
+            _somar_variacao(variacoes, obj.prestador_id, obj.rating, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Avaliacao):
+            _somar_variacao(variacoes, _valor_gravado(obj, 'prestador_id'), _valor_gravado(obj, 'rating'), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Avaliacao):
+            continue
+        estado = inspect(obj).attrs
+        if not (estado.rating.history.has_changes() or estado.prestador_id.history.has_changes()):
+            continue
+        _somar_variacao(variacoes, _valor_gravado(obj, 'prestador_id'), _valor_gravado(obj, 'rating'), -1)
+        _somar_variacao(variacoes, obj.prestador_id, obj.rating, 1)
+
+    return variacoes
+
+
+def aplicar_variacao_resumo(conn, prestador_id, variacao):
+    """Soma a variação ao agregado do prestador num único UPSERT atômico"""
+    tabela = ResumoAvaliacoes.__table__
+    agora = datetime.utcnow()
+    novos = {'prestador_id': prestador_id, 'atualizado_em': agora, **variacao}
+    incrementos = {coluna: tabela.c[coluna] + delta for coluna, delta in variacao.items()}
+    incrementos['atualizado_em'] = agora
+
+    dialeto = conn.dialect.name
+    if dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        conn.execute(insert(tabela).values(**novos).on_conflict_do_update(
+            index_elements=['prestador_id'], set_=incrementos))
+    elif dialeto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        conn.execute(insert(tabela).values(**novos).on_duplicate_key_update(**incrementos))
+    else:
+        resultado = conn.execute(tabela.update().where(tabela.c.prestador_id == prestador_id).values(**incrementos))
+        if resultado.rowcount == 0:
+            conn.execute(tabela.insert().values(**novos))
+
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_resumo_avaliacoes(session, flush_context):
+    """Mantém avaliacoes_resumo na mesma transação em que as avaliações são gravadas"""
+    variacoes = _variacoes_avaliacoes(session)
+    if not variacoes:
+        return
+
+    conn = session.connection()
+    for prestador_id, variacao in variacoes.items():
+        aplicar_variacao_resumo(conn, prestador_id, variacao)
+
+    # Objetos já carregados na sessão ficariam com os valores antigos
+    for prestador_id in variacoes:
+        resumo = session.identity_map.get(session.identity_key(ResumoAvaliacoes, prestador_id))
+        if resumo is not None:
+            session.expire(resumo)
@@ -0,0 +1,231 @@
+# monitor_sql.py
+"""
+Instrumentação SQL por pedido.
+
+Os eventos do SQLAlchemy registam, para cada pedido HTTP, o número de
+consultas, o tempo total no banco, as consultas mais lentas (com o SQL
+normalizado) e as formas de consulta repetidas (padrão N+1).
+
+- modo debug: cabeçalhos X-SQL-* em cada resposta;
+- sempre: log estruturado (JSON por linha) das consultas lentas e N+1;
+- /debug-sql: agregado por endpoint desde o arranque do worker.
+"""
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request, jsonify, abort
+from flask_login import current_user
+from sqlalchemy import event
+
+from config import config
+
+logger = logging.getLogger('servicos.sql')
+
+_RE_STRING = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_RE_PARAMETRO = re.compile(r'%s|%\(\w+\)s|:\w+|\?')
+_RE_LISTA = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_RE_ESPACOS = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_agregado = {}          # endpoint -> totais desde o arranque
+_formas_lentas = {}     # sql normalizado -> (ocorrências, tempo máximo em ms)
+
+
+def normalizar_sql(sql):
+    """Reduz uma consulta à sua forma: literais e parâmetros viram '?'"""
+    sql = _RE_STRING.sub('?', sql)
+    sql = _RE_PARAMETRO.sub('?', sql)
+    sql = _RE_NUMERO.sub('?', sql)
+    sql = _RE_LISTA.sub('(?...)', sql)
+    return _RE_ESPACOS.sub(' ', sql).strip()
+
+
+class EstatisticasPedido:
+    """Consultas executadas durante um pedido"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_total = 0.0
+        self.formas = Counter()
+        self.lentas = []  # heap (duração, sql) com as N mais lentas
+
+    def registrar(self, sql, duracao):
+        forma = normalizar_sql(sql)
+        self.consultas += 1
+        self.tempo_total += duracao
+        self.formas[forma] += 1
+
+        item = (duracao, forma)
+        if len(self.lentas) < config.SQL_TOP_LENTAS:
+            heapq.heappush(self.lentas, item)
+        else:
+            heapq.heappushpop(self.lentas, item)
+
+    def n_mais_1(self):
+        """Formas SELECT repetidas acima do limite (candidatas a N+1)"""
+        return [
+            {'sql': forma, 'repeticoes': total}
+            for forma, total in self.formas.most_common()
+            if total >= config.SQL_N_MAIS_1_MINIMO and forma.upper().startswith('SELECT')
+        ]
+
+    def mais_lentas(self):
+        return [{'sql': forma, 'ms': round(duracao * 1000, 2)}
+                for duracao, forma in sorted(self.lentas, reverse=True)]
+
+    def como_dict(self):
+        return {
+            'consultas': self.consultas,
+            'tempo_ms': round(self.tempo_total * 1000, 2),
+            'mais_lentas': self.mais_lentas(),
+            'n_mais_1': self.n_mais_1(),
+        }
+
+
+def estatisticas_pedido():
+    """Estatísticas SQL do pedido atual (ou None fora de um pedido)"""
+    if not has_request_context():
+        return None
+    return g.get('_sql_pedido')
+
+
+def instrumentar_engine(engine):
+    """Liga os eventos de medição a um engine (primário ou réplica)"""
+
+    # O início fica no contexto da execução, não numa pilha da conexão: um comando
+    # que falha não deixa o seu início para o próximo comando da mesma conexão
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _antes(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._inicio_consulta = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _depois(conn, cursor, statement, parameters, context, executemany):
+        _registrar(context, statement)
+
+    @event.listens_for(engine, 'handle_error')
+    def _erro(contexto_erro):
+        # Comandos que falham também gastaram tempo do pedido
+        _registrar(contexto_erro.execution_context, contexto_erro.statement)
+
+
+def _registrar(context, statement):
+    inicio = getattr(context, '_inicio_consulta', None)
+    if inicio is None:
+        return
+    del context._inicio_consulta
+    estatisticas = estatisticas_pedido()
+    if estatisticas is not None:
+        estatisticas.registrar(statement, time.perf_counter() - inicio)
+
+
+def _configurar_log():
+    """Log estruturado das consultas lentas, uma linha JSON por pedido"""
+    if logger.handlers:
+        return
+    handler = logging.FileHandler(config.SQL_LOG_ARQUIVO, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING)
+    logger.propagate = False
+
+
+def _agregar(endpoint, estatisticas, n_mais_1):
+    with _lock:
+        totais = _agregado.setdefault(endpoint, {
+            'pedidos': 0, 'consultas': 0, 'tempo_ms': 0.0,
+            'max_consultas': 0, 'max_tempo_ms': 0.0, 'pedidos_n_mais_1': 0,
+        })
+        tempo_ms = estatisticas.tempo_total * 1000
+        totais['pedidos'] += 1
+        totais['consultas'] += estatisticas.consultas
+        totais['tempo_ms'] += tempo_ms
+        totais['max_consultas'] = max(totais['max_consultas'], estatisticas.consultas)
+        totais['max_tempo_ms'] = max(totais['max_tempo_ms'], tempo_ms)
+        if n_mais_1:
+            totais['pedidos_n_mais_1'] += 1
+
+        for duracao, forma in estatisticas.lentas:
+            ms = duracao * 1000
+            if ms >= config.SQL_LENTA_MS:
+                ocorrencias, maximo = _formas_lentas.get(forma, (0, 0.0))
+                _formas_lentas[forma] = (ocorrencias + 1, max(maximo, ms))
+
+
+def relatorio_agregado():
+    """Totais por endpoint e formas lentas desde o arranque do worker"""
+    with _lock:
+        endpoints = []
+        for endpoint, totais in _agregado.items():
+            pedidos = totais['pedidos']
+            endpoints.append(dict(
+                totais,
+                endpoint=endpoint,
+                tempo_ms=round(totais['tempo_ms'], 2),
+                max_tempo_ms=round(totais['max_tempo_ms'], 2),
+                media_consultas=round(totais['consultas'] / pedidos, 1),
+                media_tempo_ms=round(totais['tempo_ms'] / pedidos, 2),
+            ))
+        lentas = [{'sql': forma, 'ocorrencias': ocorrencias, 'max_ms': round(maximo, 2)}
+                  for forma, (ocorrencias, maximo) in _formas_lentas.items()]
+
+    endpoints.sort(key=lambda item: item['tempo_ms'], reverse=True)
+    lentas.sort(key=lambda item: item['max_ms'], reverse=True)
+    return {'endpoints': endpoints, 'consultas_lentas': lentas[:50]}
+
+
+def init_app(app):
+    """Regista a medição por pedido, os cabeçalhos de debug e a rota /debug-sql"""
+    if not config.SQL_MONITOR_ATIVO:
+        return
+
+    _configurar_log()
+
+    @app.before_request
+    def _iniciar_medicao():
+        g._sql_pedido = EstatisticasPedido()
+
+    @app.after_request
+    def _finalizar_medicao(response):
+        estatisticas = g.pop('_sql_pedido', None)
+        if estatisticas is None:
+            return response
+
+        endpoint = request.endpoint or request.path
+        n_mais_1 = estatisticas.n_mais_1()
+        _agregar(endpoint, estatisticas, n_mais_1)
+
+        if app.debug or config.DEBUG:
+            response.headers['X-SQL-Consultas'] = str(estatisticas.consultas)
+            response.headers['X-SQL-Tempo-ms'] = f'{estatisticas.tempo_total * 1000:.2f}'
+            response.headers['X-SQL-N-Mais-1'] = str(len(n_mais_1))
+
+        lentas = [item for item in estatisticas.mais_lentas() if item['ms'] >= config.SQL_LENTA_MS]
+        if lentas or n_mais_1:
+            logger.warning(json.dumps({
+                'evento': 'sql_lento' if lentas else 'sql_n_mais_1',
+                'momento': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'metodo': request.method,
+                'caminho': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'consultas': estatisticas.consultas,
+                'tempo_ms': round(estatisticas.tempo_total * 1000, 2),
+                'lentas': lentas,
+                'n_mais_1': n_mais_1,
+            }, ensure_ascii=False))
+
+        return response
+
+    @app.route('/debug-sql')
+    def debug_sql():
+        """Debug: agregado das consultas SQL por endpoint"""
+        if not (app.debug or config.DEBUG) and not (current_user.is_authenticated and current_user.tipo == 'admin'):
+            abort(404)
+        return jsonify(relatorio_agregado())
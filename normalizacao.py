@@ -0,0 +1,93 @@
+# normalizacao.py
+"""
+Normalização de texto em português para a busca.
+
+    "Médicas" -> "medic"     "médico" -> "medic"
+    "Cozinheiras" -> "cozinheir"     "professores" -> "professor"
+    "português" / "portuguesa" / "portugueses" -> "portugues"
+    "inglês" / "inglesa" -> "ingles"     "francês" / "francesas" -> "frances"
+
+1. minúsculas e sem acentos (NFKD sem as marcas combinantes, ç -> c);
+2. palavras = sequências de letras/dígitos (o '_' dos slugs separa);
+3. radical leve: plural (ões, ães, ais, eis, res, zes, ns, s, ...) e depois
+   a vogal de género final (-o/-a). O singular em -ês já é o radical de
+   -esa/-eses: sem o acento, "ingles" seria o plural de "ingle".
+
+O mesmo pipeline é aplicado aos documentos, quando são gravados no índice
+(busca.py), e aos termos da busca, então as duas formas coincidem sem funções
+sobre as linhas na hora da consulta. O radical é deliberadamente leve: junta
+singular/plural e masculino/feminino, mas não tenta tirar sufixos derivativos
+(que juntariam palavras diferentes).
+"""
+import re
+import unicodedata
+
+# Palavras com até este tamanho ficam como estão (sigla, "sao", "dia", ...)
+TAMANHO_MINIMO = 3
+
+# (sufixo do plural, substituição), o primeiro que servir
+PLURAIS = [
+    ('oes', 'ao'),  # opções -> opcao
+    ('aes', 'ao'),  # capitães -> capitao
+    ('ais', 'al'),  # locais -> local
+    ('eis', 'el'),  # papéis -> papel
+    ('ois', 'ol'),  # lençóis -> lencol
+    ('res', 'r'),   # professores -> professor
+    ('zes', 'z'),   # luzes -> luz
+    ('ses', 's'),   # meses -> mes
+    ('les', 'l'),   # males -> mal
+    ('ns', 'm'),    # homens -> homem
+    ('s', ''),      # medicos -> medico
+]
+
+_RE_PALAVRA = re.compile(r'[^\W_]+')
+_RE_SINGULAR_ES = re.compile(r'[^\W_]+ês(?![^\W_])')
+
+
+def dobrar(texto):
+    """Minúsculas e sem acentos"""
+    if (texto or '').isascii():
+        return (texto or '').lower()
+    decomposto = unicodedata.normalize('NFKD', (texto or '').lower())
+    return ''.join(caractere for caractere in decomposto if not unicodedata.combining(caractere))
+
+
+def radical(palavra, singular_es=False):
+    """
+    Radical leve de uma palavra já dobrada.
+
+    singular_es: a palavra terminava em -ês antes de dobrar ("português"):
+    fica como está, o mesmo radical de "portuguesa" e "portugueses".
+    """
+    if len(palavra) <= TAMANHO_MINIMO or palavra.isdigit() or singular_es:
+        return palavra
+
+    if not palavra.endswith('ss'):
+        for sufixo, troca in PLURAIS:
+            # O que sobra tem de continuar a ser uma palavra (ex.: "pais" não vira "pal")
+            if palavra.endswith(sufixo) and len(palavra) - len(sufixo) >= 2:
+                palavra = palavra[:-len(sufixo)] + troca
+                break
+
+    if len(palavra) > TAMANHO_MINIMO and palavra[-1] in 'ao':
+        palavra = palavra[:-1]
+    return palavra
+
+
+def palavras_dobradas(texto):
+    """Palavras do texto sem acentos e sem radical (prefixos das sugestões)"""
+    return _RE_PALAVRA.findall(dobrar(texto))
+
+
+def palavras(texto):
+    """Radicais das palavras do texto, na ordem"""
+    texto = texto or ''
+    # O acento de -ês sai em dobrar(): as palavras que o tinham são guardadas antes
+    singulares_es = () if texto.isascii() else {
+        dobrar(palavra) for palavra in _RE_SINGULAR_ES.findall(unicodedata.normalize('NFC', texto.lower()))}
+    return [radical(palavra, palavra in singulares_es) for palavra in _RE_PALAVRA.findall(dobrar(texto))]
+
+
+def normalizar(texto):
+    """Texto como é gravado no índice: radicais separados por espaço"""
+    return ' '.join(palavras(texto))
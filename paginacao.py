@@ -0,0 +1,362 @@
+# paginacao.py
+"""
+Paginação por cursor (keyset) partilhada pelas listagens.
+
+Em vez de OFFSET, cada página continua a partir dos valores da ordenação do
+último item visto, por exemplo:
+
+    WHERE (data_criacao, id) < (:data, :id) ORDER BY data_criacao DESC, id DESC
+
+O custo de uma página não depende da profundidade e, com o índice certo, é
+uma leitura de intervalo. O cursor é opaco (base64 de JSON) e leva a
+assinatura da ordenação, por isso não pode ser reaproveitado noutra listagem.
+
+Regras da ordenação: a última coluna tem de ser única (normalmente o id) e
+nenhuma coluna pode ser NULL.
+
+O total é opcional: 'exato' faz um COUNT por pedido, 'aproximado' guarda o
+COUNT em cache por PAGINACAO_TOTAL_TTL segundos.
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import date, datetime
+
+from sqlalchemy import String, and_, literal, or_
+from sqlalchemy.sql import operators
+
+from config import config
+from database import engine
+
+_lock = threading.Lock()
+_cache_totais = {}  # (sql, parâmetros) -> (expira_em, total)
+
+
+class CursorInvalido(ValueError):
+    """Cursor adulterado ou criado para outra listagem"""
+
+
+class Pagina:
+    """Uma página de resultados e os cursores para as vizinhas"""
+
+    def __init__(self, itens, por_pagina, proximo_cursor=None, cursor_anterior=None,
+                 total=None, total_aproximado=False):
+        self.itens = itens
+        self.por_pagina = por_pagina
+        self.proximo_cursor = proximo_cursor
+        self.cursor_anterior = cursor_anterior
+        self.total = total
+        self.total_aproximado = total_aproximado
+
+    @property
+    def tem_proxima(self):
+        return self.proximo_cursor is not None
+
+    @property
+    def tem_anterior(self):
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def como_dict(self):
+        """Formato JSON comum a todas as APIs paginadas"""
+        return {
+            'per_page': self.por_pagina,
+            'next_cursor': self.proximo_cursor,
+            'prev_cursor': self.cursor_anterior,
+            'has_next': self.tem_proxima,
+            'has_prev': self.tem_anterior,
+            'total': self.total,
+            'total_is_estimate': self.total_aproximado,
+        }
+
+
+def _separar_ordem(expressao):
+    """(coluna, descendente) a partir de `Modelo.coluna.desc()` / `.asc()` / coluna"""
+    modificador = getattr(expressao, 'modifier', None)
+    if modificador is operators.desc_op:
+        return expressao.element, True
+    if modificador is operators.asc_op:
+        return expressao.element, False
+    return expressao, False
+
+
+def _assinatura(partes):
+    return ','.join(f"{coluna}{' desc' if descendente else ''}" for coluna, descendente in partes)
+
+
+def _codificar_valor(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'d': valor.isoformat()}
+    return valor
+
+
+def _decodificar_valor(valor):
+    if isinstance(valor, dict):
+        if 'dt' in valor:
+            return datetime.fromisoformat(valor['dt'])
+        if 'd' in valor:
+            return date.fromisoformat(valor['d'])
+    return valor
+
+
+def codificar_cursor(assinatura, valores, para_tras=False):
+    """Cursor opaco com os valores da ordenação de um item"""
+    dados = {'o': assinatura, 'v': [_codificar_valor(valor) for valor in valores]}
+    if para_tras:
+        dados['a'] = 1
+    bruto = json.dumps(dados, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, assinatura):
+    """(valores, para_tras) de um cursor; CursorInvalido se não pertencer à listagem"""
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        dados = json.loads(bruto)
+        valores = [_decodificar_valor(valor) for valor in dados['v']]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise CursorInvalido('Cursor de paginação inválido')
+
+    if dados.get('o') != assinatura or len(valores) != len(assinatura.split(',')):
+        raise CursorInvalido('Cursor de paginação não pertence a esta listagem')
+    return valores, bool(dados.get('a'))
+
+
+def _formas_sqlite(valor):
+    """
+    No SQLite as datas são texto: linhas antigas guardam 'AAAA-MM-DD HH:MM:SS' e
+    o SQLAlchemy grava/compara com '.ffffff'. Para segundos exatos as duas formas
+    representam o mesmo instante, então a comparação tem de aceitar ambas.
+    """
+    if engine.dialect.name != 'sqlite' or not isinstance(valor, datetime) or valor.microsecond:
+        return None
+    curta = valor.strftime('%Y-%m-%d %H:%M:%S')
+    return literal(curta, String), literal(curta + '.000000', String)
+
+
+def _igual(coluna, valor):
+    formas = _formas_sqlite(valor)
+    if formas:
+        return coluna.in_(formas)
+    return coluna == valor
+
+
+def _menor(coluna, valor, inclusivo=False):
+    formas = _formas_sqlite(valor)
+    if formas:
+        return coluna <= formas[1] if inclusivo else coluna < formas[0]
+    return coluna <= valor if inclusivo else coluna < valor
+
+
+def _maior(coluna, valor, inclusivo=False):
+    formas = _formas_sqlite(valor)
+    if formas:
+        return coluna >= formas[0] if inclusivo else coluna > formas[1]
+    return coluna >= valor if inclusivo else coluna > valor
+
+
+def _filtro_keyset(partes, valores, para_tras):
+    """Itens depois (ou antes) dos valores do cursor, na ordem pedida"""
+    condicoes = []
+    for posicao, (coluna, descendente) in enumerate(partes):
+        iguais = [_igual(coluna_anterior, valor)
+                  for (coluna_anterior, _), valor in zip(partes[:posicao], valores[:posicao])]
+        comparar = _menor if descendente != para_tras else _maior
+        condicoes.append(and_(*iguais, comparar(coluna, valores[posicao])))
+
+    # Limite na primeira coluna para o banco fazer uma leitura de intervalo no índice
+    primeira, descendente = partes[0]
+    comparar = _menor if descendente != para_tras else _maior
+    return and_(comparar(primeira, valores[0], inclusivo=True), or_(*condicoes))
+
+
+def _valores_item(item, partes):
+    return [getattr(item, coluna.key) for coluna, _ in partes]
+
+
+def contar(query, modo):
+    """Total da consulta: 'exato', 'aproximado' (COUNT em cache) ou None"""
+    if not modo:
+        return None
+
+    query = query.order_by(None)
+    if modo != 'aproximado':
+        return query.count()
+
+    compilado = query.statement.compile()
+    chave = (str(compilado), repr(sorted(compilado.params.items())))
+    agora = time.monotonic()
+
+    with _lock:
+        em_cache = _cache_totais.get(chave)
+    if em_cache and em_cache[0] > agora:
+        return em_cache[1]
+
+    total = query.count()
+    with _lock:
+        if len(_cache_totais) >= config.PAGINACAO_CACHE_TOTAIS_MAX:
+            _cache_totais.clear()
+        _cache_totais[chave] = (agora + config.PAGINACAO_TOTAL_TTL, total)
+    return total
+
+
+def paginar(query, ordem, cursor=None, por_pagina=20, total=None, estrito=True):
+    """
+    Página de `query` ordenada por `ordem` a partir de `cursor`.
+
+    ordem: lista de colunas, ex.: [Notificacao.data_criacao.desc(), Notificacao.id.desc()]
+    total: None, 'exato' ou 'aproximado'
+    estrito: se False, um cursor inválido recomeça da primeira página
+    """
+    partes = [_separar_ordem(expressao) for expressao in ordem]
+    assinatura = _assinatura(partes)
+
+    valores, para_tras = None, False
+    if cursor:
+        try:
+            valores, para_tras = decodificar_cursor(cursor, assinatura)
+        except CursorInvalido:
+            if estrito:
+                raise
+
+    consulta = query.order_by(None)
+    if valores is not None:
+        consulta = consulta.filter(_filtro_keyset(partes, valores, para_tras))
+
+    # Para voltar atrás lê-se na ordem inversa e inverte-se o resultado
+    ordenacao = [coluna.desc() if descendente != para_tras else coluna.asc() for coluna, descendente in partes]
+    itens = consulta.order_by(*ordenacao).limit(por_pagina + 1).all()
+
+    ha_mais = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    if para_tras:
+        itens.reverse()
+
+    tem_proxima = ha_mais if not para_tras else True
+    tem_anterior = valores is not None if not para_tras else ha_mais
+
+    proximo_cursor = cursor_anterior = None
+    if itens and tem_proxima:
+        proximo_cursor = codificar_cursor(assinatura, _valores_item(itens[-1], partes))
+    if itens and tem_anterior:
+        cursor_anterior = codificar_cursor(assinatura, _valores_item(itens[0], partes), para_tras=True)
+
+    return Pagina(itens, por_pagina,
+                  proximo_cursor=proximo_cursor,
+                  cursor_anterior=cursor_anterior,
+                  total=contar(query, total),
+                  total_aproximado=total == 'aproximado')
+
+
+def cursor_depois(ordem, item):
+    """Cursor que continua a listagem ordenada por `ordem` depois de `item`"""
+    partes = [_separar_ordem(expressao) for expressao in ordem]
+    return codificar_cursor(_assinatura(partes), _valores_item(item, partes))
+
+
+# Cursores de páginas do arquivo; '.' não existe no base64 dos cursores normais
+PREFIXO_ARQUIVO = 'a.'
+
+
+def paginar_com_arquivo(query, query_arquivo, ordem, ordem_arquivo, cursor=None, por_pagina=20,
+                        total=None, estrito=True):
+    """
+    Como paginar(), mas quando a tabela quente (`query`) acaba continua na
+    tabela de arquivo (`query_arquivo`, mesmas colunas, linhas mais antigas).
+
+    Só a última página quente e as seguintes leem o arquivo. Os itens das duas
+    tabelas têm os mesmos atributos, então os templates não mudam.
+    """
+    total_geral = None
+    if total:
+        total_geral = contar(query, total) + contar(query_arquivo, total)
+
+    if cursor and cursor.startswith(PREFIXO_ARQUIVO):
+        cursor_arquivo = cursor[len(PREFIXO_ARQUIVO):] or None
+        pagina = paginar(query_arquivo, ordem_arquivo, cursor_arquivo, por_pagina, estrito=estrito)
+        itens = pagina.itens
+        anterior = PREFIXO_ARQUIVO + pagina.cursor_anterior if pagina.cursor_anterior else None
+
+        if not anterior:
+            # Chegou ao início do arquivo: o que está antes é o fim da tabela quente
+            partes = [_separar_ordem(expressao) for expressao in ordem]
+            partes_arquivo = [_separar_ordem(expressao) for expressao in ordem_arquivo]
+            valores, para_tras = None, False
+            if cursor_arquivo:
+                try:
+                    valores, para_tras = decodificar_cursor(cursor_arquivo, _assinatura(partes_arquivo))
+                except CursorInvalido:
+                    pass
+            if itens:
+                valores = _valores_item(itens[0], partes_arquivo)
+            if valores is not None:
+                limite_quente = codificar_cursor(_assinatura(partes), valores, para_tras=True)
+                if para_tras and len(itens) < por_pagina:
+                    # Voltando de uma página só do arquivo para uma que juntava as duas tabelas
+                    cauda = paginar(query, ordem, limite_quente, por_pagina - len(itens))
+                    itens = cauda.itens + itens
+                    anterior = cauda.cursor_anterior
+                else:
+                    anterior = limite_quente
+
+        return Pagina(itens, por_pagina,
+                      proximo_cursor=PREFIXO_ARQUIVO + pagina.proximo_cursor if pagina.proximo_cursor else None,
+                      cursor_anterior=anterior,
+                      total=total_geral,
+                      total_aproximado=total == 'aproximado')
+
+    pagina = paginar(query, ordem, cursor, por_pagina, estrito=estrito)
+    itens, proximo = pagina.itens, pagina.proximo_cursor
+    if not pagina.tem_proxima:
+        falta = por_pagina - len(itens)
+        if falta:
+            arquivo = paginar(query_arquivo, ordem_arquivo, None, falta)
+            itens = itens + arquivo.itens
+            if arquivo.proximo_cursor:
+                proximo = PREFIXO_ARQUIVO + arquivo.proximo_cursor
+        elif query_arquivo.order_by(None).first() is not None:
+            proximo = PREFIXO_ARQUIVO
+
+    return Pagina(itens, por_pagina,
+                  proximo_cursor=proximo,
+                  cursor_anterior=pagina.cursor_anterior,
+                  total=total_geral,
+                  total_aproximado=total == 'aproximado')
+
+
+def paginar_lista(ids, carregar, cursor=None, por_pagina=20, estrito=True, assinatura='lista',
+                  total=None, total_aproximado=False):
+    """
+    Página de uma lista de ids já ordenada (ex.: resultados por relevância).
+
+    O cursor guarda a posição na lista e `carregar(ids)` devolve os itens da
+    página na mesma ordem, numa consulta; o total é o tamanho da lista, ou
+    `total` se ela foi cortada (ex.: em BUSCA_LIMITE).
+    """
+    inicio = 0
+    if cursor:
+        try:
+            valores, para_tras = decodificar_cursor(cursor, assinatura)
+            posicao = int(valores[0])
+        except (CursorInvalido, TypeError, ValueError):
+            if estrito:
+                raise CursorInvalido('Cursor de paginação inválido')
+        else:
+            inicio = posicao - por_pagina if para_tras else posicao
+
+    inicio = min(max(inicio, 0), len(ids))
+    fim = min(inicio + por_pagina, len(ids))
+    return Pagina(carregar(ids[inicio:fim]) if fim > inicio else [], por_pagina,
+                  proximo_cursor=codificar_cursor(assinatura, [fim]) if fim < len(ids) else None,
+                  cursor_anterior=codificar_cursor(assinatura, [inicio], para_tras=True) if inicio else None,
+                  total=len(ids) if total is None else total,
+                  total_aproximado=total_aproximado)
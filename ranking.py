@@ -0,0 +1,195 @@
+# ranking.py
+"""
+Pontuação de qualidade dos prestadores, gravada em prestadores_servico.pontuacao.
+
+A busca ordena por esta coluna (índices (disponivel, pontuacao, id) e
+(categoria, disponivel, pontuacao, id)) em vez de agregar avaliações e
+agendamentos a cada pedido. A pontuação vai de 0 a 1 e soma, com os pesos de
+config.RANKING_PESOS:
+
+  - nota: média bayesiana das avaliações, puxada para RANKING_NOTA_PRIORI com o
+    peso de RANKING_AVALIACOES_PRIORI avaliações (poucas avaliações 5 estrelas
+    não passam à frente de muitas 4,8);
+  - realizados: agendamentos realizados, em escala logarítmica até
+    RANKING_REALIZADOS_REFERENCIA;
+  - verificado: documentos verificados pela plataforma;
+  - resposta: parte dos pedidos com mais de RANKING_PRAZO_RESPOSTA_H horas que
+    saíram de 'pendente' (suavizada como a nota);
+  - recencia: decai com os dias desde a última atividade num agendamento.
+
+Avaliações, agendamentos (prestador/status) e `verificado` recalculam a
+pontuação dos prestadores afetados na mesma transação (evento after_flush).
+Recência e resposta mudam só com o tempo: o recálculo completo corre por cron,
+uma vez por dia, e depois de cargas fora do ORM:
+
+    python ranking.py             # recalcula todos
+    python ranking.py <id>        # mostra as componentes de um prestador
+"""
+import math
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, case, event, func, select, update
+from sqlalchemy.orm import Session
+
+from alteracoes import prestadores_alterados
+from config import config
+from database import engine
+from models import Agendamento, Avaliacao, PrestadorServico, ResumoAvaliacoes
+
+# Campos que mudam a pontuação
+CAMPOS = {
+    Agendamento: ('prestador_id', 'status'),
+    Avaliacao: ('prestador_id', 'rating'),
+    PrestadorServico: ('verificado',),
+}
+
+# Ordenação por qualidade (índices ix_prestadores_servico_ranking / _categoria_ranking)
+ORDEM = (PrestadorServico.pontuacao.desc(), PrestadorServico.id.desc())
+
+
+def _linhas(conn, condicao, agora):
+    """Dados de cada prestador que satisfaz `condicao(coluna de id)` para a pontuação"""
+    prestadores, resumos, agendamentos = (PrestadorServico.__table__, ResumoAvaliacoes.__table__,
+                                          Agendamento.__table__)
+    prazo = agora - timedelta(hours=config.RANKING_PRAZO_RESPOSTA_H)
+    antigo = agendamentos.c.criado_em < prazo
+    atividade = (select(agendamentos.c.prestador_id,
+                        func.sum(case((agendamentos.c.status == 'realizado', 1), else_=0)).label('realizados'),
+                        func.sum(case((antigo, 1), else_=0)).label('pedidos'),
+                        func.sum(case((and_(antigo, agendamentos.c.status != 'pendente'), 1),
+                                      else_=0)).label('respondidos'),
+                        func.max(agendamentos.c.atualizado_em).label('ultima_atividade'))
+                 .where(condicao(agendamentos.c.prestador_id))
+                 .group_by(agendamentos.c.prestador_id)
+                 .subquery())
+    consulta = (select(prestadores.c.id, prestadores.c.verificado, prestadores.c.pontuacao,
+                       resumos.c.total, resumos.c.soma, atividade.c.realizados, atividade.c.pedidos,
+                       atividade.c.respondidos, atividade.c.ultima_atividade)
+                .select_from(prestadores
+                             .outerjoin(resumos, resumos.c.prestador_id == prestadores.c.id)
+                             .outerjoin(atividade, atividade.c.prestador_id == prestadores.c.id))
+                .where(condicao(prestadores.c.id)))
+    return conn.execute(consulta).all()
+
+
+def componentes(linha, agora):
+    """Componentes da pontuação (cada uma de 0 a 1) a partir de uma linha de _linhas"""
+    total, soma = linha.total or 0, linha.soma or 0
+    peso_priori = config.RANKING_AVALIACOES_PRIORI
+    nota = (peso_priori * config.RANKING_NOTA_PRIORI + soma) / (peso_priori + total)
+
+    peso_resposta = config.RANKING_PEDIDOS_PRIORI
+    resposta = ((linha.respondidos or 0) + peso_resposta * config.RANKING_RESPOSTA_PRIORI) / \
+        ((linha.pedidos or 0) + peso_resposta)
+
+    recencia = 0.0
+    if linha.ultima_atividade is not None:
+        dias = max((agora - linha.ultima_atividade).total_seconds(), 0) / 86400
+        recencia = math.exp(-dias / config.RANKING_RECENCIA_DIAS)
+
+    return {
+        'nota': (nota - 1) / 4,
+        'realizados': min(math.log1p(linha.realizados or 0) / math.log1p(config.RANKING_REALIZADOS_REFERENCIA), 1.0),
+        'verificado': 1.0 if linha.verificado else 0.0,
+        'resposta': resposta,
+        'recencia': recencia,
+    }
+
+
+def pontuacao(linha, agora):
+    """Soma ponderada das componentes, arredondada (só muda a coluna se a diferença importar)"""
+    valores = componentes(linha, agora)
+    return round(sum(peso * valores[nome] for nome, peso in config.RANKING_PESOS.items()), 6)
+
+
+def _gravar(conn, condicao, agora=None):
+    """Recalcula os prestadores de `condicao` e grava os que mudaram; devolve quantos"""
+    tabela = PrestadorServico.__table__
+    agora = agora or datetime.utcnow()
+    linhas = []
+    for linha in _linhas(conn, condicao, agora):
+        valor = pontuacao(linha, agora)
+        if valor != linha.pontuacao:
+            linhas.append({'b_id': linha.id, 'b_pontuacao': valor})
+    if linhas:
+        conn.execute(update(tabela).where(tabela.c.id == bindparam('b_id'))
+                     .values(pontuacao=bindparam('b_pontuacao')), linhas)
+    return len(linhas)
+
+
+def atualizar(conn, ids):
+    """Recalcula a pontuação dos prestadores `ids`"""
+    ids = sorted(set(ids))
+    total = 0
+    for inicio in range(0, len(ids), config.BUSCA_LOTE):
+        parte = ids[inicio:inicio + config.BUSCA_LOTE]
+        total += _gravar(conn, lambda coluna: coluna.in_(parte))
+    return total
+
+
+def recalcular(bind=engine, lote=None, ao_avancar=None):
+    """Recalcula todos os prestadores por faixas de id, uma transação por faixa; devolve quantos mudaram"""
+    tabela = PrestadorServico.__table__
+    lote = lote or config.MIGRACAO_LOTE
+    agora = datetime.utcnow()
+    with bind.connect() as conn:
+        maximo = conn.execute(select(func.max(tabela.c.id))).scalar() or 0
+    atual = total = 0
+    while atual < maximo:
+        fim = min(atual + lote, maximo)
+        with bind.begin() as conn:
+            total += _gravar(conn, lambda coluna: and_(coluna > atual, coluna <= fim), agora)
+        atual = fim
+        if ao_avancar:
+            ao_avancar()
+    return total
+
+
+# ==================== EVENTOS ====================
+
+@event.listens_for(Session, 'after_flush')
+def _atualizar_pontuacao(session, flush_context):
+    """Mantém prestadores_servico.pontuacao na mesma transação (depois de avaliacoes_resumo)"""
+    prestadores = prestadores_alterados(session, CAMPOS)
+    if not prestadores:
+        return
+
+    atualizar(session.connection(), prestadores)
+
+    # Objetos já carregados na sessão ficariam com a pontuação antiga
+    for prestador_id in prestadores:
+        prestador = session.identity_map.get(session.identity_key(PrestadorServico, prestador_id))
+        if prestador is not None:
+            session.expire(prestador, ['pontuacao'])
+
+
+if __name__ == "__main__":
+    try:
+        if len(sys.argv) == 1:
+            inicio = time.perf_counter()
+            total = recalcular()
+            print(f"✅ {total} pontuação(ões) alterada(s) em {time.perf_counter() - inicio:.1f}s")
+            sys.exit(0)
+
+        if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+            print('Uso: python ranking.py | python ranking.py <id do prestador>')
+            sys.exit(1)
+
+        prestador_id = int(sys.argv[1])
+        agora = datetime.utcnow()
+        with engine.connect() as conn:
+            linhas = _linhas(conn, lambda coluna: coluna == prestador_id, agora)
+        if not linhas:
+            print(f"❌ Prestador {prestador_id} não encontrado")
+            sys.exit(1)
+
+        linha = linhas[0]
+        print(f"🏆 Prestador {prestador_id}: gravada {linha.pontuacao:.4f}, atual {pontuacao(linha, agora):.4f}")
+        for nome, valor in componentes(linha, agora).items():
+            print(f"   {nome:<11} {valor:.3f} × {config.RANKING_PESOS[nome]:.2f}")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+        sys.exit(1)
@@ -0,0 +1,109 @@
+# recalcular_avaliacoes.py
+"""
+Reconstrói a tabela avaliacoes_resumo a partir das avaliações.
+
+O agregado é mantido a cada avaliação gravada pela aplicação (evento
+after_flush em models.py). Este script corrige desvios causados por
+alterações feitas fora do ORM (SQL manual, restauração de backup, etc.)
+e popula o agregado num banco que ainda não o tinha.
+
+Uso:
+    python recalcular_avaliacoes.py              # corrige os desvios
+    python recalcular_avaliacoes.py --verificar  # só mostra os desvios
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import select, func, case, delete
+
+from database import engine
+from models import Avaliacao, ResumoAvaliacoes
+
+COLUNAS = ['total', 'soma', 'estrelas_1', 'estrelas_2', 'estrelas_3', 'estrelas_4', 'estrelas_5']
+
+# Desvios detalhados no relatório (o resto só entra na contagem)
+DESVIOS_LISTADOS = 20
+
+
+def agregados_reais(conn):
+    """Agregado de cada prestador calculado numa única consulta GROUP BY"""
+    valida = Avaliacao.rating.between(1, 5)
+    consulta = select(
+        Avaliacao.prestador_id,
+        func.count(Avaliacao.id).label('total'),
+        func.sum(Avaliacao.rating).label('soma'),
+        *[func.sum(case((Avaliacao.rating == estrelas, 1), else_=0)).label(f'estrelas_{estrelas}')
+          for estrelas in range(1, 6)]
+    ).where(Avaliacao.prestador_id.isnot(None), valida).group_by(Avaliacao.prestador_id)
+
+    return {linha.prestador_id: {coluna: int(linha[coluna] or 0) for coluna in COLUNAS}
+            for linha in conn.execute(consulta).mappings()}
+
+
+def agregados_gravados(conn):
+    """Conteúdo atual de avaliacoes_resumo"""
+    tabela = ResumoAvaliacoes.__table__
+    return {linha.prestador_id: {coluna: linha[coluna] for coluna in COLUNAS}
+            for linha in conn.execute(select(tabela)).mappings()}
+
+
+def encontrar_desvios(reais, gravados):
+    """Prestadores cujo agregado gravado difere do real"""
+    desvios = {}
+    for prestador_id in set(reais) | set(gravados):
+        real = reais.get(prestador_id)
+        gravado = gravados.get(prestador_id)
+        if real != gravado:
+            desvios[prestador_id] = (gravado, real)
+    return desvios
+
+
+def corrigir(conn, desvios):
+    """Regrava os agregados divergentes"""
+    tabela = ResumoAvaliacoes.__table__
+    agora = datetime.utcnow()
+
+    for prestador_id, (gravado, real) in desvios.items():
+        if real is None:
+            conn.execute(delete(tabela).where(tabela.c.prestador_id == prestador_id))
+        elif gravado is None:
+            conn.execute(tabela.insert().values(prestador_id=prestador_id, atualizado_em=agora, **real))
+        else:
+            conn.execute(tabela.update().where(tabela.c.prestador_id == prestador_id)
+                         .values(atualizado_em=agora, **real))
+
+
+def recalcular(apenas_verificar=False):
+    """Compara e, se pedido, corrige os agregados numa única transação"""
+    ResumoAvaliacoes.__table__.create(bind=engine, checkfirst=True)
+
+    with engine.begin() as conn:
+        reais = agregados_reais(conn)
+        desvios = encontrar_desvios(reais, agregados_gravados(conn))
+
+        print(f"📊 {len(reais)} prestador(es) com avaliações")
+        for prestador_id, (gravado, real) in sorted(desvios.items())[:DESVIOS_LISTADOS]:
+            print(f"   ⚠️  prestador {prestador_id}: gravado={gravado} real={real}")
+        if len(desvios) > DESVIOS_LISTADOS:
+            print(f"   ... e mais {len(desvios) - DESVIOS_LISTADOS} prestador(es) com desvio")
+
+        if desvios and not apenas_verificar:
+            corrigir(conn, desvios)
+            print(f"✅ {len(desvios)} agregado(s) corrigido(s)")
+
+    return desvios
+
+
+if __name__ == "__main__":
+    try:
+        verificar = '--verificar' in sys.argv
+        desvios = recalcular(apenas_verificar=verificar)
+
+        if not desvios:
+            print("🎉 Agregados de avaliações consistentes!")
+        elif verificar:
+            sys.exit(1)
+
+    except Exception as e:
+        print(f"❌ Erro ao recalcular avaliações: {e}")
+        sys.exit(1)
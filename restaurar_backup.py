@@ -1,42 +1,338 @@
-import sqlite3
+# restaurar_backup.py
+"""
+Restauração de um backup feito pelo fazer_dump.py (binário ou SQL, com ou sem gzip).
+
+Nada é apagado antes de a restauração dar certo:
+
+  1. o backup é lido em streaming para um arquivo temporário ao lado do banco
+     (binário: descomprimido bloco a bloco; SQL: comando a comando, numa única
+     transação, com PRAGMAs de carga em massa e os índices criados no fim; as
+     tabelas derivadas, que o dump SQL não traz, são refeitas depois);
+  2. o SHA-256 do que foi lido é comparado com o do manifesto;
+  3. o banco novo passa pelo integrity_check (ou quick_check com --rapido);
+  4. só então substitui o banco atual com os.replace (atómico). O banco
+     anterior fica em <banco>.anterior (hard link, sem cópia).
+
+A memória usada não depende do tamanho do dump.
+
+Uso:
+    python restaurar_backup.py                                  # servicos_app.sql -> servicos_app.db
+    python restaurar_backup.py backups/servicos_app-20250101-030000.db.gz
+    python restaurar_backup.py dump.sql.gz outro.db --rapido
+"""
+import argparse
+import gzip
+import hashlib
+import io
 import os
+import re
+import sqlite3
 import sys
+import time
+import zlib
 
+from fazer_dump import BLOCO, ler_manifesto, tabela_derivada
 
-def restaurar_dump(arquivo_dump, banco_saida='servicos_app.db'):
-    """Restaura um dump SQLite para um novo banco"""
+CABECALHO_SQLITE = b'SQLite format 3\x00'
+CABECALHO_GZIP = b'\x1f\x8b'
 
-    # Remover banco existente se existir
-    if os.path.exists(banco_saida):
-        os.remove(banco_saida)
-        print(f"🗑️  Banco antigo removido: {banco_saida}")
+# PRAGMAs do banco temporário durante a carga: nada é visível a ninguém até à
+# troca final, então diário e fsync não servem para nada
+PRAGMAS_CARGA = {
+    'journal_mode': 'OFF',
+    'synchronous': 'OFF',
+    'locking_mode': 'EXCLUSIVE',
+    'temp_store': 'MEMORY',
+    'cache_size': -512000,  # 512 MB
+    'foreign_keys': 'OFF',
+}
+
+# Criados depois dos dados: construir um índice de uma vez é muito mais rápido
+# do que mantê-lo a cada INSERT
+_RE_ADIADO = re.compile(r'^\s*CREATE\s+(UNIQUE\s+)?(INDEX|TRIGGER)\b', re.IGNORECASE)
+_RE_TRANSACAO = re.compile(r'^\s*(BEGIN(\s+TRANSACTION)?|COMMIT)\s*;\s*$', re.IGNORECASE)
+
+INTERVALO_PROGRESSO = 5.0
+
+
+class RestauracaoInvalida(RuntimeError):
+    """O backup não passou nas verificações; o banco atual não foi tocado"""
+
+
+class EntradaComHash(io.RawIOBase):
+    """Arquivo de entrada que calcula o SHA-256 e conta os bytes lidos"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.hash = hashlib.sha256()
+        self.lidos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        dados = self.arquivo.read(len(destino))
+        destino[:len(dados)] = dados
+        self.hash.update(dados)
+        self.lidos += len(dados)
+        return len(dados)
+
+
+def detectar_formato(arquivo_backup, manifesto):
+    """('backup' | 'sql', comprimido)"""
+    with open(arquivo_backup, 'rb') as arquivo:
+        inicio = arquivo.read(len(CABECALHO_SQLITE))
 
+    comprimido = inicio.startswith(CABECALHO_GZIP)
+    if manifesto:
+        return manifesto['formato'], comprimido
+    if comprimido:
+        with gzip.open(arquivo_backup, 'rb') as arquivo:
+            inicio = arquivo.read(len(CABECALHO_SQLITE))
+    return ('backup' if inicio == CABECALHO_SQLITE else 'sql'), comprimido
+
+
+def _abrir_dados(entrada, comprimido):
+    """Leitor binário do conteúdo (descomprimido se preciso)"""
+    buffer = io.BufferedReader(entrada, buffer_size=BLOCO)
+    return gzip.GzipFile(fileobj=buffer, mode='rb') if comprimido else buffer
+
+
+def copiar_binario(dados, temporario):
+    """Descomprime/copia o backup binário para o arquivo temporário"""
+    with open(temporario, 'wb') as destino:
+        for bloco in iter(lambda: dados.read(BLOCO), b''):
+            destino.write(bloco)
+
+    # Confirma que o conteúdo é mesmo um banco SQLite antes de seguir
+    with open(temporario, 'rb') as arquivo:
+        if arquivo.read(len(CABECALHO_SQLITE)) != CABECALHO_SQLITE:
+            raise RestauracaoInvalida('O conteúdo não é um banco SQLite')
+
+
+def comandos_sql(texto):
+    """Gera os comandos completos de um dump, linha a linha"""
+    pendente = []
+    for linha in texto:
+        pendente.append(linha)
+        if not linha.rstrip().endswith(';'):
+            continue
+        comando = ''.join(pendente)
+        if sqlite3.complete_statement(comando):
+            pendente = []
+            comando = comando.strip()
+            # Dumps antigos terminam cada comando com ';;'
+            while comando.endswith(';;'):
+                comando = comando[:-1]
+            if comando and comando != ';':
+                yield comando
+
+    if ''.join(pendente).strip():
+        raise RestauracaoInvalida('Dump truncado: o último comando está incompleto')
+
+
+def carregar_sql(dados, temporario, entrada):
+    """
+    Executa o dump no banco temporário numa única transação; índices no fim.
+    Devolve as tabelas derivadas criadas vazias, a preencher com recriar_derivadas().
+    """
+    conn = sqlite3.connect(temporario, isolation_level=None)
     try:
-        # Criar novo banco
-        conn = sqlite3.connect(banco_saida)
-        cursor = conn.cursor()
+        for nome, valor in PRAGMAS_CARGA.items():
+            conn.execute(f'PRAGMA {nome} = {valor}')
+
+        texto = io.TextIOWrapper(dados, encoding='utf-8', newline='')
+        adiados = []
+        derivadas = []
+        executados = 0
+        ultimo_aviso = time.monotonic()
 
-        # Ler e executar o dump
-        with open(arquivo_dump, 'r', encoding='utf-8') as f:
-            sql_script = f.read()
+        conn.execute('BEGIN')
+        for comando in comandos_sql(texto):
+            if _RE_TRANSACAO.match(comando):
+                continue
+            if _RE_ADIADO.match(comando):
+                adiados.append(comando)
+                continue
+            # Dumps anteriores trazem a tabela virtual em sqlite_master e as tabelas
+            # sombra com dados: vale só o CREATE, o conteúdo é refeito
+            derivada, ddl = tabela_derivada(comando)
+            if derivada is not None:
+                if ddl:
+                    conn.execute(ddl)
+                    derivadas.append(derivada)
+                continue
+            conn.execute(comando)
+            executados += 1
 
-        # Executar todo o script SQL
-        cursor.executescript(sql_script)
+            if time.monotonic() - ultimo_aviso >= INTERVALO_PROGRESSO:
+                print(f"   ⏳ {executados:,} comandos, {entrada.lidos / 1e6:,.0f} MB lidos")
+                ultimo_aviso = time.monotonic()
 
-        conn.commit()
+        print(f"   📇 criando {len(adiados)} índice(s)/trigger(s)...")
+        for comando in adiados:
+            conn.execute(comando)
+        conn.execute('COMMIT')
+        conn.execute('PRAGMA journal_mode = DELETE')
+        return derivadas
+    finally:
         conn.close()
 
-        print(f"✅ Backup restaurado com sucesso: {banco_saida}")
-        print(f"📊 Tamanho do novo banco: {os.path.getsize(banco_saida)} bytes")
 
-    except Exception as e:
-        print(f"❌ Erro ao restaurar: {e}")
-        # Se der erro, remove o banco incompleto
-        if os.path.exists(banco_saida):
-            os.remove(banco_saida)
+def recriar_derivadas(temporario, derivadas):
+    """Preenche as tabelas derivadas do banco restaurado a partir das tabelas da aplicação"""
+    if 'busca_prestadores' not in derivadas:
+        return
+    # Só aqui: a restauração binária não depende dos modelos da aplicação
+    from sqlalchemy import create_engine
+    import busca
+
+    engine_restaurado = create_engine(f'sqlite:///{temporario}')
+    try:
+        inicio = time.perf_counter()
+        total = busca.reindexar(engine_restaurado)
+        print(f"   🔍 {total} prestador(es) reindexado(s) em {busca.TABELA} "
+              f"em {time.perf_counter() - inicio:.1f}s")
+    finally:
+        engine_restaurado.dispose()
+
+
+def verificar_banco(caminho, rapido=False, manifesto=None):
+    """integrity_check/quick_check e versão do schema; levanta RestauracaoInvalida"""
+    conn = sqlite3.connect(caminho)
+    try:
+        verificacao = 'quick_check' if rapido else 'integrity_check'
+        problemas = [linha[0] for linha in conn.execute(f'PRAGMA {verificacao}').fetchall()]
+        if problemas != ['ok']:
+            raise RestauracaoInvalida(f'{verificacao} falhou: {problemas[:5]}')
+
+        esperada = (manifesto or {}).get('versao_schema')
+        if esperada is not None:
+            versao = conn.execute('SELECT MAX(versao) FROM versao_schema').fetchone()[0]
+            if versao != esperada:
+                raise RestauracaoInvalida(f'Versão do schema {versao}, o manifesto indica {esperada}')
+
+        tabelas = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+        conn.execute('ANALYZE')
+        return tabelas
+    finally:
+        conn.close()
+
+
+def _preparar_destino(banco_saida):
+    """Esvazia o WAL do banco atual; se não der, há alguém a usá-lo"""
+    if not os.path.exists(banco_saida):
+        return
+    conn = sqlite3.connect(banco_saida)
+    try:
+        ocupado = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()[0]
+    finally:
+        conn.close()
+    wal = banco_saida + '-wal'
+    if ocupado or (os.path.exists(wal) and os.path.getsize(wal)):
+        raise RestauracaoInvalida(f'{banco_saida} está em uso; pare a aplicação antes de restaurar')
+
+
+def trocar_banco(temporario, banco_saida):
+    """Coloca o banco restaurado no lugar do atual, guardando o anterior"""
+    _preparar_destino(banco_saida)
+
+    if os.path.exists(banco_saida):
+        anterior = banco_saida + '.anterior'
+        if os.path.exists(anterior):
+            os.remove(anterior)
+        try:
+            os.link(banco_saida, anterior)
+        except OSError:
+            print("⚠️  Sem hard link neste sistema de arquivos; o banco anterior não será guardado")
+
+    os.replace(temporario, banco_saida)
+    # -wal/-shm (vazios) do banco antigo não podem ser associados ao novo
+    for sufixo in ('-wal', '-shm'):
+        if os.path.exists(banco_saida + sufixo):
+            os.remove(banco_saida + sufixo)
+
+
+def caminho_temporario(banco_saida):
+    """Arquivo onde a restauração é montada, ao lado do banco (mesmo sistema de arquivos)"""
+    return os.path.join(os.path.dirname(os.path.abspath(banco_saida)),
+                        f'.{os.path.basename(banco_saida)}.restaurando')
+
+
+def limpar_temporario(temporario, sufixos=('', '-journal', '-wal', '-shm')):
+    for sufixo in sufixos:
+        if os.path.exists(temporario + sufixo):
+            os.remove(temporario + sufixo)
+
+
+def extrair_backup(arquivo_dump, temporario, verificar_hash=True):
+    """Lê o backup (com o hash conferido) para `temporario`; devolve o manifesto e as tabelas derivadas a refazer"""
+    manifesto = ler_manifesto(arquivo_dump)
+    formato, comprimido = detectar_formato(arquivo_dump, manifesto)
+
+    print(f"🔄 Restaurando {arquivo_dump} ({formato}{', gzip' if comprimido else ''})")
+    if not manifesto:
+        print("⚠️  Sem manifesto: o checksum não será verificado")
+
+    derivadas = []
+    with open(arquivo_dump, 'rb') as arquivo:
+        entrada = EntradaComHash(arquivo)
+        dados = _abrir_dados(entrada, comprimido)
+        try:
+            if formato == 'backup':
+                copiar_binario(dados, temporario)
+            else:
+                derivadas = carregar_sql(dados, temporario, entrada)
+        except (gzip.BadGzipFile, EOFError, zlib.error, UnicodeDecodeError) as e:
+            raise RestauracaoInvalida(f'Backup corrompido ou truncado: {e}')
+        # Lê o resto (rodapé do gzip) para o hash cobrir o arquivo inteiro
+        for _ in iter(lambda: entrada.read(BLOCO), b''):
+            pass
+
+    if manifesto and verificar_hash and entrada.hash.hexdigest() != manifesto['sha256']:
+        raise RestauracaoInvalida('SHA-256 do backup não confere com o manifesto')
+    return manifesto, derivadas
+
+
+def restaurar_dump(arquivo_dump, banco_saida='servicos_app.db', verificar_hash=True, rapido=False):
+    """Restaura `arquivo_dump` em `banco_saida`; o banco atual só é trocado no fim"""
+    if not os.path.exists(arquivo_dump):
+        raise FileNotFoundError(f'Backup não encontrado: {arquivo_dump}')
+
+    temporario = caminho_temporario(banco_saida)
+    inicio = time.perf_counter()
+    limpar_temporario(temporario)
+
+    try:
+        manifesto, derivadas = extrair_backup(arquivo_dump, temporario, verificar_hash)
+        recriar_derivadas(temporario, derivadas)
+        tabelas = verificar_banco(temporario, rapido, manifesto)
+        trocar_banco(temporario, banco_saida)
+
+    except BaseException:
+        limpar_temporario(temporario, ('', '-journal'))
+        raise
+
+    print(f"✅ Backup restaurado com sucesso: {banco_saida} ({tabelas} tabelas) "
+          f"em {time.perf_counter() - inicio:.1f}s")
+    print(f"📊 Tamanho do novo banco: {os.path.getsize(banco_saida):,} bytes")
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Restaura um backup do fazer_dump.py')
+    parser.add_argument('arquivo', nargs='?', default='servicos_app.sql')
+    parser.add_argument('banco', nargs='?', default='servicos_app.db')
+    parser.add_argument('--sem-verificar-hash', action='store_true')
+    parser.add_argument('--rapido', action='store_true', help='quick_check em vez de integrity_check')
+    return parser.parse_args()
 
 
 # Uso
 if __name__ == "__main__":
-    arquivo_dump = 'servicos_app.sql'  # Altere para o nome do seu dump
-    restaurar_dump(arquivo_dump)
\ No newline at end of file
+    try:
+        argumentos = ler_argumentos()
+        restaurar_dump(argumentos.arquivo, argumentos.banco,
+                       verificar_hash=not argumentos.sem_verificar_hash, rapido=argumentos.rapido)
+    except Exception as e:
+        print(f"❌ Erro ao restaurar: {e}")
+        sys.exit(1)
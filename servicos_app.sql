@@ -32,6 +32,20 @@ CREATE TABLE `avaliacoes` (
   FOREIGN KEY (`prestador_id`) REFERENCES `prestadores_servico` (`id`)
 );;
 INSERT INTO "avaliacoes" VALUES(1,1,13,1,1,'',0,'2025-11-04 14:55:18','Não é justo. Peço para rever','2025-11-04 15:39:42');;
+CREATE TABLE `avaliacoes_resumo` (
+  `prestador_id` INTEGER NOT NULL,
+  `total` INTEGER NOT NULL,
+  `soma` INTEGER NOT NULL,
+  `estrelas_1` INTEGER NOT NULL,
+  `estrelas_2` INTEGER NOT NULL,
+  `estrelas_3` INTEGER NOT NULL,
+  `estrelas_4` INTEGER NOT NULL,
+  `estrelas_5` INTEGER NOT NULL,
+  `atualizado_em` TEXT,
+  PRIMARY KEY (`prestador_id`),
+  FOREIGN KEY (`prestador_id`) REFERENCES `prestadores_servico` (`id`)
+);;
+INSERT INTO "avaliacoes_resumo" VALUES(1,1,1,1,0,0,0,0,'2025-11-04 14:55:18');;
 CREATE TABLE `categorias_servico` (
   `id` INTEGER PRIMARY KEY AUTOINCREMENT,
   `nome` TEXT NOT NULL,
@@ -296,6 +310,13 @@ INSERT INTO "usuarios" VALUES(12,'Isabel Maxixe','prestador11@servicos.co.mz','s
 INSERT INTO "usuarios" VALUES(13,'Zayn Malik','nachingweyaa@gmail.com','scrypt:32768:8:1$2L3KLvFdZqY24dz4$02d7a4050ef12837f58c046c5e14fc1fc95ab176e4db287c672e4e032acab21db4c018784e6ffd35443fa9881db5f2e9103de94977ef9d8523da0d5fb733882e','cliente',NULL,NULL,NULL,NULL,NULL,'2025-10-30 21:53:33',NULL,1);;
 INSERT INTO "usuarios" VALUES(14,'Mario Baule','nachingweyaaa@gmail.com','scrypt:32768:8:1$pGeMiKy6FnIlK70i$5e3273b77cc1eb6314196a530ba53313c6a0ae124d7d5946af3ced3a8b1251657ea73e9a3b41f2a9e705c8dde23cbb6a950fb72bfc578e7bd50001a37cac5282','prestador',NULL,NULL,NULL,NULL,NULL,'2025-10-30 23:21:28',NULL,1);;
 INSERT INTO "usuarios" VALUES(15,'Administrador Sistema','admin@servicospro.mz','scrypt:32768:8:1$S9ygPjQgseD3h6Ld$b6a5e9e8c3da25914b23e0d6a394294ddfe3cb9de3f1bdf291dac2457125dc49c2a252d72205a30400fd6dd2319763447cf17fc52a4243084bc9ac882d177f5d','admin','+258841234567','Maputo','Centro',NULL,NULL,'2025-11-04 22:25:21',NULL,1);;
+CREATE TABLE `versao_schema` (
+  `versao` INTEGER NOT NULL,
+  `descricao` TEXT,
+  `aplicada_em` TEXT,
+  PRIMARY KEY (`versao`)
+);;
+INSERT INTO "versao_schema" VALUES(1,'schema inicial','2025-11-04 14:55:18');;
 DELETE FROM "sqlite_sequence";;
 INSERT INTO "sqlite_sequence" VALUES('usuarios',15);;
 INSERT INTO "sqlite_sequence" VALUES('categorias_servico',6);;
@@ -308,4 +329,11 @@ INSERT INTO "sqlite_sequence" VALUES('mensagens',10);;
 INSERT INTO "sqlite_sequence" VALUES('notificacoes',23);;
 INSERT INTO "sqlite_sequence" VALUES('tickets_suporte',3);;
 INSERT INTO "sqlite_sequence" VALUES('tickets_respostas',2);;
+CREATE INDEX `ix_agendamentos_prestador_status_data` ON `agendamentos` (`prestador_id`, `status`, `data_agendamento`);;
+CREATE INDEX `ix_agendamentos_cliente_data` ON `agendamentos` (`cliente_id`, `data_agendamento`);;
+CREATE INDEX `ix_mensagens_conversa_data` ON `mensagens` (`conversa_id`, `data_envio`);;
+CREATE INDEX `ix_mensagens_conversa_lida_remetente` ON `mensagens` (`conversa_id`, `lida`, `remetente_id`);;
+CREATE INDEX `ix_notificacoes_usuario_lida_data` ON `notificacoes` (`usuario_id`, `lida`, `data_criacao`);;
+CREATE INDEX `ix_transacoes_prestador_data` ON `transacoes_financeiras` (`prestador_id`, `data_transacao`);;
+CREATE INDEX `ix_tickets_status_prioridade_data` ON `tickets_suporte` (`status`, `prioridade`, `data_abertura`);;
 COMMIT;;
@@ -16,6 +16,7 @@ class ServicosProApp {
         this.initPasswordToggles();
         this.initImageLoaders();
         this.initAjaxHandlers();
+        this.initSearchSuggestions();
     }
 
     // Theme Management
@@ -315,6 +316,107 @@ class ServicosProApp {
         });
     }
 
+    // Search Suggestions (autocomplete from /api/sugestoes)
+    initSearchSuggestions() {
+        const labels = {
+            especialidade: 'Especialidade',
+            categoria: 'Categoria',
+            servico: 'Serviço',
+            prestador: 'Profissional'
+        };
+
+        document.querySelectorAll('input[data-sugestoes]').forEach(input => {
+            const menu = document.createElement('div');
+            menu.className = 'dropdown-menu w-100 shadow-sm';
+            input.parentElement.classList.add('position-relative');
+            input.insertAdjacentElement('afterend', menu);
+
+            let controller = null;
+            let active = -1;
+
+            const hide = () => {
+                menu.classList.remove('show');
+                active = -1;
+            };
+
+            const highlight = (index) => {
+                const items = menu.querySelectorAll('.dropdown-item');
+                items.forEach((item, i) => item.classList.toggle('active', i === index));
+                active = index;
+            };
+
+            const render = (sugestoes) => {
+                menu.innerHTML = '';
+                sugestoes.forEach(sugestao => {
+                    const item = document.createElement('a');
+                    item.className = 'dropdown-item d-flex justify-content-between align-items-center';
+                    item.href = sugestao.url;
+                    item.textContent = sugestao.texto;
+
+                    const badge = document.createElement('small');
+                    badge.className = 'text-muted ms-3';
+                    badge.textContent = labels[sugestao.tipo] || sugestao.tipo;
+                    item.appendChild(badge);
+                    menu.appendChild(item);
+                });
+                menu.classList.toggle('show', sugestoes.length > 0);
+                active = -1;
+            };
+
+            const fetchSuggestions = ServicosProApp.debounce(async () => {
+                const q = input.value.trim();
+                if (!q) {
+                    hide();
+                    return;
+                }
+
+                // Only the latest request matters
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+
+                try {
+                    const url = `${input.dataset.sugestoes}?q=${encodeURIComponent(q)}`;
+                    const response = await fetch(url, { signal: controller.signal });
+                    const data = await response.json();
+                    if (input.value.trim() === q) {
+                        render(data.sugestoes || []);
+                    }
+                } catch (error) {
+                    if (error.name !== 'AbortError') {
+                        console.error('Suggestions failed:', error);
+                    }
+                }
+            }, 150);
+
+            input.addEventListener('input', fetchSuggestions);
+
+            input.addEventListener('keydown', (e) => {
+                const items = menu.querySelectorAll('.dropdown-item');
+                if (!menu.classList.contains('show') || !items.length) {
+                    return;
+                }
+
+                if (e.key === 'ArrowDown') {
+                    e.preventDefault();
+                    highlight((active + 1) % items.length);
+                } else if (e.key === 'ArrowUp') {
+                    e.preventDefault();
+                    highlight((active - 1 + items.length) % items.length);
+                } else if (e.key === 'Enter' && active >= 0) {
+                    e.preventDefault();
+                    window.location.href = items[active].href;
+                } else if (e.key === 'Escape') {
+                    hide();
+                }
+            });
+
+            // Delay so a click on a suggestion still lands
+            input.addEventListener('blur', () => setTimeout(hide, 150));
+        });
+    }
+
     // Utility Functions
     static showToast(message, type = 'info') {
         // Create toast container if it doesn't exist
@@ -0,0 +1,420 @@
+# sugestoes.py
+"""
+Sugestões da caixa de busca (autocompletar), servidas da memória.
+
+Cada sugestão é uma especialidade, uma categoria, o título de um serviço ativo
+ou o nome de um prestador disponível. A popularidade de um prestador é
+1 + agendamentos não cancelados + avaliações; a de uma especialidade, categoria
+ou título é a soma da dos prestadores que a oferecem.
+
+O índice é uma lista ordenada de chaves (o texto sem acentos a partir de cada
+palavra: "personal trainer" e "trainer"), então um prefixo é uma faixa achada
+com bisect. Faixas pequenas são ordenadas por popularidade na hora; os
+prefixos com mais de SUGESTOES_VARREDURA_MAX chaves ("m", "ma", ...) têm as
+mais populares guardadas, mantidas a cada alteração.
+
+- é construído numa thread quando a aplicação arranca (init_app) e
+  reconstruído a cada SUGESTOES_RECONSTRUIR_S: é assim que chegam as escritas
+  de outros processos e os prefixos que passaram a ser grandes;
+- as escritas deste processo (PrestadorServico, Servico, nome do Usuario,
+  agendamentos e avaliações) atualizam os prestadores afetados depois do commit.
+
+    python sugestoes.py elet     # testa as sugestões de um prefixo
+"""
+import bisect
+import heapq
+import logging
+import sys
+import threading
+import time
+from functools import lru_cache
+
+from sqlalchemy import func, select
+
+from alteracoes import depois_do_commit, prestadores_alterados
+from config import config
+from database import engine
+from models import Agendamento, Avaliacao, CategoriaServico, PrestadorServico, ResumoAvaliacoes, Servico, Usuario
+from normalizacao import palavras_dobradas
+
+logger = logging.getLogger('servicos.sugestoes')
+
+# Campos que mudam as sugestões ou a popularidade de um prestador
+CAMPOS = {
+    PrestadorServico: ('usuario_id', 'categoria', 'especialidade', 'disponivel'),
+    Servico: ('prestador_id', 'titulo', 'ativo'),
+    Agendamento: ('prestador_id', 'status'),
+    Avaliacao: ('prestador_id',),
+}
+
+# Sugestões guardadas por prefixo grande: folga para as que saem e para os homónimos
+_TOPO = 4 * config.SUGESTOES_LIMITE
+
+# Maior que qualquer caractere das chaves: fim da faixa de um prefixo
+_FIM = '\U0010ffff'
+
+
+@lru_cache(maxsize=100000)
+def _palavras(texto):
+    # Nomes e especialidades repetem-se muito entre prestadores
+    return tuple(palavras_dobradas(texto))
+
+
+def chave(texto):
+    """Texto como é comparado com o prefixo: sem acentos, palavras separadas por um espaço"""
+    return ' '.join(_palavras(texto))
+
+
+def _identidade(tipo, palavras, valor):
+    """
+    Categorias pelo slug, prestadores pelo id e nome (mudar o nome troca a
+    sugestão), o resto pelo texto (junta "Eletricista" e "eletricista")
+    """
+    if tipo == 'categoria':
+        return (tipo, valor)
+    if tipo == 'prestador':
+        return (tipo, valor, ' '.join(palavras))
+    return (tipo, ' '.join(palavras))
+
+
+class Sugestao:
+    __slots__ = ('id', 'tipo', 'texto', 'valor', 'chaves', 'popularidade', 'prestadores')
+
+    def __init__(self, id, tipo, texto, valor, palavras):
+        self.id = id
+        self.tipo = tipo
+        self.texto = texto
+        self.valor = valor    # slug da categoria, id do prestador ou o próprio texto
+        self.chaves = [' '.join(palavras[inicio:]) for inicio in range(min(len(palavras), config.SUGESTOES_PALAVRAS))]
+        self.popularidade = 0
+        self.prestadores = 0
+
+    def ordem(self):
+        return (-self.popularidade, self.texto)
+
+    def como_dict(self):
+        return {'tipo': self.tipo, 'texto': self.texto, 'valor': self.valor, 'popularidade': self.popularidade}
+
+
+class IndiceSugestoes:
+    """Chaves ordenadas + topo dos prefixos grandes; escritas sob um lock, leituras sem"""
+
+    def __init__(self):
+        self.chaves = []          # [(chave, id da sugestão)], ordenada
+        self.sugestoes = {}       # id -> Sugestao
+        self.identidades = {}     # _identidade() -> id
+        self.contribuicoes = {}   # prestador -> (peso, ids das sugestões)
+        self.topos = {}           # prefixo -> ids das mais populares (até _TOPO)
+        self.topo_maximo = 0      # comprimento do maior prefixo com topo
+        self._proximo = 0
+        self._lock = threading.Lock()
+
+    # ---------- leitura ----------
+
+    def _faixa(self, prefixo):
+        inicio = bisect.bisect_left(self.chaves, (prefixo,))
+        fim = bisect.bisect_left(self.chaves, (prefixo + _FIM,))
+        return inicio, fim
+
+    def _mais_populares(self, prefixo, quantas):
+        inicio, fim = self._faixa(prefixo)
+        ids = {id for texto, id in self.chaves[inicio:fim] if texto.startswith(prefixo)}
+        # Sem lock: definir_prestador pode tirar a sugestão do dicionário a qualquer momento
+        sugestoes = [sugestao for sugestao in map(self.sugestoes.get, ids) if sugestao is not None]
+        return [sugestao.id for sugestao in heapq.nsmallest(quantas, sugestoes, key=Sugestao.ordem)]
+
+    def sugerir(self, texto, limite=None):
+        """
+        As `limite` sugestões mais populares que começam por `texto`. Textos
+        iguais do mesmo tipo (prestadores homónimos) aparecem uma vez, com
+        homonimos=True.
+        """
+        limite = limite or config.SUGESTOES_LIMITE
+        prefixo = chave(texto)
+        if len(prefixo) < config.SUGESTOES_MINIMO:
+            return []
+
+        topo = self.topos.get(prefixo)
+        ids = topo if topo is not None and len(topo) >= limite else self._mais_populares(prefixo, max(limite, _TOPO))
+
+        resultado, vistas = [], {}
+        for id in ids:
+            sugestao = self.sugestoes.get(id)
+            if sugestao is None:
+                continue
+            identidade = (sugestao.tipo, sugestao.chaves[0])
+            if identidade in vistas:
+                vistas[identidade]['homonimos'] = True
+            elif len(resultado) < limite:
+                vistas[identidade] = dict(sugestao.como_dict(), homonimos=False)
+                resultado.append(vistas[identidade])
+        return resultado
+
+    # ---------- construção ----------
+
+    def _obter(self, tipo, texto, valor, inserir_chaves=False):
+        """Id da sugestão, criada se ainda não existir"""
+        palavras = _palavras(texto)
+        identidade = _identidade(tipo, palavras, valor)
+        id = self.identidades.get(identidade)
+        if id is None:
+            self._proximo += 1
+            id = self.identidades[identidade] = self._proximo
+            sugestao = self.sugestoes[id] = Sugestao(id, tipo, texto, valor, palavras)
+            if inserir_chaves:
+                for texto_chave in sugestao.chaves:
+                    bisect.insort(self.chaves, (texto_chave, id))
+        return id
+
+    def carregar(self, prestadores):
+        """Construção completa: {prestador: (peso, [(tipo, texto, valor)])}"""
+        for prestador, (peso, itens) in prestadores.items():
+            ids = tuple({self._obter(*item) for item in itens})
+            for id in ids:
+                sugestao = self.sugestoes[id]
+                sugestao.popularidade += peso
+                sugestao.prestadores += 1
+            self.contribuicoes[prestador] = (peso, ids)
+
+        self.chaves = sorted((texto, sugestao.id) for sugestao in self.sugestoes.values() for texto in sugestao.chaves)
+        self._calcular_topos()
+
+    def _calcular_topos(self):
+        """Topo de cada prefixo com mais de ~SUGESTOES_VARREDURA_MAX chaves"""
+        # A lista está ordenada: o prefixo comum a duas chaves a `passo` posições uma
+        # da outra (e os prefixos dele) tem pelo menos `passo` chaves
+        passo = max(1, config.SUGESTOES_VARREDURA_MAX // 2)
+        grandes = set()
+        for posicao in range(0, len(self.chaves) - passo, passo):
+            primeira, ultima = self.chaves[posicao][0], self.chaves[posicao + passo][0]
+            comum = 0
+            while comum < min(len(primeira), len(ultima)) and primeira[comum] == ultima[comum]:
+                comum += 1
+            grandes.update(primeira[:comprimento] for comprimento in range(1, comum + 1))
+
+        # Uma passagem pelas sugestões da mais para a menos popular enche todos os topos
+        self.topo_maximo = max(map(len, grandes), default=0)
+        topos = {prefixo: [] for prefixo in grandes}
+        cheios = 0
+        for sugestao in sorted(self.sugestoes.values(), key=Sugestao.ordem):
+            for prefixo in self._prefixos_com_topo(sugestao, topos):
+                topo = topos[prefixo]
+                if len(topo) < _TOPO and (not topo or topo[-1] != sugestao.id):
+                    topo.append(sugestao.id)
+                    cheios += len(topo) == _TOPO
+            if cheios == len(topos):
+                break
+        self.topos = topos
+
+    def _prefixos_com_topo(self, sugestao, topos=None):
+        """Prefixos das chaves da sugestão que têm topo (se "ab" não tem, "abc" também não)"""
+        topos = self.topos if topos is None else topos
+        for texto in sugestao.chaves:
+            for comprimento in range(1, min(len(texto), self.topo_maximo) + 1):
+                if texto[:comprimento] not in topos:
+                    break
+                yield texto[:comprimento]
+
+    # ---------- atualização incremental ----------
+
+    def _ajustar_topos(self, sugestao, removida=False):
+        """
+        Mantém o topo dos prefixos da sugestão. Invariante: quem está fora de um
+        topo não é mais popular que o último de dentro; se o topo ficar menor
+        que o limite, é recalculado a partir da faixa.
+        """
+        for prefixo in set(self._prefixos_com_topo(sugestao)):
+            topo = self.topos[prefixo]
+
+            membros = [self.sugestoes[id] for id in topo if id != sugestao.id and id in self.sugestoes]
+            # Só entra (ou fica) se não for pior que o último dos outros
+            if not removida and membros and sugestao.ordem() <= max(membro.ordem() for membro in membros):
+                membros.append(sugestao)
+            membros.sort(key=Sugestao.ordem)
+            # Nova lista a cada vez: quem lê sem lock vê a antiga ou a nova
+            novo = [membro.id for membro in membros[:_TOPO]]
+            if len(novo) < config.SUGESTOES_LIMITE:
+                novo = self._mais_populares(prefixo, _TOPO)
+            self.topos[prefixo] = novo
+
+    def _somar(self, id, peso, prestadores):
+        sugestao = self.sugestoes[id]
+        sugestao.popularidade += peso
+        sugestao.prestadores += prestadores
+        if sugestao.prestadores > 0:
+            self._ajustar_topos(sugestao)
+            return
+
+        # Nenhum prestador a oferece: sai do índice
+        for texto in sugestao.chaves:
+            posicao = bisect.bisect_left(self.chaves, (texto, id))
+            if posicao < len(self.chaves) and self.chaves[posicao] == (texto, id):
+                del self.chaves[posicao]
+        del self.sugestoes[id]
+        self.identidades.pop(_identidade(sugestao.tipo, _palavras(sugestao.texto), sugestao.valor), None)
+        self._ajustar_topos(sugestao, removida=True)
+
+    def definir_prestador(self, prestador, dados):
+        """Troca o que o prestador contribui: (peso, itens) ou None se não deve aparecer"""
+        with self._lock:
+            peso_anterior, anteriores = self.contribuicoes.pop(prestador, (0, ()))
+            peso, itens = dados or (0, [])
+            novos = {self._obter(*item, inserir_chaves=True) for item in itens}
+            if novos:
+                self.contribuicoes[prestador] = (peso, tuple(novos))
+
+            for id in novos - set(anteriores):
+                self._somar(id, peso, 1)
+            for id in set(anteriores) - novos:
+                self._somar(id, -peso_anterior, -1)
+            if peso != peso_anterior:
+                for id in novos & set(anteriores):
+                    self._somar(id, peso - peso_anterior, 0)
+
+
+# ==================== DADOS ====================
+
+def _dados(conn, ids=None):
+    """{prestador: (peso, [(tipo, texto, valor)])} dos prestadores disponíveis (todos ou `ids`)"""
+    prestador, usuario = PrestadorServico.__table__, Usuario.__table__
+    servico, agendamento = Servico.__table__, Agendamento.__table__
+    resumo, categoria = ResumoAvaliacoes.__table__, CategoriaServico.__table__
+
+    def filtrar(consulta, coluna):
+        return consulta if ids is None else consulta.where(coluna.in_(ids))
+
+    categorias = dict(conn.execute(select(categoria.c.slug, categoria.c.nome)).all())
+
+    pesos = dict(conn.execute(filtrar(
+        select(agendamento.c.prestador_id, func.count())
+        .where(agendamento.c.status != 'cancelado')
+        .group_by(agendamento.c.prestador_id), agendamento.c.prestador_id)).all())
+    for id, total in conn.execute(filtrar(select(resumo.c.prestador_id, resumo.c.total), resumo.c.prestador_id)):
+        pesos[id] = pesos.get(id, 0) + (total or 0)
+
+    dados = {}
+    linhas = conn.execute(filtrar(
+        select(prestador.c.id, usuario.c.nome, prestador.c.especialidade, prestador.c.categoria)
+        .join(usuario, usuario.c.id == prestador.c.usuario_id)
+        .where(prestador.c.disponivel == 'sim'), prestador.c.id))
+    for id, nome, especialidade, slug in linhas:
+        itens = [('prestador', nome, id)]
+        if especialidade:
+            itens.append(('especialidade', especialidade, especialidade))
+        if slug:
+            itens.append(('categoria', categorias.get(slug) or slug.replace('_', ' ').capitalize(), slug))
+        dados[id] = (1 + pesos.get(id, 0), itens)
+
+    titulos = conn.execute(filtrar(
+        select(servico.c.prestador_id, servico.c.titulo).distinct()
+        .where(servico.c.ativo.is_(True)), servico.c.prestador_id))
+    for id, titulo in titulos:
+        if id in dados and titulo:
+            dados[id][1].append(('servico', titulo, titulo))
+    return dados
+
+
+# ==================== ÍNDICE DO PROCESSO ====================
+
+_indice = None
+_estado = threading.Lock()
+_reconstruindo = False
+_alterados_na_reconstrucao = set()
+
+
+def indice():
+    """Índice atual, ou None enquanto a primeira construção não termina"""
+    return _indice
+
+
+def reconstruir(bind=engine):
+    """Constrói um índice novo a partir do banco e troca-o pelo atual"""
+    global _indice, _reconstruindo
+    inicio = time.perf_counter()
+    with _estado:
+        _reconstruindo = True
+    try:
+        novo = IndiceSugestoes()
+        with bind.connect() as conn:
+            novo.carregar(_dados(conn))
+    except Exception:
+        with _estado:
+            _reconstruindo = False
+            _alterados_na_reconstrucao.clear()
+        raise
+
+    with _estado:
+        # Troca junto com o fim da reconstrução: atualizar() vê um ou o outro
+        _reconstruindo = False
+        _indice = novo
+        # Alterações confirmadas enquanto se lia o banco: reaplicadas no índice novo
+        alterados = set(_alterados_na_reconstrucao)
+        _alterados_na_reconstrucao.clear()
+
+    if alterados:
+        atualizar(alterados, bind)
+    logger.info('Índice de sugestões: %d sugestões, %d chaves, %d prefixos com topo em %.0f ms',
+                len(novo.sugestoes), len(novo.chaves), len(novo.topos), (time.perf_counter() - inicio) * 1000)
+    return novo
+
+
+def atualizar(ids, bind=engine):
+    """Relê os prestadores `ids` e atualiza o índice do processo"""
+    with _estado:
+        if _reconstruindo:
+            _alterados_na_reconstrucao.update(ids)
+        atual = _indice
+    if atual is None:
+        return
+    with bind.connect() as conn:
+        dados = _dados(conn, list(ids))
+    for id in ids:
+        atual.definir_prestador(id, dados.get(id))
+
+
+def _guardar_alterados(session, prestadores):
+    """Junta os prestadores alterados pelo flush; o índice só muda depois do commit"""
+    if _indice is not None or _reconstruindo:
+        prestadores.update(prestadores_alterados(session, CAMPOS, ('nome',)))
+
+
+def _aplicar_alterados(prestadores):
+    try:
+        atualizar(prestadores)
+    except Exception:
+        # O commit já foi feito; a próxima reconstrução corrige o índice
+        logger.exception('Falha ao atualizar as sugestões de %s', sorted(prestadores))
+
+
+depois_do_commit('sugestoes_pendentes', _guardar_alterados, _aplicar_alterados)
+
+
+def _manter_indice():
+    while True:
+        try:
+            reconstruir()
+        except Exception:
+            logger.exception('Falha ao construir o índice de sugestões')
+        time.sleep(config.SUGESTOES_RECONSTRUIR_S)
+
+
+def init_app(app):
+    """Constrói o índice numa thread (o arranque não espera) e reconstrói-o periodicamente"""
+    if config.SUGESTOES_ATIVAS:
+        threading.Thread(target=_manter_indice, name='sugestoes', daemon=True).start()
+
+
+if __name__ == '__main__':
+    print('🔤 Construindo o índice de sugestões...')
+    inicio = time.perf_counter()
+    indice_construido = reconstruir()
+    print(f'✅ {len(indice_construido.sugestoes)} sugestões, {len(indice_construido.chaves)} chaves, '
+          f'{len(indice_construido.topos)} prefixos com topo em {time.perf_counter() - inicio:.1f}s')
+
+    for prefixo in sys.argv[1:]:
+        inicio = time.perf_counter()
+        encontradas = indice_construido.sugerir(prefixo)
+        print(f'\n🔎 "{prefixo}" ({(time.perf_counter() - inicio) * 1000:.2f} ms)')
+        for sugestao in encontradas:
+            print(f"   {sugestao['popularidade']:6d}  {sugestao['tipo']:<13} {sugestao['texto']}"
+                  f"{'  (homónimos)' if sugestao['homonimos'] else ''}")
@@ -0,0 +1,389 @@
+# tests/benchmark_endpoints.py
+"""
+Benchmark dos endpoints quentes, em processo, com o cliente de testes do Flask.
+
+Não precisa de servidor: a aplicação é criada com create_app() e cada papel
+(cliente, prestador, admin) faz login pelo POST /login. Para cada escala o
+banco é gerado uma vez com tests/criar_dados_teste.py (semente fixa) e
+reutilizado nas execuções seguintes.
+
+Por endpoint são medidos:
+  - latência p50/p95/p99 (ms) em N repetições, depois do aquecimento;
+  - número de comandos SQL por pedido (monitor_sql);
+  - memória alocada no pico do pedido (tracemalloc, numa passagem à parte).
+
+Com --salvar-baseline os resultados ficam em tests/benchmark_baseline.json;
+nas execuções seguintes uma regressão acima da tolerância faz o script sair
+com código 1.
+
+Uso:
+    python tests/benchmark_endpoints.py                          # escala pequena
+    python tests/benchmark_endpoints.py --escalas pequena media grande
+    python tests/benchmark_endpoints.py --salvar-baseline
+    python tests/benchmark_endpoints.py --repeticoes 50 --tolerancia 0.3
+"""
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GERADOR = os.path.join(RAIZ, 'tests', 'criar_dados_teste.py')
+BASELINE_PADRAO = os.path.join(RAIZ, 'tests', 'benchmark_baseline.json')
+PASTA_DADOS_PADRAO = os.path.join(tempfile.gettempdir(), 'servicos_benchmark')
+
+# Escala do benchmark -> escala do gerador de dados
+ESCALAS = {'pequena': 'pequena', 'media': 'media', 'grande': 'producao'}
+
+SENHA = '123456'
+EMAIL_ADMIN = 'admin@benchmark.servicos.co.mz'
+
+TOLERANCIA_PADRAO = 0.25  # 25% acima da baseline conta como regressão
+RUIDO_MS = 2.0            # diferenças de latência abaixo disto são ignoradas
+RUIDO_KB = 64.0           # idem para memória
+AMOSTRAS_MEMORIA = 3
+
+
+# ==================== MEDIÇÃO (processo filho) ====================
+
+def percentil(valores, p):
+    """Percentil por posição mais próxima"""
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[posicao]
+
+
+def preparar_usuarios(db_session):
+    """Escolhe o cliente e o prestador mais ativos e garante um admin, todos com SENHA"""
+    from sqlalchemy import func, select
+    from models import Agendamento, Conversa, PrestadorServico, Usuario
+
+    cliente_id = db_session.execute(
+        select(Agendamento.cliente_id).group_by(Agendamento.cliente_id)
+        .order_by(func.count().desc()).limit(1)
+    ).scalar()
+    prestador_id = db_session.execute(
+        select(Agendamento.prestador_id).group_by(Agendamento.prestador_id)
+        .order_by(func.count().desc()).limit(1)
+    ).scalar()
+    if cliente_id is None or prestador_id is None:
+        raise RuntimeError('O banco não tem agendamentos; gere os dados com tests/criar_dados_teste.py')
+
+    prestador = db_session.get(PrestadorServico, prestador_id)
+    cliente = db_session.get(Usuario, cliente_id)
+
+    admin = db_session.query(Usuario).filter_by(email=EMAIL_ADMIN).first()
+    if not admin:
+        admin = Usuario(nome='Admin Benchmark', email=EMAIL_ADMIN, tipo='admin')
+        db_session.add(admin)
+
+    for usuario in (cliente, prestador.usuario, admin):
+        if not usuario.senha_hash or not usuario.check_senha(SENHA):
+            usuario.set_senha(SENHA)
+    db_session.commit()
+
+    conversa_id = db_session.execute(
+        select(Conversa.id).where(Conversa.cliente_id == cliente_id).order_by(Conversa.id).limit(1)
+    ).scalar()
+
+    return {
+        'cliente': cliente.email,
+        'prestador': prestador.usuario.email,
+        'admin': admin.email,
+        'prestador_id': prestador_id,
+        'conversa_id': conversa_id,
+    }
+
+
+def endpoints_quentes(ids):
+    """(nome, papel, url) dos endpoints medidos"""
+    hoje = date.today().isoformat()
+    lista = [
+        ('dashboard cliente', 'cliente', '/dashboard'),
+        ('dashboard prestador', 'prestador', '/dashboard'),
+        ('buscar categoria', 'cliente', '/servicos/buscar?categoria=medico'),
+        ('buscar texto', 'cliente', '/servicos/buscar?q=Fitness'),
+        ('chat index', 'cliente', '/chat/'),
+        ('disponibilidade', 'cliente', f"/agendamentos/api/disponibilidade/{ids['prestador_id']}?data={hoje}"),
+        ('admin dashboard', 'admin', '/admin/'),
+        ('notificacoes nao lidas', 'cliente', '/notificacoes/api/nao-lidas'),
+    ]
+    if ids['conversa_id']:
+        lista.append(('chat poll', 'cliente', f"/chat/api/mensagens/{ids['conversa_id']}"))
+    return lista
+
+
+def autenticar(app, ids):
+    """Um cliente de testes com sessão iniciada por papel"""
+    clientes = {}
+    for papel in ('cliente', 'prestador', 'admin'):
+        cliente = app.test_client()
+        resposta = cliente.post('/login', data={'email': ids[papel], 'senha': SENHA})
+        if resposta.status_code != 302 or '/login' in resposta.headers.get('Location', ''):
+            raise RuntimeError(f'Falha no login do papel {papel} ({ids[papel]})')
+        clientes[papel] = cliente
+    return clientes
+
+
+def medir_endpoint(cliente, url, repeticoes, aquecimento, ultimo_pedido):
+    """Latências, comandos SQL e memória de um endpoint"""
+    for _ in range(aquecimento):
+        cliente.get(url)
+
+    tempos = []
+    consultas = []
+    status = set()
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = cliente.get(url)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        consultas.append(ultimo_pedido.get('consultas'))
+        status.add(resposta.status_code)
+
+    # tracemalloc distorce o tempo, por isso a memória é medida à parte
+    memorias = []
+    for _ in range(AMOSTRAS_MEMORIA):
+        tracemalloc.start()
+        antes = tracemalloc.get_traced_memory()[0]
+        cliente.get(url)
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        memorias.append((pico - antes) / 1024)
+
+    consultas_validas = [total for total in consultas if total is not None]
+    return {
+        'p50_ms': round(percentil(tempos, 50), 2),
+        'p95_ms': round(percentil(tempos, 95), 2),
+        'p99_ms': round(percentil(tempos, 99), 2),
+        'media_ms': round(statistics.fmean(tempos), 2),
+        'consultas': max(consultas_validas) if consultas_validas else None,
+        'memoria_kb': round(statistics.median(memorias), 1),
+        'status': sorted(status),
+    }
+
+
+def executar_medicao(repeticoes, aquecimento, saida):
+    """Corre no processo filho, com DATABASE_URL já apontando para o banco da escala"""
+    sys.path.insert(0, RAIZ)
+    import monitor_sql
+    from app import create_app
+    from database import db_session
+
+    app = create_app()
+    ultimo_pedido = {}
+
+    # Registado depois do monitor_sql: corre antes dele e ainda vê as estatísticas do pedido
+    @app.after_request
+    def _guardar_consultas(response):
+        estatisticas = monitor_sql.estatisticas_pedido()
+        ultimo_pedido['consultas'] = estatisticas.consultas if estatisticas else None
+        return response
+
+    ids = preparar_usuarios(db_session)
+    db_session.remove()
+    resultados = {}
+
+    # Os blueprints fazem print por pedido; fora do terminal para não poluir o relatório
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        clientes = autenticar(app, ids)
+        for nome, papel, url in endpoints_quentes(ids):
+            resultados[nome] = dict(medir_endpoint(clientes[papel], url, repeticoes, aquecimento, ultimo_pedido),
+                                    url=url, papel=papel)
+
+    with open(saida, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultados, arquivo)
+
+
+# ==================== ORQUESTRAÇÃO (processo principal) ====================
+
+class DatasetInvalido(RuntimeError):
+    """O banco da escala não tem os dados derivados que os endpoints medem"""
+
+
+def verificar_dataset(arquivo):
+    """Sem índice da busca preenchido, "buscar texto" mediria páginas vazias"""
+    conn = sqlite3.connect(arquivo)
+    try:
+        documentos = conn.execute('SELECT COUNT(*) FROM busca_prestadores').fetchone()[0]
+    except sqlite3.OperationalError:
+        documentos = 0
+    finally:
+        conn.close()
+    if not documentos:
+        raise DatasetInvalido(f'{arquivo}: busca_prestadores vazio; apague o arquivo para o gerar de novo')
+    return arquivo
+
+
+def garantir_dataset(escala, pasta, semente):
+    """Caminho do banco da escala, gerado na primeira vez"""
+    os.makedirs(pasta, exist_ok=True)
+    arquivo = os.path.join(pasta, f'benchmark_{escala}_{semente}.db')
+    if os.path.exists(arquivo):
+        return verificar_dataset(arquivo)
+
+    print(f"🔄 Gerando banco da escala {escala} (uma única vez)...")
+    parcial = arquivo + '.parcial'
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(parcial + sufixo):
+            os.remove(parcial + sufixo)
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{parcial}', SQLALCHEMY_ECHO='0',
+               SQL_LOG_ARQUIVO=os.path.join(pasta, 'benchmark_sql.log'))
+    subprocess.run([sys.executable, GERADOR, '--escala', ESCALAS[escala], '--semente', str(semente)],
+                   env=env, cwd=RAIZ, check=True)
+
+    # O rename leva só o arquivo principal: o que ainda estiver no -wal entra nele antes
+    conn = sqlite3.connect(parcial)
+    try:
+        conn.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        conn.close()
+    os.replace(parcial, arquivo)
+    return verificar_dataset(arquivo)
+
+
+def medir_escala(escala, arquivo, argumentos):
+    """Mede uma escala num processo próprio (o engine é criado ao importar a aplicação)"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as temporario:
+        saida = temporario.name
+
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{arquivo}', SQLALCHEMY_ECHO='0',
+               SQL_LOG_ARQUIVO=os.path.join(argumentos.pasta_dados, 'benchmark_sql.log'))
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--medir',
+                        '--repeticoes', str(argumentos.repeticoes),
+                        '--aquecimento', str(argumentos.aquecimento),
+                        '--saida', saida], env=env, cwd=RAIZ, check=True)
+        with open(saida, encoding='utf-8') as arquivo_saida:
+            resultados = json.load(arquivo_saida)
+    finally:
+        os.remove(saida)
+
+    return {f'{escala}:{nome}': resultado for nome, resultado in resultados.items()}
+
+
+def imprimir_resultados(resultados):
+    print(f"\n{'endpoint':<36} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>6} {'mem KB':>9}  status")
+    print('-' * 90)
+    for chave, r in resultados.items():
+        consultas = '-' if r['consultas'] is None else r['consultas']
+        print(f"{chave:<36} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{consultas:>6} {r['memoria_kb']:>9.1f}  {','.join(map(str, r['status']))}")
+
+
+def encontrar_regressoes(resultados, baseline, tolerancia):
+    """Lista de mensagens com as regressões e erros em relação à baseline"""
+    problemas = []
+    for chave, atual in resultados.items():
+        if any(status >= 500 for status in atual['status']):
+            problemas.append(f"{chave}: erro HTTP {atual['status']}")
+
+        base = baseline.get(chave)
+        if not base:
+            continue
+
+        limite_ms = base['p95_ms'] * (1 + tolerancia)
+        if atual['p95_ms'] > limite_ms and atual['p95_ms'] - base['p95_ms'] > RUIDO_MS:
+            problemas.append(f"{chave}: p95 {atual['p95_ms']}ms > baseline {base['p95_ms']}ms")
+
+        if atual['consultas'] is not None and base.get('consultas') is not None \
+                and atual['consultas'] > base['consultas']:
+            problemas.append(f"{chave}: {atual['consultas']} comandos SQL > baseline {base['consultas']}")
+
+        limite_kb = base['memoria_kb'] * (1 + tolerancia)
+        if atual['memoria_kb'] > limite_kb and atual['memoria_kb'] - base['memoria_kb'] > RUIDO_KB:
+            problemas.append(f"{chave}: memória {atual['memoria_kb']}KB > baseline {base['memoria_kb']}KB")
+
+    return problemas
+
+
+def carregar_baseline(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo).get('resultados', {})
+
+
+def salvar_baseline(caminho, resultados):
+    atuais = carregar_baseline(caminho)
+    atuais.update(resultados)
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        json.dump({
+            'atualizado_em': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'resultados': atuais,
+        }, arquivo, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints quentes')
+    parser.add_argument('--escalas', nargs='+', choices=ESCALAS, default=['pequena'])
+    parser.add_argument('--repeticoes', type=int, default=30)
+    parser.add_argument('--aquecimento', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=2024)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCIA_PADRAO,
+                        help='fração acima da baseline tolerada (padrão 0.25)')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--pasta-dados', default=PASTA_DADOS_PADRAO,
+                        help='onde ficam os bancos gerados por escala')
+    # Uso interno: medição no processo filho
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--saida', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    argumentos = ler_argumentos()
+
+    if argumentos.medir:
+        executar_medicao(argumentos.repeticoes, argumentos.aquecimento, argumentos.saida)
+        return 0
+
+    print("=" * 60)
+    print("⏱️  BENCHMARK DOS ENDPOINTS - SERVIÇOSPRO")
+    print("=" * 60)
+
+    resultados = {}
+    for escala in argumentos.escalas:
+        try:
+            arquivo = garantir_dataset(escala, argumentos.pasta_dados, argumentos.semente)
+        except DatasetInvalido as e:
+            print(f"❌ {e}")
+            return 1
+        print(f"📊 Medindo escala {escala} ({arquivo})...")
+        resultados.update(medir_escala(escala, arquivo, argumentos))
+
+    imprimir_resultados(resultados)
+
+    if argumentos.salvar_baseline:
+        salvar_baseline(argumentos.baseline, resultados)
+        print(f"\n💾 Baseline salva em {argumentos.baseline}")
+        return 0
+
+    baseline = carregar_baseline(argumentos.baseline)
+    problemas = encontrar_regressoes(resultados, baseline, argumentos.tolerancia)
+
+    print()
+    if not baseline:
+        print("ℹ️  Sem baseline para comparar (use --salvar-baseline)")
+    if problemas:
+        print(f"❌ {len(problemas)} regressão(ões)/erro(s):")
+        for problema in problemas:
+            print(f"   • {problema}")
+        return 1
+
+    print("🎉 Nenhuma regressão em relação à baseline!")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,98 +1,519 @@
 # tests/criar_dados_teste.py
-import sys
+"""
+Gerador de dados sintéticos em massa para testes de escala.
+
+Preenche o banco configurado (DATABASE_URL) com volumes realistas para
+reproduzir localmente os problemas de desempenho de produção:
+
+  - inserts em lote (executemany) direto no driver, com commit por lote;
+  - índices secundários removidos durante a carga e recriados no fim;
+  - uma única senha pré-calculada (123456) para todos os usuários;
+  - distribuições enviesadas: poucas cidades e categorias concentram a
+    maioria dos cadastros e poucos usuários/prestadores/conversas
+    concentram a maior parte da atividade;
+  - semente fixa: a mesma semente gera sempre os mesmos dados.
+
+Os registros são acrescentados a partir do maior id existente, por isso o
+script pode correr sobre um banco que já tem dados.
+
+Uso:
+    python tests/criar_dados_teste.py --escala pequena
+    python tests/criar_dados_teste.py --escala producao --semente 42
+    python tests/criar_dados_teste.py --escala media --mensagens 0 --notificacoes 0
+    DATABASE_URL=sqlite:///carga.db python tests/criar_dados_teste.py --escala producao
+"""
+import argparse
 import os
 import random
+import sys
+import time
+from array import array
+from datetime import date, timedelta
 
 # Adicionar diretório raiz ao path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import db_session
-from models import Usuario, PrestadorServico, Servico
+from sqlalchemy import func, select, text
+from werkzeug.security import generate_password_hash
 
+import busca
+import geo
+import migracoes
+import ranking
+import recalcular_avaliacoes
+from database import engine
+from models import (Usuario, PrestadorServico, Servico, Agendamento, Conversa,
+                    Mensagem, Notificacao, Avaliacao)
 
-def criar_dados_teste_realistas():
-    """Criar dados de teste realistas para Moçambique"""
+ESCALAS = {
+    'pequena': dict(usuarios=10_000, prestadores=1_000, agendamentos=50_000,
+                    mensagens=200_000, notificacoes=200_000),
+    'media': dict(usuarios=100_000, prestadores=10_000, agendamentos=1_000_000,
+                  mensagens=5_000_000, notificacoes=5_000_000),
+    'producao': dict(usuarios=1_000_000, prestadores=100_000, agendamentos=10_000_000,
+                     mensagens=50_000_000, notificacoes=50_000_000),
+}
 
-    categorias_especialidades = {
-        'medico': ['Clínico Geral', 'Pediatra', 'Cardiologista', 'Dermatologista'],
-        'psicologo': ['Aconselhamento', 'Terapia Familiar', 'Psicologia Clínica'],
-        'personal_trainer': ['Fitness', 'Reabilitação', 'Condicionamento Físico'],
-        'cozinheiro': ['Culinária Tradicional', 'Culinária Internacional', 'Doces e Sobremesas'],
-        'advogado': ['Direito Civil', 'Direito Criminal', 'Direito Trabalhista'],
-        'consultor': ['Negócios', 'TI', 'Marketing Digital']
-    }
+# (cidade, peso, latitude, longitude)
+CIDADES = [
+    ('Maputo', 35, -25.9692, 32.5732), ('Matola', 20, -25.9622, 32.4589),
+    ('Beira', 12, -19.8436, 34.8389), ('Nampula', 10, -15.1165, 39.2666),
+    ('Quelimane', 5, -17.8786, 36.8883), ('Tete', 5, -16.1564, 33.5867),
+    ('Chimoio', 4, -19.1164, 33.4833), ('Pemba', 3, -12.9740, 40.5178),
+    ('Inhambane', 2, -23.8650, 35.3833), ('Xai-Xai', 2, -25.0519, 33.6442),
+    ('Lichinga', 1, -13.3128, 35.2406), ('Maxixe', 1, -23.8597, 35.3472),
+]
 
-    nomes_mocambicanos = [
-        'João Maputo', 'Maria Matola', 'Carlos Beira', 'Ana Nampula',
-        'José Quelimane', 'Teresa Tete', 'Paulo Pemba', 'Luisa Inhambane',
-        'Miguel Xai-Xai', 'Catarina Chimoio', 'António Lichinga', 'Isabel Maxixe'
-    ]
+BAIRROS = ['Central', 'Polana', 'Sommerschield', 'Malhangalene', 'Alto Maé',
+           'Machava', 'Liberdade', 'Ponta Gea', 'Muhala', 'Cimento']
 
-    print("🔄 Criando dados de teste realistas...")
+NOMES = ['João', 'Maria', 'Carlos', 'Ana', 'José', 'Teresa', 'Paulo', 'Luisa',
+         'Miguel', 'Catarina', 'António', 'Isabel', 'Fátima', 'Armando', 'Celeste', 'Ernesto']
+APELIDOS = ['Machel', 'Mondlane', 'Cossa', 'Sitoe', 'Macuácua', 'Nhantumbo', 'Chissano',
+            'Tembe', 'Langa', 'Mabunda', 'Muianga', 'Guebuza', 'Matsinhe', 'Bila']
 
-    try:
-        # Criar prestadores de serviço
-        for i, nome in enumerate(nomes_mocambicanos):
-            categoria = random.choice(list(categorias_especialidades.keys()))
-            especialidade = random.choice(categorias_especialidades[categoria])
-
-            # Verificar se usuário já existe
-            email = f"prestador{i}@servicos.co.mz"
-            usuario_existente = db_session.query(Usuario).filter_by(email=email).first()
-
-            if not usuario_existente:
-                # Criar usuário
-                usuario = Usuario(
-                    nome=nome,
-                    email=email,
-                    tipo='prestador'
+# (categoria, peso, especialidades)
+CATEGORIAS = [
+    ('medico', 20, ['Clínico Geral', 'Pediatra', 'Cardiologista', 'Dermatologista']),
+    ('psicologo', 8, ['Aconselhamento', 'Terapia Familiar', 'Psicologia Clínica']),
+    ('personal_trainer', 15, ['Fitness', 'Reabilitação', 'Condicionamento Físico']),
+    ('cozinheiro', 12, ['Culinária Tradicional', 'Culinária Internacional', 'Doces e Sobremesas']),
+    ('pastor', 3, ['Aconselhamento Espiritual', 'Casamentos']),
+    ('advogado', 10, ['Direito Civil', 'Direito Criminal', 'Direito Trabalhista']),
+    ('consultor', 12, ['Negócios', 'TI', 'Marketing Digital']),
+    ('outros', 20, ['Canalização', 'Electricidade', 'Limpeza', 'Jardinagem']),
+]
+
+NIVEIS = ['basico', 'intermediario', 'avancado', 'premium']
+STATUS_AGENDAMENTO = [('realizado', 50), ('pendente', 18), ('confirmado', 15),
+                      ('cancelado', 12), ('em_andamento', 5)]
+TIPOS_NOTIFICACAO = [('mensagem', 45), ('agendamento', 30), ('pagamento', 10),
+                     ('avaliacao', 10), ('sistema', 5)]
+RATINGS = [(5, 50), (4, 30), (3, 10), (2, 5), (1, 5)]
+FRASES = ['Olá, tudo bem?', 'Confirmo o horário.', 'Pode chegar 10 minutos mais cedo?',
+          'Obrigado pelo serviço!', 'Qual é o endereço exato?', 'Estou a caminho.',
+          'Podemos remarcar para amanhã?', 'Perfeito, combinado.']
+
+MENSAGENS_POR_CONVERSA = 15  # média usada para decidir quantas conversas criar
+FRACAO_AVALIADOS = 0.4       # agendamentos realizados que recebem avaliação
+DIAS_HISTORICO = 730
+
+
+def pesos_acumulados(itens):
+    total = 0
+    acumulados = []
+    for peso in itens:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+def tabela_ponderada(opcoes):
+    """Lista com cada valor repetido pelo seu peso: sorteio por índice, sem bisect por linha"""
+    return [valor for valor, peso in opcoes for _ in range(peso)]
+
+
+class Gerador:
+    """Gera e insere os dados tabela a tabela, em lotes"""
+
+    def __init__(self, volumes, semente, lote):
+        self.volumes = volumes
+        self.lote = lote
+        self.rnd = random.Random(semente)
+        self.senha_hash = generate_password_hash('123456')
+
+        hoje = date.today()
+        self.dias = [(hoje - timedelta(days=DIAS_HISTORICO - 1 - i)).isoformat() for i in range(DIAS_HISTORICO)]
+        self.dias_futuros = [(hoje + timedelta(days=i)).isoformat() for i in range(60)]
+        self.horas = [f'{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}' for s in range(86400)]
+
+        self.cidades = [cidade[0] for cidade in CIDADES]
+        self.pesos_cidades = pesos_acumulados(cidade[1] for cidade in CIDADES)
+        self.centros = {cidade[0]: (cidade[2], cidade[3]) for cidade in CIDADES}
+        self.categorias = [categoria[0] for categoria in CATEGORIAS]
+        self.pesos_categorias = pesos_acumulados(categoria[1] for categoria in CATEGORIAS)
+        self.especialidades = {categoria[0]: categoria[2] for categoria in CATEGORIAS}
+
+        self.conn = engine.raw_connection()
+        self.marcador = '?' if engine.dialect.paramstyle == 'qmark' else '%s'
+
+    # ---------- auxiliares ----------
+
+    def proximo_id(self, modelo):
+        with engine.connect() as conn:
+            return (conn.execute(select(func.max(modelo.id))).scalar() or 0) + 1
+
+    def momento(self, futuro=False):
+        """Data/hora no formato gravado pelo SQLAlchemy, enviesada para o passado recente"""
+        aleatorio = self.rnd.random
+        if futuro:
+            dia = self.dias_futuros[int(len(self.dias_futuros) * aleatorio())]
+        else:
+            dia = self.dias[int(DIAS_HISTORICO * aleatorio() ** 0.6)]
+        return f'{dia} {self.horas[int(86400 * aleatorio())]}.000000'
+
+    def enviesado(self, total, niveis=2):
+        """
+        Índice em [0, total) pela regra 80/20 aplicada em `niveis` camadas:
+        80% das escolhas caem nos primeiros 20%, 64% nos primeiros 4%, ...
+        """
+        aleatorio = self.rnd.random
+        limite = total
+        for _ in range(niveis):
+            if aleatorio() >= 0.8:
+                break
+            limite = max(1, limite // 5)
+        return int(limite * aleatorio())
+
+    def sortear(self, tabela):
+        return tabela[int(len(tabela) * self.rnd.random())]
+
+    def inserir(self, modelo, colunas, linhas, total):
+        """Insere as linhas geradas em lotes de executemany, com commit por lote"""
+        if total <= 0:
+            return
+        tabela = modelo.__tablename__
+        sql = (f"INSERT INTO {tabela} ({', '.join(colunas)}) "
+               f"VALUES ({', '.join([self.marcador] * len(colunas))})")
+        cursor = self.conn.cursor()
+        inicio = time.perf_counter()
+        inseridas = 0
+        lote = []
+
+        for linha in linhas:
+            lote.append(linha)
+            if len(lote) >= self.lote:
+                cursor.executemany(sql, lote)
+                self.conn.commit()
+                inseridas += len(lote)
+                lote = []
+                decorrido = time.perf_counter() - inicio
+                print(f"   {tabela}: {inseridas:,}/{total:,} ({inseridas / decorrido:,.0f} linhas/s)", end='\r')
+
+        if lote:
+            cursor.executemany(sql, lote)
+            self.conn.commit()
+            inseridas += len(lote)
+
+        cursor.close()
+        decorrido = time.perf_counter() - inicio
+        print(f"✅ {tabela}: {inseridas:,} linhas em {decorrido:.1f}s "
+              f"({inseridas / max(decorrido, 1e-9):,.0f} linhas/s)" + ' ' * 10)
+
+    # ---------- tabelas ----------
+
+    def gerar_usuarios(self):
+        total = self.volumes['usuarios']
+        prestadores = self.volumes['prestadores']
+        self.base_usuario = self.proximo_id(Usuario)
+        self.base_cliente = self.base_usuario + prestadores
+        self.total_clientes = total - prestadores
+        rnd = self.rnd
+
+        def linhas():
+            cidades = rnd.choices(self.cidades, cum_weights=self.pesos_cidades, k=total)
+            for i in range(total):
+                usuario_id = self.base_usuario + i
+                cidade = cidades[i]
+                lat, lng = self.centros[cidade]
+                yield (
+                    usuario_id,
+                    f'{rnd.choice(NOMES)} {rnd.choice(APELIDOS)}',
+                    f'usuario{usuario_id}@carga.servicos.co.mz',
+                    self.senha_hash,
+                    'prestador' if i < prestadores else 'cliente',
+                    f'+258 8{rnd.randrange(2, 8)} {rnd.randrange(1000000, 9999999)}',
+                    cidade,
+                    rnd.choice(BAIRROS),
+                    f'{lat + rnd.uniform(-0.08, 0.08):.6f},{lng + rnd.uniform(-0.08, 0.08):.6f}',
+                    self.momento(),
+                    1 if rnd.random() < 0.97 else 0,
                 )
-                usuario.set_senha('123456')
-                db_session.add(usuario)
-                db_session.commit()
-
-                # Criar prestador
-                prestador = PrestadorServico(
-                    usuario_id=usuario.id,
-                    categoria=categoria,
-                    especialidade=especialidade,
-                    descricao=f"Profissional qualificado em {especialidade} com anos de experiência servindo a comunidade moçambicana.",
-                    experiencia=random.randint(2, 15),
-                    valor_hora=random.randint(500, 2500),
-                    disponivel='sim',
-                    taxa_plataforma=10.0
+
+        self.inserir(Usuario, ['id', 'nome', 'email', 'senha_hash', 'tipo', 'telefone', 'cidade',
+                               'bairro', 'coordenadas', 'data_cadastro', 'ativo'], linhas(), total)
+
+    def gerar_prestadores(self):
+        total = self.volumes['prestadores']
+        self.base_prestador = self.proximo_id(PrestadorServico)
+        self.base_servico = self.proximo_id(Servico)
+        self.servico_inicio = array('q')
+        self.servico_qtd = array('b')
+        self.valor_hora = array('d')
+        rnd = self.rnd
+
+        def linhas():
+            categorias = rnd.choices(self.categorias, cum_weights=self.pesos_categorias, k=total)
+            proximo_servico = self.base_servico
+            for i in range(total):
+                categoria = categorias[i]
+                especialidade = rnd.choice(self.especialidades[categoria])
+                valor = float(rnd.randrange(300, 3000, 50))
+                qtd = rnd.choice((1, 1, 2, 2, 3, 4))
+                self.servico_inicio.append(proximo_servico)
+                self.servico_qtd.append(qtd)
+                self.valor_hora.append(valor)
+                proximo_servico += qtd
+                yield (
+                    self.base_prestador + i,
+                    self.base_usuario + i,
+                    categoria,
+                    especialidade,
+                    f'Profissional de {especialidade} com atendimento personalizado.',
+                    rnd.randrange(0, 25),
+                    valor,
+                    'sim' if rnd.random() < 0.9 else 'nao',
+                    10.0,
+                    rnd.choice((5, 10, 15, 25, 50)),
+                    1 if rnd.random() < 0.35 else 0,
+                    1 if rnd.random() < 0.3 else 0,
+                    0.0,
+                    0.0,
                 )
-                db_session.add(prestador)
-                db_session.commit()
-
-                # Criar serviços
-                for j in range(random.randint(1, 3)):
-                    servico = Servico(
-                        prestador_id=prestador.id,
-                        titulo=f"Serviço de {especialidade} - {['Básico', 'Intermediário', 'Avançado'][j]}",
-                        descricao=f"Serviço profissional de {especialidade} com qualidade garantida. Atendimento personalizado para suas necessidades.",
-                        nivel=['basico', 'intermediario', 'avancado'][j],
-                        duracao=random.choice([30, 60, 90, 120]),
-                        preco=prestador.valor_hora * (random.randint(1, 4)),
-                        ativo=True
+
+        self.inserir(PrestadorServico, ['id', 'usuario_id', 'categoria', 'especialidade', 'descricao',
+                                        'experiencia', 'valor_hora', 'disponivel', 'taxa_plataforma',
+                                        'raio_atuacao', 'disponivel_online', 'verificado',
+                                        'saldo_disponivel', 'total_ganho'], linhas(), total)
+
+    def gerar_servicos(self):
+        total = sum(self.servico_qtd)
+        rnd = self.rnd
+
+        def linhas():
+            for indice, (inicio, qtd) in enumerate(zip(self.servico_inicio, self.servico_qtd)):
+                for j in range(qtd):
+                    nivel = NIVEIS[j]
+                    yield (
+                        inicio + j,
+                        self.base_prestador + indice,
+                        f'Serviço {nivel} {indice}-{j}',
+                        'Atendimento profissional com qualidade garantida.',
+                        nivel,
+                        rnd.choice((30, 60, 90, 120)),
+                        self.valor_hora[indice] * (j + 1),
+                        1,
                     )
-                    db_session.add(servico)
 
-                db_session.commit()
-                print(f"✅ Criado: {nome} - {especialidade}")
+        self.inserir(Servico, ['id', 'prestador_id', 'titulo', 'descricao', 'nivel', 'duracao',
+                               'preco', 'ativo'], linhas(), total)
+
+    def gerar_agendamentos(self):
+        total = self.volumes['agendamentos']
+        prestadores = self.volumes['prestadores']
+        self.base_agendamento = self.proximo_id(Agendamento)
+        self.total_conversas = min(total, self.volumes['mensagens'] // MENSAGENS_POR_CONVERSA + 1) \
+            if self.volumes['mensagens'] else 0
+        # Participantes das primeiras agendas, que recebem conversa
+        self.conversa_cliente = array('q')
+        self.conversa_prestador = array('q')
+        # Agendamentos realizados que recebem avaliação
+        self.avaliados = array('q')
+        status_tabela = tabela_ponderada(STATUS_AGENDAMENTO)
+        rnd = self.rnd
+
+        def linhas():
+            for i in range(total):
+                cliente_id = self.base_cliente + self.enviesado(self.total_clientes)
+                indice_prestador = self.enviesado(prestadores)
+                status = self.sortear(status_tabela)
+                criado = self.momento()
+                agendamento_id = self.base_agendamento + i
+
+                if i < self.total_conversas:
+                    self.conversa_cliente.append(cliente_id)
+                    self.conversa_prestador.append(self.base_usuario + indice_prestador)
+                if status == 'realizado' and rnd.random() < FRACAO_AVALIADOS:
+                    self.avaliados.extend((agendamento_id, cliente_id, self.base_prestador + indice_prestador))
+
+                yield (
+                    agendamento_id,
+                    cliente_id,
+                    self.base_prestador + indice_prestador,
+                    self.servico_inicio[indice_prestador] + rnd.randrange(self.servico_qtd[indice_prestador]),
+                    self.momento(futuro=status in ('pendente', 'confirmado')),
+                    status,
+                    'online' if rnd.random() < 0.2 else 'presencial',
+                    criado,
+                    criado,
+                )
 
-        print("🎉 Dados de teste criados com sucesso!")
-        print("📊 Estatísticas:")
-        print(f"   • Prestadores: {db_session.query(PrestadorServico).count()}")
-        print(f"   • Serviços: {db_session.query(Servico).count()}")
-        print(f"   • Usuários: {db_session.query(Usuario).count()}")
+        self.inserir(Agendamento, ['id', 'cliente_id', 'prestador_id', 'servico_id', 'data_agendamento',
+                                   'status', 'modalidade', 'criado_em', 'atualizado_em'], linhas(), total)
 
+    def gerar_avaliacoes(self):
+        total = len(self.avaliados) // 3
+        base = self.proximo_id(Avaliacao)
+        ratings = tabela_ponderada(RATINGS)
+        rnd = self.rnd
+
+        def linhas():
+            for i in range(total):
+                agendamento_id, cliente_id, prestador_id = self.avaliados[i * 3:i * 3 + 3]
+                yield (
+                    base + i, agendamento_id, cliente_id, prestador_id,
+                    self.sortear(ratings),
+                    rnd.choice(FRASES), 1 if rnd.random() < 0.1 else 0, self.momento(),
+                )
+
+        self.inserir(Avaliacao, ['id', 'agendamento_id', 'cliente_id', 'prestador_id', 'rating',
+                                 'comentario', 'anonima', 'data_avaliacao'], linhas(), total)
+
+    def gerar_conversas(self):
+        total = self.total_conversas
+        self.base_conversa = self.proximo_id(Conversa)
+
+        def linhas():
+            for i in range(total):
+                momento = self.momento()
+                yield (self.base_conversa + i, self.base_agendamento + i,
+                       self.conversa_cliente[i], self.conversa_prestador[i], momento, momento)
+
+        self.inserir(Conversa, ['id', 'agendamento_id', 'cliente_id', 'prestador_id',
+                                'data_criacao', 'ultima_mensagem'], linhas(), total)
+
+    def gerar_mensagens(self):
+        total = self.volumes['mensagens'] if self.total_conversas else 0
+        base = self.proximo_id(Mensagem)
+        rnd = self.rnd
+
+        def linhas():
+            for i in range(total):
+                indice = self.enviesado(self.total_conversas)
+                remetente = self.conversa_cliente[indice] if rnd.random() < 0.5 else self.conversa_prestador[indice]
+                yield (base + i, self.base_conversa + indice, remetente, rnd.choice(FRASES),
+                       'texto', self.momento(), 1 if rnd.random() < 0.9 else 0)
+
+        self.inserir(Mensagem, ['id', 'conversa_id', 'remetente_id', 'conteudo', 'tipo',
+                                'data_envio', 'lida'], linhas(), total)
+
+    def gerar_notificacoes(self):
+        total = self.volumes['notificacoes']
+        usuarios = self.volumes['usuarios']
+        base = self.proximo_id(Notificacao)
+        tipos = tabela_ponderada(TIPOS_NOTIFICACAO)
+        rnd = self.rnd
+
+        def linhas():
+            for i in range(total):
+                tipo = self.sortear(tipos)
+                yield (base + i, self.base_usuario + self.enviesado(usuarios), tipo,
+                       f'Notificação de {tipo}', 'Você tem uma atualização na plataforma.',
+                       1 if rnd.random() < 0.7 else 0, self.momento(), '/dashboard')
+
+        self.inserir(Notificacao, ['id', 'usuario_id', 'tipo', 'titulo', 'mensagem', 'lida',
+                                   'data_criacao', 'link_acao'], linhas(), total)
+
+
+# ---------- preparação do banco ----------
+
+MODELOS_CARREGADOS = [Usuario, PrestadorServico, Servico, Agendamento, Avaliacao,
+                      Conversa, Mensagem, Notificacao]
+
+
+def preparar_banco(conn):
+    """Ajustes de sessão para carga em massa"""
+    cursor = conn.cursor()
+    if engine.dialect.name == 'sqlite':
+        for pragma in ('synchronous = OFF', 'cache_size = -262144', 'temp_store = MEMORY'):
+            cursor.execute(f'PRAGMA {pragma}')
+    elif engine.dialect.name == 'mysql':
+        cursor.execute('SET foreign_key_checks = 0, unique_checks = 0')
+    cursor.close()
+
+
+def remover_indices():
+    """Remove os índices secundários declarados nos modelos (recriados no fim)"""
+    indices = [indice for modelo in MODELOS_CARREGADOS for indice in modelo.__table__.indexes]
+    with engine.begin() as conn:
+        for indice in indices:
+            indice.drop(bind=conn, checkfirst=True)
+    return indices
+
+
+def recriar_indices(indices):
+    for indice in indices:
+        inicio = time.perf_counter()
+        with engine.begin() as conn:
+            indice.create(bind=conn, checkfirst=True)
+        print(f"✅ Índice {indice.name} recriado em {time.perf_counter() - inicio:.1f}s")
+
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text('ANALYZE'))
+            conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        else:
+            for modelo in MODELOS_CARREGADOS:
+                conn.execute(text(f'ANALYZE TABLE {modelo.__tablename__}'))
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Gerador de dados sintéticos em massa')
+    parser.add_argument('--escala', choices=ESCALAS, default='pequena',
+                        help='volumes predefinidos (padrão: pequena)')
+    parser.add_argument('--semente', type=int, default=2024, help='semente do gerador aleatório')
+    parser.add_argument('--lote', type=int, default=50_000, help='linhas por executemany/commit')
+    parser.add_argument('--manter-indices', action='store_true',
+                        help='não remover os índices durante a carga (mais lento)')
+    for volume in ESCALAS['pequena']:
+        parser.add_argument(f'--{volume}', type=int, help=f'sobrepõe o volume de {volume} da escala')
+    return parser.parse_args()
+
+
+def criar_dados_teste(argumentos):
+    volumes = dict(ESCALAS[argumentos.escala])
+    for volume in volumes:
+        if getattr(argumentos, volume) is not None:
+            volumes[volume] = getattr(argumentos, volume)
+
+    if volumes['usuarios'] <= volumes['prestadores'] or volumes['prestadores'] < 1:
+        raise ValueError('É preciso ao menos um prestador e mais usuários do que prestadores')
+
+    print(f"🔄 Gerando dados ({argumentos.escala}, semente {argumentos.semente}) em {engine.url}")
+    for volume, quantidade in volumes.items():
+        print(f"   • {volume}: {quantidade:,}")
+
+    inicio = time.perf_counter()
+    migracoes.migrar()
+    indices = [] if argumentos.manter_indices else remover_indices()
+
+    gerador = Gerador(volumes, argumentos.semente, argumentos.lote)
+    try:
+        preparar_banco(gerador.conn)
+        gerador.gerar_usuarios()
+        gerador.gerar_prestadores()
+        gerador.gerar_servicos()
+        gerador.gerar_agendamentos()
+        gerador.gerar_avaliacoes()
+        gerador.gerar_conversas()
+        gerador.gerar_mensagens()
+        gerador.gerar_notificacoes()
+    finally:
+        gerador.conn.close()
+        recriar_indices(indices)
+
+    # Os dados entraram sem o ORM: agregados e índices derivados são reconstruídos
+    recalcular_avaliacoes.recalcular()
+    print(f"📍 {geo.preencher_coordenadas():,} usuário(s) com coordenadas, "
+          f"{geo.reconstruir_cobertura():,} célula(s) de cobertura")
+    if busca.indice_disponivel(engine):
+        print(f"🔍 {busca.reindexar():,} prestador(es) no índice de busca")
+    print(f"🏆 {ranking.recalcular():,} prestador(es) pontuado(s)")
+
+    # Por último: as escritas acima ficam no -wal até um checkpoint; quem copiar ou
+    # renomear só o arquivo do banco (ex.: o benchmark) tem de as encontrar nele
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as conn:
+            conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+    print(f"🎉 Dados de teste criados em {time.perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    try:
+        criar_dados_teste(ler_argumentos())
     except Exception as e:
-        db_session.rollback()
         print(f"❌ Erro ao criar dados de teste: {str(e)}")
         import traceback
         traceback.print_exc()
-
-
-if __name__ == "__main__":
-    criar_dados_teste_realistas()
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,393 @@
+# tests/teste_carga.py
+"""
+Teste de carga com utilizadores virtuais concorrentes.
+
+Repete jornadas realistas contra um servidor já iniciado (python app.py ou
+gunicorn), com a mesma sessão requests do tests/test_completo.py. Cada
+utilizador virtual é uma thread que faz login e depois sorteia jornadas:
+
+  - buscar:   pesquisa por texto ou categoria
+  - perfil:   abre o perfil de um prestador
+  - agendar:  formulário + POST em agendamentos.agendar
+  - chat:     polling das mensagens a cada 3s e envio de uma mensagem
+  - pagar:    checkout de um agendamento pendente + pagamentos.processar_pagamento
+
+No fim mostra, por rota: pedidos, vazão, taxa de erro (com "database is
+locked" à parte), percentis de latência e histograma. Com --json o
+relatório completo fica gravado para comparar configurações de workers e
+hardware.
+
+Os utilizadores, serviços e conversas são lidos do mesmo banco que o
+servidor usa (DATABASE_URL), normalmente gerado com criar_dados_teste.py.
+
+Uso:
+    python tests/teste_carga.py --usuarios 200 --duracao 120
+    python tests/teste_carga.py --url http://localhost:8000 --rampa 30 --json carga.json
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from config import config
+from criar_dados_teste import CATEGORIAS as CATEGORIAS_GERADAS
+from test_completo import BASE_URL
+
+SENHA = '123456'
+
+# Peso de cada jornada no sorteio
+JORNADAS = {
+    'buscar': 35,
+    'perfil': 25,
+    'chat': 20,
+    'agendar': 10,
+    'pagar': 10,
+}
+
+# As especialidades que o criar_dados_teste.py gera e as categorias da aplicação:
+# as buscas da carga encontram resultados, como as dos utilizadores reais
+TERMOS_BUSCA = sorted({especialidade for _, _, especialidades in CATEGORIAS_GERADAS
+                       for especialidade in especialidades})
+CATEGORIAS_BUSCA = list(config.CATEGORIAS)
+
+INTERVALO_POLLING = 3.0
+POLLS_POR_CHAT = 5
+
+# Limites superiores (ms) das faixas do histograma
+FAIXAS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+
+_RE_ID = re.compile(r'/\d+')
+_RE_PAGAMENTO = re.compile(r'pagamento_id:\s*(\d+)')
+
+
+def nome_rota(metodo, caminho):
+    """'GET /chat/api/mensagens/<id>' a partir de '/chat/api/mensagens/123?x=1'"""
+    return f"{metodo} {_RE_ID.sub('/<id>', caminho.split('?', 1)[0])}"
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados) + 0.5) - 1))
+    return ordenados[posicao]
+
+
+class Registro:
+    """Resultados de todos os utilizadores virtuais, partilhado entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.erros = defaultdict(int)
+        self.bloqueios = defaultdict(int)
+        self.exemplos_erro = defaultdict(set)
+        self.jornadas = defaultdict(int)
+        self.inicio = time.perf_counter()
+        self.fim = None
+
+    def pedido(self, rota, ms, erro=None, bloqueado=False):
+        with self._lock:
+            self.latencias[rota].append(ms)
+            if erro:
+                self.erros[rota] += 1
+                if len(self.exemplos_erro[rota]) < 3:
+                    self.exemplos_erro[rota].add(erro[:120])
+            if bloqueado:
+                self.bloqueios[rota] += 1
+
+    def jornada(self, nome):
+        with self._lock:
+            self.jornadas[nome] += 1
+
+    def resumo(self):
+        duracao = (self.fim or time.perf_counter()) - self.inicio
+        rotas = {}
+        for rota, tempos in sorted(self.latencias.items()):
+            histograma = [0] * len(FAIXAS_MS)
+            for ms in tempos:
+                histograma[next(i for i, limite in enumerate(FAIXAS_MS) if ms <= limite)] += 1
+            rotas[rota] = {
+                'pedidos': len(tempos),
+                'por_segundo': round(len(tempos) / duracao, 2),
+                'erros': self.erros[rota],
+                'database_locked': self.bloqueios[rota],
+                'taxa_erro': round(self.erros[rota] / len(tempos), 4),
+                'p50_ms': round(percentil(tempos, 50), 1),
+                'p90_ms': round(percentil(tempos, 90), 1),
+                'p99_ms': round(percentil(tempos, 99), 1),
+                'max_ms': round(max(tempos), 1),
+                'histograma': histograma,
+                'exemplos_erro': sorted(self.exemplos_erro[rota]),
+            }
+
+        total = sum(r['pedidos'] for r in rotas.values())
+        todos = [ms for tempos in self.latencias.values() for ms in tempos]
+        return {
+            'duracao_s': round(duracao, 1),
+            'pedidos': total,
+            'por_segundo': round(total / duracao, 2) if duracao else 0,
+            'erros': sum(self.erros.values()),
+            'database_locked': sum(self.bloqueios.values()),
+            'taxa_erro': round(sum(self.erros.values()) / total, 4) if total else 0,
+            'p50_ms': round(percentil(todos, 50), 1) if todos else None,
+            'p99_ms': round(percentil(todos, 99), 1) if todos else None,
+            'jornadas': dict(self.jornadas),
+            'rotas': rotas,
+        }
+
+
+class UsuarioVirtual:
+    """Um cliente com sessão própria que repete jornadas até o prazo acabar"""
+
+    def __init__(self, url, email, sementes, registro, pensar, prazo, semente):
+        self.url = url
+        self.email = email
+        self.sementes = sementes
+        self.registro = registro
+        self.pensar = pensar
+        self.prazo = prazo
+        self.rnd = random.Random(semente)
+        self.session = requests.Session()
+
+    # ---------- pedidos medidos ----------
+
+    def pedido(self, metodo, caminho, **kwargs):
+        """Faz o pedido e regista latência e erros; devolve a resposta ou None"""
+        rota = nome_rota(metodo, caminho)
+        inicio = time.perf_counter()
+        try:
+            resposta = self.session.request(metodo, self.url + caminho, allow_redirects=False,
+                                            timeout=60, **kwargs)
+        except requests.RequestException as e:
+            self.registro.pedido(rota, (time.perf_counter() - inicio) * 1000, erro=type(e).__name__)
+            return None
+        ms = (time.perf_counter() - inicio) * 1000
+
+        texto = resposta.text
+        bloqueado = 'database is locked' in texto
+        erro = None
+        if resposta.status_code >= 500 or bloqueado:
+            erro = f'HTTP {resposta.status_code}: {texto[:200]}'
+        elif resposta.status_code == 302 and '/login' in resposta.headers.get('Location', ''):
+            erro = 'sessão perdida (redirecionado para /login)'
+        elif resposta.headers.get('Content-Type', '').startswith('application/json'):
+            dados = resposta.json()
+            if isinstance(dados, dict) and dados.get('success') is False:
+                erro = f"HTTP {resposta.status_code}: {dados.get('error')}"
+
+        self.registro.pedido(rota, ms, erro=erro, bloqueado=bloqueado)
+        return resposta
+
+    def esperar(self, segundos):
+        time.sleep(max(0.0, min(segundos, self.prazo - time.monotonic())))
+
+    # ---------- jornadas ----------
+
+    def login(self):
+        resposta = self.pedido('POST', '/login', data={'email': self.email, 'senha': SENHA})
+        return resposta is not None and resposta.status_code == 302 \
+            and '/login' not in resposta.headers.get('Location', '')
+
+    def buscar(self):
+        if self.rnd.random() < 0.5:
+            self.pedido('GET', '/servicos/buscar', params={'q': self.rnd.choice(TERMOS_BUSCA)})
+        else:
+            self.pedido('GET', '/servicos/buscar', params={'categoria': self.rnd.choice(CATEGORIAS_BUSCA)})
+
+    def perfil(self):
+        self.pedido('GET', f"/servicos/prestador/{self.rnd.choice(self.sementes['prestadores'])}")
+
+    def agendar(self):
+        servico_id = self.rnd.choice(self.sementes['servicos'])
+        self.pedido('GET', f'/agendamentos/agendar/{servico_id}')
+        self.esperar(self.pensar)
+
+        # Minuto aleatório nos próximos 60 dias para evitar conflitos de horário
+        data = datetime.now() + timedelta(days=1, minutes=self.rnd.randrange(60 * 24 * 60))
+        self.pedido('POST', f'/agendamentos/agendar/{servico_id}', data={
+            'data_agendamento': data.strftime('%Y-%m-%dT%H:%M'),
+            'observacoes': 'Teste de carga',
+            'modalidade': 'presencial',
+            'endereco_servico': 'Av. 24 de Julho, Maputo',
+        })
+
+    def chat(self):
+        conversas = self.sementes['conversas'].get(self.email)
+        if not conversas:
+            return self.buscar()
+
+        conversa_id = self.rnd.choice(conversas)
+        for polling in range(POLLS_POR_CHAT):
+            self.pedido('GET', f'/chat/api/mensagens/{conversa_id}')
+            if polling == POLLS_POR_CHAT // 2:
+                self.pedido('POST', '/chat/api/enviar',
+                            json={'conversa_id': conversa_id, 'mensagem': 'Olá, ainda está disponível?'})
+            self.esperar(INTERVALO_POLLING)
+            if time.monotonic() >= self.prazo:
+                break
+
+    def pagar(self):
+        resposta = self.pedido('GET', '/agendamentos/api/meus-agendamentos', params={'status': 'pendente'})
+        if resposta is None or resposta.status_code != 200:
+            return
+        agendamentos = resposta.json().get('agendamentos') or []
+        if not agendamentos:
+            return self.agendar()
+
+        agendamento_id = self.rnd.choice(agendamentos[:20])['id']
+        checkout = self.pedido('GET', f'/pagamentos/agendamento/{agendamento_id}')
+        encontrado = checkout is not None and _RE_PAGAMENTO.search(checkout.text)
+        if not encontrado:
+            return
+        self.esperar(self.pensar)
+
+        self.pedido('POST', '/pagamentos/api/processar-pagamento', json={
+            'pagamento_id': int(encontrado.group(1)),
+            'metodo_pagamento': self.rnd.choice(['mpesa', 'emola', 'cartao']),
+        })
+
+    def executar(self):
+        if not self.login():
+            return
+
+        nomes = list(JORNADAS)
+        pesos = list(JORNADAS.values())
+        while time.monotonic() < self.prazo:
+            nome = self.rnd.choices(nomes, pesos)[0]
+            getattr(self, nome)()
+            self.registro.jornada(nome)
+            # Tempo de reflexão exponencial em torno da média pedida
+            self.esperar(self.rnd.expovariate(1 / self.pensar) if self.pensar else 0)
+
+
+def carregar_sementes(total_usuarios, rnd):
+    """Clientes, prestadores, serviços e conversas reais do banco usado pelo servidor"""
+    from sqlalchemy import select
+    from database import engine
+    from models import Conversa, PrestadorServico, Servico, Usuario
+
+    with engine.connect() as conn:
+        clientes = conn.execute(
+            select(Usuario.id, Usuario.email).where(Usuario.tipo == 'cliente', Usuario.ativo.is_(True))
+            .order_by(Usuario.id).limit(total_usuarios * 20)
+        ).all()
+        prestadores = conn.execute(select(PrestadorServico.id).limit(5000)).scalars().all()
+        servicos = conn.execute(select(Servico.id).where(Servico.ativo.is_(True)).limit(5000)).scalars().all()
+
+        escolhidos = rnd.sample(clientes, min(total_usuarios, len(clientes)))
+        por_id = {cliente.id: cliente.email for cliente in escolhidos}
+        conversas = defaultdict(list)
+        for conversa in conn.execute(
+                select(Conversa.id, Conversa.cliente_id).where(Conversa.cliente_id.in_(list(por_id)))):
+            conversas[por_id[conversa.cliente_id]].append(conversa.id)
+
+    if not escolhidos or not prestadores or not servicos:
+        raise RuntimeError('Banco sem clientes/prestadores/serviços; gere os dados com tests/criar_dados_teste.py')
+
+    return {
+        'emails': [cliente.email for cliente in escolhidos],
+        'prestadores': prestadores,
+        'servicos': servicos,
+        'conversas': dict(conversas),
+    }
+
+
+def imprimir_relatorio(resumo):
+    print("\n" + "=" * 100)
+    print("📊 RELATÓRIO DO TESTE DE CARGA")
+    print("=" * 100)
+    print(f"⏱️  Duração: {resumo['duracao_s']}s | Pedidos: {resumo['pedidos']} | "
+          f"Vazão: {resumo['por_segundo']} req/s | p50 {resumo['p50_ms']}ms | p99 {resumo['p99_ms']}ms")
+    print(f"❌ Erros: {resumo['erros']} ({resumo['taxa_erro']:.2%}) | 🔒 database is locked: {resumo['database_locked']}")
+    print(f"🧭 Jornadas: {resumo['jornadas']}")
+
+    print(f"\n{'rota':<46} {'pedidos':>8} {'req/s':>7} {'erro %':>7} {'locked':>7} "
+          f"{'p50':>7} {'p90':>7} {'p99':>7} {'max':>8}")
+    print('-' * 110)
+    for rota, r in resumo['rotas'].items():
+        print(f"{rota:<46} {r['pedidos']:>8} {r['por_segundo']:>7.2f} {r['taxa_erro']:>7.2%} "
+              f"{r['database_locked']:>7} {r['p50_ms']:>7.1f} {r['p90_ms']:>7.1f} {r['p99_ms']:>7.1f} {r['max_ms']:>8.1f}")
+
+    print("\n📈 Histogramas de latência (ms)")
+    rotulos = [f"≤{limite:g}" if limite != float('inf') else f">{FAIXAS_MS[-2]:g}" for limite in FAIXAS_MS]
+    for rota, r in resumo['rotas'].items():
+        print(f"\n  {rota}")
+        maior = max(r['histograma']) or 1
+        for rotulo, quantidade in zip(rotulos, r['histograma']):
+            if quantidade:
+                print(f"    {rotulo:>7} | {'█' * max(1, round(40 * quantidade / maior)):<40} {quantidade}")
+        for exemplo in r['exemplos_erro']:
+            print(f"    ⚠️  {exemplo}")
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Teste de carga com jornadas de utilizadores')
+    parser.add_argument('--url', default=BASE_URL)
+    parser.add_argument('--usuarios', type=int, default=100, help='utilizadores virtuais concorrentes')
+    parser.add_argument('--duracao', type=float, default=60, help='segundos de carga depois da rampa')
+    parser.add_argument('--rampa', type=float, default=10, help='segundos para iniciar todos os utilizadores')
+    parser.add_argument('--pensar', type=float, default=1.0, help='tempo médio de reflexão entre passos (s)')
+    parser.add_argument('--semente', type=int, default=2024)
+    parser.add_argument('--json', help='grava o relatório completo neste arquivo')
+    return parser.parse_args()
+
+
+def main():
+    argumentos = ler_argumentos()
+    rnd = random.Random(argumentos.semente)
+
+    print("=" * 60)
+    print("🚀 TESTE DE CARGA - SERVIÇOSPRO")
+    print("=" * 60)
+
+    try:
+        requests.get(argumentos.url + '/', timeout=10)
+    except requests.RequestException as e:
+        print(f"❌ Servidor indisponível em {argumentos.url}: {e}")
+        return 1
+
+    sementes = carregar_sementes(argumentos.usuarios, rnd)
+    emails = sementes['emails']
+    print(f"👥 {len(emails)} utilizador(es) virtual(is) | rampa {argumentos.rampa}s | carga {argumentos.duracao}s")
+
+    registro = Registro()
+    prazo = time.monotonic() + argumentos.rampa + argumentos.duracao
+    threads = []
+    for posicao, email in enumerate(emails):
+        usuario = UsuarioVirtual(argumentos.url, email, sementes, registro, argumentos.pensar,
+                                 prazo, argumentos.semente + posicao)
+        thread = threading.Thread(target=usuario.executar, daemon=True)
+        threads.append(thread)
+        thread.start()
+        if argumentos.rampa:
+            time.sleep(argumentos.rampa / len(emails))
+
+    try:
+        for thread in threads:
+            thread.join()
+    except KeyboardInterrupt:
+        print("\n⚠️  Interrompido; relatório parcial:")
+    registro.fim = time.perf_counter()
+
+    resumo = registro.resumo()
+    imprimir_relatorio(resumo)
+
+    if argumentos.json:
+        with open(argumentos.json, 'w', encoding='utf-8') as arquivo:
+            json.dump(dict(resumo, configuracao=vars(argumentos)), arquivo, indent=2, ensure_ascii=False)
+        print(f"\n💾 Relatório gravado em {argumentos.json}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# tests/verificar_backup.py
+"""
+Ida e volta dos backups: fazer_dump.py nos dois formatos e restaurar_backup.py
+num banco novo, comparando com o original.
+
+    python tests/verificar_backup.py [banco]     # padrão: servicos_app.db
+
+Confere as linhas de cada tabela da aplicação e, se o original tiver o índice
+da busca, que ele foi refeito e responde às mesmas buscas.
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fazer_dump import TABELAS_DERIVADAS, fazer_dump
+from restaurar_backup import restaurar_dump
+
+# Termos de busca conferidos no índice refeito
+TERMOS = ['eletri', 'medic', 'personal', 'limpez']
+
+
+def _tabelas(conn):
+    nomes = [linha[0] for linha in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    return sorted(nome for nome in nomes
+                  if not any(nome == derivada or nome.startswith(derivada + '_') for derivada in TABELAS_DERIVADAS))
+
+
+def _contagens(conn):
+    return {tabela: conn.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()[0] for tabela in _tabelas(conn)}
+
+
+def _buscas(conn):
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'busca_prestadores'").fetchone():
+        return None
+    resultado = {'documentos': conn.execute('SELECT COUNT(*) FROM busca_prestadores').fetchone()[0]}
+    for termo in TERMOS:
+        resultado[termo] = sorted(linha[0] for linha in conn.execute(
+            'SELECT rowid FROM busca_prestadores WHERE busca_prestadores MATCH ?', (f'"{termo}"*',)))
+    return resultado
+
+
+def verificar(banco):
+    original = sqlite3.connect(banco)
+    try:
+        contagens, buscas = _contagens(original), _buscas(original)
+    finally:
+        original.close()
+
+    falhas = 0
+    with tempfile.TemporaryDirectory() as pasta:
+        for formato, nome in (('backup', 'copia.db.gz'), ('sql', 'copia.sql.gz')):
+            arquivo = os.path.join(pasta, nome)
+            restaurado = os.path.join(pasta, f'restaurado-{formato}.db')
+            fazer_dump(banco, arquivo, formato, pausa=0)
+            restaurar_dump(arquivo, restaurado)
+
+            conn = sqlite3.connect(restaurado)
+            try:
+                problemas = []
+                novas = _contagens(conn)
+                if novas != contagens:
+                    diferentes = sorted(tabela for tabela in set(novas) | set(contagens)
+                                        if novas.get(tabela) != contagens.get(tabela))
+                    problemas.append(f'linhas diferentes em {diferentes}')
+                if buscas is not None and _buscas(conn) != buscas:
+                    problemas.append('índice da busca diferente do original')
+            finally:
+                conn.close()
+
+            if problemas:
+                falhas += 1
+                print(f"❌ FALHOU | {formato}: {'; '.join(problemas)}")
+            else:
+                print(f"✅ PASSOU | {formato}: {len(contagens)} tabelas"
+                      f"{', índice da busca igual ao original' if buscas is not None else ''}")
+    return falhas
+
+
+if __name__ == '__main__':
+    banco_teste = sys.argv[1] if len(sys.argv) > 1 else 'servicos_app.db'
+    sys.exit(1 if verificar(banco_teste) else 0)
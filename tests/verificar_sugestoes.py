@@ -0,0 +1,159 @@
+# tests/verificar_sugestoes.py
+"""
+Atualização incremental das sugestões contra uma reconstrução completa.
+
+Numa cópia do banco, constrói o índice de sugestões, faz escritas aleatórias
+pelo ORM (prestadores, nomes, serviços, agendamentos, avaliações; algumas
+desfeitas com rollback) e compara o índice mantido depois de cada commit com
+um índice novo construído do banco: as mesmas sugestões, com a mesma
+popularidade, e as mesmas respostas para os prefixos das chaves.
+
+    python tests/verificar_sugestoes.py [banco] [--escritas 300] [--semente 1]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def ler_argumentos():
+    parser = argparse.ArgumentParser(description='Sugestões incrementais contra uma reconstrução')
+    parser.add_argument('banco', nargs='?', default='servicos_app.db')
+    parser.add_argument('--escritas', type=int, default=300)
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--prestadores', type=int, default=40, help='prestadores sorteados (colisões nos topos)')
+    return parser.parse_args()
+
+
+def estado(indice):
+    """Sugestões do índice comparáveis entre construções (os ids internos diferem)"""
+    return {(sugestao.tipo, sugestao.chaves[0], sugestao.valor if sugestao.tipo in ('categoria', 'prestador') else None):
+            (sugestao.popularidade, sugestao.prestadores)
+            for sugestao in indice.sugestoes.values()}
+
+
+def respostas(indice, prefixos):
+    return {prefixo: [(s['tipo'], s['texto'].lower(), s['popularidade'], s['homonimos'])
+                      for s in indice.sugerir(prefixo)] for prefixo in prefixos}
+
+
+def escrever(session, rnd, modelos, prestadores, especialidades):
+    """Uma alteração aleatória que muda sugestões ou popularidade"""
+    PrestadorServico, Servico, Agendamento, Avaliacao, Usuario = modelos
+    prestador = session.get(PrestadorServico, rnd.choice(prestadores))
+    acao = rnd.choice(['especialidade', 'disponivel', 'nome', 'categoria', 'servico_novo', 'servico_ativo',
+                       'servico_titulo', 'agendamento_novo', 'agendamento_status', 'agendamento_mover',
+                       'avaliacao_nova', 'avaliacao_apagar'])
+
+    if acao == 'especialidade':
+        prestador.especialidade = rnd.choice(especialidades + [f'Especialidade {rnd.randint(1, 5)}'])
+    elif acao == 'disponivel':
+        prestador.disponivel = 'nao' if prestador.disponivel == 'sim' else 'sim'
+    elif acao == 'nome':
+        session.get(Usuario, prestador.usuario_id).nome = rnd.choice(['Ana Sitoe', 'Paulo Langa', 'Rita Bila'])
+    elif acao == 'categoria':
+        prestador.categoria = rnd.choice(['medico', 'consultor', 'outros'])
+    elif acao == 'servico_novo':
+        session.add(Servico(prestador_id=prestador.id, titulo=f'Serviço Teste {rnd.randint(1, 5)}',
+                            descricao='Teste', nivel='basico', preco=100, ativo=True))
+    elif acao in ('servico_ativo', 'servico_titulo'):
+        servico = session.query(Servico).filter_by(prestador_id=prestador.id).first()
+        if servico is None:
+            return acao
+        if acao == 'servico_ativo':
+            servico.ativo = not servico.ativo
+        else:
+            servico.titulo = f'Serviço Teste {rnd.randint(1, 5)}'
+    elif acao == 'agendamento_novo':
+        servico = session.query(Servico).filter_by(prestador_id=prestador.id).first()
+        if servico is None:
+            return acao
+        session.add(Agendamento(cliente_id=prestador.usuario_id, prestador_id=prestador.id, servico_id=servico.id,
+                                data_agendamento=datetime.utcnow() + timedelta(days=1), status='pendente'))
+    elif acao in ('agendamento_status', 'agendamento_mover'):
+        agendamento = session.query(Agendamento).filter_by(prestador_id=prestador.id).first()
+        if agendamento is None:
+            return acao
+        if acao == 'agendamento_status':
+            agendamento.status = 'cancelado' if agendamento.status != 'cancelado' else 'confirmado'
+        else:
+            agendamento.prestador_id = rnd.choice(prestadores)
+    elif acao == 'avaliacao_nova':
+        session.add(Avaliacao(prestador_id=prestador.id, cliente_id=prestador.usuario_id, rating=rnd.randint(1, 5)))
+    else:
+        avaliacao = session.query(Avaliacao).filter_by(prestador_id=prestador.id).first()
+        if avaliacao is None:
+            return acao
+        session.delete(avaliacao)
+    return acao
+
+
+def verificar(argumentos, pasta):
+    # O banco da cópia tem de estar definido antes de importar a aplicação
+    copia = os.path.join(pasta, 'sugestoes.db')
+    shutil.copyfile(argumentos.banco, copia)
+    os.environ['DATABASE_URL'] = f'sqlite:///{copia}'
+    os.environ.setdefault('SQLALCHEMY_ECHO', '0')
+
+    import sugestoes
+    from database import db_session
+    from models import Agendamento, Avaliacao, PrestadorServico, Servico, Usuario
+
+    rnd = random.Random(argumentos.semente)
+    todos = [id for (id,) in db_session.query(PrestadorServico.id).order_by(PrestadorServico.id)]
+    prestadores = rnd.sample(todos, min(argumentos.prestadores, len(todos)))
+    especialidades = sorted({e for (e,) in db_session.query(PrestadorServico.especialidade).distinct() if e})[:10]
+    db_session.remove()
+
+    print(f"🔤 Índice inicial de {argumentos.banco} ({len(todos)} prestadores)")
+    incremental = sugestoes.reconstruir()
+
+    acoes, desfeitas = {}, 0
+    for _ in range(argumentos.escritas):
+        acao = escrever(db_session, rnd, (PrestadorServico, Servico, Agendamento, Avaliacao, Usuario),
+                        prestadores, especialidades)
+        acoes[acao] = acoes.get(acao, 0) + 1
+        if rnd.random() < 0.1:
+            db_session.flush()
+            db_session.rollback()
+            desfeitas += 1
+        else:
+            db_session.commit()
+        db_session.remove()
+    print(f"✍️  {argumentos.escritas} escritas ({desfeitas} desfeitas): "
+          + ', '.join(f'{acao} {total}' for acao, total in sorted(acoes.items())))
+
+    # O índice novo não é instalado: constrói-se à parte para comparar
+    from database import engine
+    completo = sugestoes.IndiceSugestoes()
+    with engine.connect() as conn:
+        completo.carregar(sugestoes._dados(conn))
+
+    falhas = 0
+    atual, esperado = estado(incremental), estado(completo)
+    if atual != esperado:
+        falhas += 1
+        diferentes = sorted(set(atual.items()) ^ set(esperado.items()), key=str)[:5]
+        print(f"❌ FALHOU | sugestões diferentes da reconstrução: {diferentes}")
+    else:
+        print(f"✅ PASSOU | {len(atual)} sugestões com a mesma popularidade")
+
+    prefixos = sorted({chave[:comprimento] for chave, _ in completo.chaves for comprimento in (2, 3, 4)})
+    antes, depois = respostas(incremental, prefixos), respostas(completo, prefixos)
+    errados = [prefixo for prefixo in prefixos if antes[prefixo] != depois[prefixo]]
+    if errados:
+        falhas += 1
+        print(f"❌ FALHOU | {len(errados)} prefixo(s) com respostas diferentes, ex.: {errados[:5]}")
+    else:
+        print(f"✅ PASSOU | {len(prefixos)} prefixos com as mesmas respostas")
+    return falhas
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        sys.exit(1 if verificar(ler_argumentos(), pasta_temporaria) else 0)